@@ -0,0 +1,5 @@
+import time
+
+STARTUP_TIME = time.monotonic()
+"""The time (`time.monotonic`) at which botender was first imported. Start of the
+time to first face box metric."""
@@ -0,0 +1,117 @@
+"""Micro-benchmarks of the interaction subsystem.
+
+Run e.g. `python -m botender.interaction.benchmarks recommendation --requests 1000`
+to compare the drink recommender with the per-request pandas filtering it
+replaced.
+"""
+
+import argparse
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from botender.interaction.drink_recommendation import (
+    DRINKS_DATA_PATH,
+    EMOTION_TASTES,
+    TASTES,
+    TOP_K,
+    DrinkRecommender,
+)
+
+
+def legacy_recommend_drink(
+    drinks_data: pd.DataFrame, emotion: str, taste_preference: str
+) -> pd.DataFrame:
+    """The former `DrinkRecommender.recommend_drink`, which filters and scores the
+    whole dataset on every call."""
+
+    relevant_categories = EMOTION_TASTES.get(emotion.lower(), ())
+    filtered_drinks = drinks_data[
+        drinks_data["Category_with_Scales"].isin(relevant_categories)
+    ]
+    taste_filtered_drinks = filtered_drinks[
+        filtered_drinks["Category_with_Scales"].str.contains(taste_preference)
+    ]
+    taste_filtered_drinks["Score"] = taste_filtered_drinks[
+        "Category_with_Scales"
+    ].apply(
+        lambda x: (
+            int(x.split(f"{taste_preference}(")[-1].split(")")[0])
+            if f"{taste_preference}(" in x
+            else 0
+        )
+    )
+    top_drinks = taste_filtered_drinks.sort_values(by="Score", ascending=False).head(10)
+    selected_drinks = top_drinks.sample(n=min(1, len(top_drinks)))
+    return selected_drinks[["Cocktail", "Ingredients", "Category_with_Scales"]]
+
+
+def _report(name: str, seconds: float, count: int) -> None:
+    print(f"{name:>28} {seconds / count * 1e6:>10.1f}us {count / seconds:>12.0f}/s")
+
+
+def recommendation_report(dataset_path: str, requests: int, seed: int) -> None:
+    """Prints the time per recommendation of the legacy implementation, of
+    `recommend_drinks` and of `recommend_many` on random emotions and tastes."""
+
+    start_time = time.perf_counter()
+    recommender = DrinkRecommender(dataset_path, seed=seed)
+    load_time = time.perf_counter() - start_time
+    print(
+        f"Loaded {len(recommender.drinks_data)} drinks and precomputed the "
+        f"candidates in {load_time * 1000:.1f}ms"
+    )
+
+    rng = np.random.default_rng(seed)
+    emotions = list(EMOTION_TASTES)
+    pairs = [
+        (emotions[i], TASTES[j])
+        for i, j in zip(
+            rng.integers(len(emotions), size=requests),
+            rng.integers(len(TASTES), size=requests),
+        )
+    ]
+
+    print(f"{'':>28} {'per call':>12} {'throughput':>13}")
+    with warnings.catch_warnings():
+        # The legacy implementation assigns to a slice of the data
+        warnings.simplefilter("ignore")
+        start_time = time.perf_counter()
+        for emotion, taste in pairs:
+            legacy_recommend_drink(recommender.drinks_data, emotion, taste)
+        _report("legacy recommend_drink", time.perf_counter() - start_time, requests)
+
+    start_time = time.perf_counter()
+    for emotion, taste in pairs:
+        recommender.recommend_drink(emotion, taste)
+    _report("recommend_drink", time.perf_counter() - start_time, requests)
+
+    start_time = time.perf_counter()
+    for emotion, taste in pairs:
+        recommender.candidates(emotion, taste)[:TOP_K]
+    _report("candidates lookup", time.perf_counter() - start_time, requests)
+
+    start_time = time.perf_counter()
+    recommender.recommend_many(pairs)
+    _report("recommend_many", time.perf_counter() - start_time, requests)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Botender interaction benchmarks")
+    subparsers = parser.add_subparsers(dest="report", required=True)
+
+    recommendation_parser = subparsers.add_parser(
+        "recommendation", help="Compare the drink recommenders"
+    )
+    recommendation_parser.add_argument("--drinks", type=str, default=DRINKS_DATA_PATH)
+    recommendation_parser.add_argument("--requests", type=int, default=1000)
+    recommendation_parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.report == "recommendation":
+        recommendation_report(args.drinks, args.requests, args.seed)
@@ -0,0 +1,286 @@
+"""Generates the descriptions of the recommended cocktails, ahead of time where
+possible.
+
+Generated descriptions are kept in a `DescriptionCache`. Run
+`python -m botender.interaction.cocktail_descriptions --variants 3` once to
+generate them for all cocktails, so that the robot does not need to call the LLM
+while recommending.
+"""
+
+import argparse
+import functools
+import logging
+import os
+import sqlite3
+import time
+from collections.abc import Iterable
+from concurrent.futures import CancelledError, Future, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from openai import OpenAIError
+from openai.types.chat import ChatCompletionMessageParam
+
+from botender.interaction.description_cache import (
+    DEFAULT_VARIANTS,
+    DescriptionCache,
+    get_cache_path,
+)
+from botender.interaction.llm_client import LLMClient, get_llm_client
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_CANDIDATES = 3
+"""The number of cocktails whose descriptions are generated ahead of time."""
+PROMPT_VERSION = "1"
+"""The version of `description_messages`. Change it when changing the prompt to
+invalidate the cached descriptions."""
+
+
+def default_description(cocktail_name: str) -> str:
+    """Returns the description used when none could be generated."""
+
+    return f"I can recommend you a {cocktail_name}."
+
+
+def description_messages(
+    cocktail_name: str, ingredients: str
+) -> list[ChatCompletionMessageParam]:
+    """Returns the prompt to describe a cocktail based on its ingredients."""
+
+    return [
+        {
+            "role": "system",
+            "content": """You are an endpoint.
+                    You will receive a cocktail name along with its ingredients.
+                    Your task is to generate an enticing but short description of the
+                    cocktail in the following format: I can recommend you a "cocktailname".
+                    It is _ Examples: Input:  KING OF KINGSTON,"1 ounce gin, 1 teaspoon grapefruit, 0.5 ounce creme de,
+                    1 teaspoon grenadine, 1 ounce pineapple juice1 ounce heavy cream, 1 ounce dark rum,
+                    1 ounce light rum, Â½ ounce cherry brandy 1 pineapple slice, 4 ounces pineapple juiceYour response:
+                    I can recommend you a King of Kingston. It is a delightful mix with a high sweetness score,
+                    combining the unique flavors of grapefruit and pineapple with a touch of creamy crème de cacao.""",
+        },
+        {
+            "role": "user",
+            "content": f'name: "{cocktail_name}" , ingredients: {ingredients}',
+        },
+    ]
+
+
+@functools.cache
+def get_description_cache() -> DescriptionCache | None:
+    """Returns the cache shared by the whole process, or None if it cannot be
+    opened."""
+
+    try:
+        return DescriptionCache(get_cache_path(), PROMPT_VERSION)
+    except (OSError, sqlite3.Error) as e:
+        logger.warning(f"Could not open the description cache: {e}")
+        return None
+
+
+class DescriptionPrefetcher:
+    """Generates cocktail descriptions in the background as soon as the cocktails
+    that might be recommended are known, so that they are ready when the robot
+    recommends one. Cached descriptions are used without calling the LLM; while a
+    cocktail has fewer than `cache.variants` of them, a new one is generated in
+    the background."""
+
+    _client: LLMClient
+    _cache: DescriptionCache | None
+    _pending: dict[str, Future]
+    cache_hits: int = 0
+    """The number of descriptions that were taken from the cache."""
+    prefetch_hits: int = 0
+    """The number of descriptions that had been requested ahead of time."""
+    prefetch_misses: int = 0
+    """The number of descriptions that were only requested when needed."""
+
+    def __init__(
+        self,
+        client: LLMClient | None = None,
+        cache: DescriptionCache | None = None,
+    ):
+        self._client = client or get_llm_client()
+        self._cache = cache if cache is not None else get_description_cache()
+        self._pending = {}
+
+    @staticmethod
+    def enabled() -> bool:
+        return os.getenv("ENABLE_OPENAI_API") == "True"
+
+    def prefetch(self, cocktail_name: str, ingredients: str) -> None:
+        """Starts generating the description of a cocktail in the background
+        unless enough of them are cached."""
+
+        if not self.enabled() or cocktail_name in self._pending:
+            return
+        if self._cached_variants(cocktail_name, ingredients) >= self._variants():
+            return
+        logger.debug(f"Prefetching the description of {cocktail_name}...")
+        self._pending[cocktail_name] = self._generate(cocktail_name, ingredients)
+
+    def describe(self, cocktail_name: str, ingredients: str) -> str:
+        """Returns the description of a cocktail. Takes a cached one, waits for a
+        prefetched one or generates it now."""
+
+        if description := self._cached(cocktail_name, ingredients):
+            self.cache_hits += 1
+            # Let a prefetched variant finish in the background for next time
+            self._pending.pop(cocktail_name, None)
+            return description
+        if not self.enabled():
+            return default_description(cocktail_name)
+
+        future = self._pending.pop(cocktail_name, None)
+        if future is None:
+            self.prefetch_misses += 1
+            future = self._generate(cocktail_name, ingredients)
+        else:
+            self.prefetch_hits += 1
+        try:
+            description = future.result(timeout=self._client.timeout)
+        except (
+            OpenAIError,
+            ValueError,
+            TimeoutError,
+            FutureTimeoutError,
+            CancelledError,
+        ) as e:
+            # Before Python 3.11 the futures raise their own TimeoutError
+            logger.warning(f"Could not describe {cocktail_name}: {e!r}")
+            future.cancel()
+            return default_description(cocktail_name)
+        if description == "Error":
+            return default_description(cocktail_name)
+        return description
+
+    def discard(self, keep: Iterable[str] = ()) -> None:
+        """Cancels the descriptions that are not needed anymore, i.e. of all
+        cocktails but the ones in `keep`."""
+
+        keep = set(keep)
+        for cocktail_name in list(self._pending):
+            if cocktail_name not in keep:
+                self._pending.pop(cocktail_name).cancel()
+
+    def _cached(self, cocktail_name: str, ingredients: str) -> str | None:
+        """Returns a cached description, or None if there is none or the cache
+        cannot be read."""
+
+        if self._cache is None:
+            return None
+        try:
+            return self._cache.get(cocktail_name, ingredients)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read the description cache: {e}")
+            return None
+
+    def _cached_variants(self, cocktail_name: str, ingredients: str) -> int:
+        if self._cache is None:
+            return 0
+        try:
+            return self._cache.count(cocktail_name, ingredients)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read the description cache: {e}")
+            return 0
+
+    def _variants(self) -> int:
+        """Returns the number of descriptions to keep per cocktail."""
+
+        return 1 if self._cache is None else self._cache.variants
+
+    def _generate(self, cocktail_name: str, ingredients: str) -> Future:
+        """Starts generating a description and caches it once it is done."""
+
+        future = self._client.submit(
+            description_messages(cocktail_name, ingredients), purpose="description"
+        )
+        if self._cache is not None:
+            cache = self._cache
+
+            def store(future: Future) -> None:
+                if future.cancelled() or future.exception() is not None:
+                    return
+                if (description := future.result()) == "Error":
+                    return
+                try:
+                    cache.put(cocktail_name, ingredients, description)
+                except sqlite3.Error as e:
+                    logger.warning(f"Could not cache the description: {e}")
+
+            future.add_done_callback(store)
+        return future
+
+
+def pregenerate(
+    cache: DescriptionCache,
+    drinks: list[tuple[str, str]],
+    client: LLMClient,
+    concurrency: int = 8,
+) -> int:
+    """Generates descriptions until every cocktail (name, ingredients) has
+    `cache.variants` of them, with up to `concurrency` calls at a time. These
+    descriptions do not expire. Returns the number of generated descriptions."""
+
+    missing = [
+        (cocktail_name, ingredients)
+        for cocktail_name, ingredients in drinks
+        for _ in range(cache.variants - cache.count(cocktail_name, ingredients))
+    ]
+    logger.info(f"Generating {len(missing)} descriptions of {len(drinks)} cocktails")
+    generated = 0
+    for start in range(0, len(missing), concurrency):
+        batch = missing[start : start + concurrency]
+        futures = [
+            client.submit(
+                description_messages(cocktail_name, ingredients),
+                purpose="description",
+            )
+            for cocktail_name, ingredients in batch
+        ]
+        wait(futures)
+        for (cocktail_name, ingredients), future in zip(batch, futures):
+            if future.exception() is not None:
+                logger.warning(
+                    f"Could not describe {cocktail_name}: {future.exception()}"
+                )
+            elif (description := future.result()) != "Error":
+                cache.put(cocktail_name, ingredients, description, expires=False)
+                generated += 1
+        logger.info(f"{min(start + concurrency, len(missing))}/{len(missing)} done")
+    return generated
+
+
+if __name__ == "__main__":
+    from botender.interaction.drink_recommendation import (
+        DRINKS_DATA_PATH,
+        DrinkRecommender,
+    )
+
+    parser = argparse.ArgumentParser(
+        description="Pre-generate the descriptions of all cocktails"
+    )
+    parser.add_argument("--variants", type=int, default=DEFAULT_VARIANTS)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--drinks", type=str, default=DRINKS_DATA_PATH)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    cache = DescriptionCache(get_cache_path(), PROMPT_VERSION, variants=args.variants)
+    recommender = DrinkRecommender(args.drinks)
+    # Drinks without tastes are never recommended
+    drinks_data = recommender.drinks_data[recommender.scores.sum(axis=1) > 0]
+    drinks = list(
+        dict.fromkeys(zip(drinks_data["Cocktail"], drinks_data["Ingredients"]))
+    )
+    cache.max_entries = max(cache.max_entries, len(drinks) * cache.variants)
+    client = get_llm_client()
+    start_time = time.perf_counter()
+    generated = pregenerate(cache, drinks, client, args.concurrency)
+    print(
+        f"Generated {generated} descriptions in "
+        f"{time.perf_counter() - start_time:.1f}s, {len(cache)} cached in {cache.path}"
+    )
+    client.close()
+    cache.close()
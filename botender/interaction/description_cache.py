@@ -0,0 +1,197 @@
+"""A persistent cache of the LLM-generated cocktail descriptions.
+
+The descriptions are stored in a SQLite database (`BOTENDER_DESCRIPTION_CACHE`, by
+default `~/.cache/botender/descriptions.sqlite3`), keyed by the cocktail name, its
+ingredients and the version of the prompt. Several variants can be kept per
+cocktail so that the robot does not always say the same. Entries expire after a
+time to live, except for pregenerated ones, and the least recently used ones are
+evicted when the cache is full.
+"""
+
+import hashlib
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DESCRIPTION_CACHE_ENV = "BOTENDER_DESCRIPTION_CACHE"
+"""The environment variable that overrides the path of the cache database."""
+DEFAULT_DESCRIPTION_CACHE_PATH = (
+    Path.home() / ".cache" / "botender" / "descriptions.sqlite3"
+)
+"""The cache database used if the environment variable is not set."""
+DEFAULT_MAX_ENTRIES = 5000
+"""The number of descriptions kept before the least recently used are evicted."""
+DEFAULT_TTL = 30 * 24 * 60 * 60.0
+"""Seconds after which a description expires."""
+DEFAULT_VARIANTS = 3
+"""The number of descriptions kept per cocktail."""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS descriptions (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL,
+    cocktail TEXT NOT NULL,
+    description TEXT NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    expires INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS descriptions_key ON descriptions (key);
+CREATE INDEX IF NOT EXISTS descriptions_last_used ON descriptions (last_used);
+"""
+
+
+def get_cache_path() -> Path:
+    """Returns the path of the cache database and creates its directory if
+    necessary."""
+
+    path = Path(os.environ.get(DESCRIPTION_CACHE_ENV, DEFAULT_DESCRIPTION_CACHE_PATH))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+class DescriptionCache:
+    """Stores up to `variants` descriptions per cocktail in SQLite. Safe to use
+    from several threads."""
+
+    path: Path
+    max_entries: int
+    ttl: float | None
+    variants: int
+
+    _connection: sqlite3.Connection
+    _lock: threading.Lock
+    _prompt_version: str
+
+    def __init__(
+        self,
+        path: Path | str,
+        prompt_version: str,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl: float | None = DEFAULT_TTL,
+        variants: int = DEFAULT_VARIANTS,
+    ):
+        """Descriptions of an older `prompt_version` are never returned and expire
+        eventually. A `ttl` of None keeps descriptions until they are evicted."""
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.variants = variants
+        self._prompt_version = prompt_version
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(_SCHEMA)
+            columns = {
+                row[1]
+                for row in self._connection.execute("PRAGMA table_info(descriptions)")
+            }
+            if "expires" not in columns:
+                # Databases created before descriptions could be kept for good
+                self._connection.execute(
+                    "ALTER TABLE descriptions "
+                    "ADD COLUMN expires INTEGER NOT NULL DEFAULT 1"
+                )
+
+    def get(self, cocktail_name: str, ingredients: str) -> str | None:
+        """Returns a random cached description of the cocktail or None."""
+
+        key = self._key(cocktail_name, ingredients)
+        now = time.time()
+        with self._lock, self._connection:
+            rows = self._connection.execute(
+                "SELECT id, description FROM descriptions "
+                "WHERE key = ? AND (created >= ? OR NOT expires)",
+                (key, self._expiry(now)),
+            ).fetchall()
+            if len(rows) == 0:
+                return None
+            row_id, description = random.choice(rows)
+            self._connection.execute(
+                "UPDATE descriptions SET last_used = ? WHERE id = ?", (now, row_id)
+            )
+        return description
+
+    def count(self, cocktail_name: str, ingredients: str) -> int:
+        """Returns the number of cached descriptions of the cocktail."""
+
+        with self._lock:
+            (count,) = self._connection.execute(
+                "SELECT COUNT(*) FROM descriptions "
+                "WHERE key = ? AND (created >= ? OR NOT expires)",
+                (self._key(cocktail_name, ingredients), self._expiry(time.time())),
+            ).fetchone()
+        return count
+
+    def put(
+        self,
+        cocktail_name: str,
+        ingredients: str,
+        description: str,
+        expires: bool = True,
+    ) -> None:
+        """Adds a description of the cocktail and evicts the oldest variant of it
+        and the least recently used descriptions if necessary. Descriptions that do
+        not `expire` are kept until they are evicted."""
+
+        key = self._key(cocktail_name, ingredients)
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO descriptions "
+                "(key, cocktail, description, created, last_used, expires) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, cocktail_name, description, now, now, expires),
+            )
+            self._connection.execute(
+                "DELETE FROM descriptions WHERE key = ? AND id NOT IN "
+                "(SELECT id FROM descriptions WHERE key = ? "
+                "ORDER BY created DESC LIMIT ?)",
+                (key, key, self.variants),
+            )
+            self._evict(now)
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._connection.execute(
+                "SELECT COUNT(*) FROM descriptions"
+            ).fetchone()
+        return count
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _key(self, cocktail_name: str, ingredients: str) -> str:
+        text = "\0".join((self._prompt_version, cocktail_name, ingredients))
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def _expiry(self, now: float) -> float:
+        """Returns the creation time before which descriptions are expired."""
+
+        return -1.0 if self.ttl is None else now - self.ttl
+
+    def _evict(self, now: float) -> None:
+        """Removes the expired and the least recently used descriptions. Expects
+        the lock to be held."""
+
+        self._connection.execute(
+            "DELETE FROM descriptions WHERE created < ? AND expires",
+            (self._expiry(now),),
+        )
+        (count,) = self._connection.execute(
+            "SELECT COUNT(*) FROM descriptions"
+        ).fetchone()
+        if count > self.max_entries:
+            self._connection.execute(
+                "DELETE FROM descriptions WHERE id IN "
+                "(SELECT id FROM descriptions ORDER BY last_used ASC LIMIT ?)",
+                (count - self.max_entries,),
+            )
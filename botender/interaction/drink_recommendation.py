@@ -1,32 +1,160 @@
+"""Recommends cocktails from the drinks dataset for the emotion and the taste
+preference of a guest.
+
+The taste scores in `Category_with_Scales` (e.g. "Sweet(2), Sour(1)") are parsed
+once into a matrix of drinks x tastes, and the ranked candidates of every emotion
+and taste are computed up front. As before, a drink is only recommended for an
+emotion if all of its tastes suit the emotion. A recommendation is then a lookup
+and a random pick among the top candidates.
+"""
+
+import csv
+import io
+import re
+from collections.abc import Iterable
+
+import numpy as np
 import pandas as pd
-import random
+from pkg_resources import resource_filename
+
+DRINKS_DATA_PATH = resource_filename(
+    __name__, "drinks/drinks_with_categories_and_ranks.csv"
+)
+TASTES = ("Sweet", "Sour", "Milk-based", "Strong")
+"""The tastes of the drinks, in the order of the columns of the score matrix."""
+EMOTION_TASTES = {
+    "happy": ("Sweet", "Sour", "Milk-based"),
+    "sad": ("Sweet", "Milk-based"),
+    "angry": ("Sour", "Strong"),
+    "neutral": ("Sweet", "Sour", "Milk-based", "Strong"),
+}
+"""The tastes that suit an emotion. Other emotions are treated as neutral."""
+TOP_K = 10
+"""The number of best candidates a recommendation is picked from."""
+
+COLUMNS = ["Cocktail", "Ingredients", "Category_with_Scales"]
+SCORE_PATTERN = re.compile(r"([\w-]+)\s*(?:\((\d+)\))?")
+"""A taste with an optional score, e.g. "Sweet(2)" or "Strong"."""
+
+
+def read_drinks(dataset_path: str) -> pd.DataFrame:
+    """Reads the drinks dataset. Most of its rows are quoted as a whole, some of
+    them with a line break in the cocktail name, so they are parsed twice."""
+
+    rows = []
+    with open(dataset_path, newline="", encoding="utf-8") as file:
+        reader = csv.reader(file)
+        next(reader)  # Header
+        for row in reader:
+            if len(row) == 1:
+                row = next(csv.reader(io.StringIO(row[0].replace("\n", " "))))
+            if len(row) == len(COLUMNS):
+                rows.append([field.strip() for field in row])
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+def parse_scores(categories: Iterable[str]) -> np.ndarray:
+    """Returns the score matrix of drinks x `TASTES`. A taste without a scale
+    scores 1; unknown categories (e.g. "Missing Data") are ignored."""
+
+    columns = {taste: i for i, taste in enumerate(TASTES)}
+    rows = []
+    for category in categories:
+        row = np.zeros(len(TASTES), dtype=np.int8)
+        for taste, score in SCORE_PATTERN.findall(category):
+            if taste in columns:
+                row[columns[taste]] = int(score) if score else 1
+        rows.append(row)
+    return np.array(rows, dtype=np.int8).reshape(-1, len(TASTES))
+
 
 class DrinkRecommender:
-    def __init__(self, dataset_path):
-        self.drinks_data = pd.read_csv(dataset_path)
-
-    def recommend_drink(self, emotion, taste_preference):
-        emotion_categories = {
-            'happy': ['Sweet', 'Sour', 'Milk-based'],
-            'sad': ['Sweet', 'Milk-based'],
-            'angry': ['Sour', 'Strong'],
-            'neutral': ['Sweet', 'Sour', 'Milk-based','Strong']
+    """Recommends the drinks with the highest score of the preferred taste among
+    those whose tastes all suit the emotion."""
+
+    drinks_data: pd.DataFrame
+    scores: np.ndarray
+    """The taste scores of the drinks (drinks x `TASTES`)."""
+
+    _candidates: dict[tuple[str, str], np.ndarray]
+    _indices: dict[str, list[int]]
+    """The rows of every cocktail name, which is not unique in the dataset."""
+    _rng: np.random.Generator
+
+    def __init__(self, dataset_path: str = DRINKS_DATA_PATH, seed: int | None = None):
+        self.drinks_data = read_drinks(dataset_path)
+        # Drinks without tastes (e.g. "Missing Data") score 0 and are never
+        # candidates
+        self.scores = parse_scores(self.drinks_data["Category_with_Scales"])
+        self._indices = {}
+        for i, name in enumerate(self.drinks_data["Cocktail"]):
+            self._indices.setdefault(name, []).append(i)
+        self._rng = np.random.default_rng(seed)
+        self._candidates = {
+            (emotion, taste): self._rank(emotion, taste)
+            for emotion in EMOTION_TASTES
+            for taste in TASTES
         }
 
-        # Filter for the relevant categories based on emotion
-        relevant_categories = emotion_categories.get(emotion.lower(), [])
-        filtered_drinks = self.drinks_data[self.drinks_data['Category_with_Scales'].isin(relevant_categories)]
+    def candidates(self, emotion: str, taste_preference: str) -> np.ndarray:
+        """Returns the rows of all drinks with the taste that suit the emotion, best
+        first. Empty if the taste does not suit the emotion."""
+
+        emotion = emotion.lower() if emotion.lower() in EMOTION_TASTES else "neutral"
+        return self._candidates.get((emotion, taste_preference), np.empty(0, int))
+
+    def recommend_drink(self, emotion: str, taste_preference: str) -> pd.DataFrame:
+        return self.recommend_drinks(emotion, taste_preference, n=1)
+
+    def recommend_drinks(
+        self,
+        emotion: str,
+        taste_preference: str,
+        n: int,
+        exclude: Iterable[str] = (),
+    ) -> pd.DataFrame:
+        """Randomly selects up to n different drinks from the top 10 for the emotion
+        and taste preference, skipping the cocktails in `exclude`."""
+
+        candidates = self.candidates(emotion, taste_preference)
+        excluded = [i for name in exclude for i in self._indices.get(name, [])]
+        if len(excluded) > 0:
+            candidates = candidates[~np.isin(candidates, excluded)]
+        top = candidates[:TOP_K]
+        selected = self._rng.choice(top, size=min(n, len(top)), replace=False)
+        return self.drinks_data.iloc[selected]
+
+    def recommend_many(
+        self, requests: Iterable[tuple[str, str]], n: int = 1
+    ) -> list[np.ndarray]:
+        """Selects up to n different drinks for each (emotion, taste preference)
+        and returns their rows in `drinks_data`. Requests for the same emotion and
+        taste are drawn together."""
 
-        # Further filter based on taste preference
-        taste_filtered_drinks = filtered_drinks[filtered_drinks['Category_with_Scales'].str.contains(taste_preference)]
+        requests = list(requests)
+        groups: dict[tuple[str, str], list[int]] = {}
+        for i, (emotion, taste_preference) in enumerate(requests):
+            groups.setdefault((emotion.lower(), taste_preference), []).append(i)
 
-        # Sort by the score of the taste preference
-        taste_filtered_drinks['Score'] = taste_filtered_drinks['Category_with_Scales'].apply(
-            lambda x: int(x.split(f'{taste_preference}(')[-1].split(')')[0]) if f'{taste_preference}(' in x else 0
-        )
-        top_drinks = taste_filtered_drinks.sort_values(by='Score', ascending=False).head(10)
+        selections = [np.empty(0, int)] * len(requests)
+        for (emotion, taste_preference), positions in groups.items():
+            top = self.candidates(emotion, taste_preference)[:TOP_K]
+            if len(top) == 0:
+                continue
+            # Random permutations of the top drinks, one per request
+            order = np.argsort(self._rng.random((len(positions), len(top))), axis=1)
+            for position, selected in zip(positions, top[order[:, :n]]):
+                selections[position] = selected
+        return selections
 
-        # Randomly select one from the top 10
-        selected_drink = top_drinks.sample(n=1)
+    def _rank(self, emotion: str, taste: str) -> np.ndarray:
+        """Returns the rows of the drinks with the taste and no taste unsuitable for
+        the emotion, sorted by the score of the taste."""
 
-        return selected_drink[['Cocktail', 'Ingredients', 'Category_with_Scales']]
+        taste_scores = self.scores[:, TASTES.index(taste)]
+        unsuitable = [
+            i for i, t in enumerate(TASTES) if t not in EMOTION_TASTES[emotion]
+        ]
+        suitable = ~(self.scores[:, unsuitable] > 0).any(axis=1)
+        rows = np.flatnonzero((taste_scores > 0) & suitable)
+        return rows[np.argsort(-taste_scores[rows], kind="stable")]
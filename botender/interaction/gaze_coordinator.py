@@ -1,10 +1,12 @@
 import logging
 import time
 from enum import Enum
-from threading import Thread
+from threading import Event, Thread
+from typing import Literal
 
-from furhat_remote_api import FurhatRemoteAPI  # type: ignore
+import numpy as np
 
+from botender.interaction.robot_dispatcher import RobotDispatcher
 from botender.perception.perception_manager import PerceptionManager
 from botender.webcam_processor import Rectangle, WebcamProcessor
 
@@ -17,6 +19,16 @@ GAZE_HEIGHT_COEFFICIENT = 0.05
 # gaze_z = GAZE_Z_MAX - (GAZE_Z_DECREASE * (face_width / frame_width))
 GAZE_Z_MAX = 4
 GAZE_Z_DECREASE = 12.63
+# Number of face width buckets the gaze z value is precomputed for
+GAZE_Z_BUCKETS = 128
+# Seconds after which the gaze of the NONE and IDLE states is sent again
+STATE_REFRESH_INTERVAL = 5.0
+# Seconds without a face after which the gaze filter jumps to the next face
+GAZE_FILTER_RESET_AFTER = 1.0
+
+GazeMode = Literal["smooth", "grid"]
+"""How Furhat follows a face: continuously through a `GazeFilter`, or by looking
+at the center of the grid cell of the face."""
 
 
 class GazeClasses(Enum):
@@ -34,34 +46,117 @@ class GazeClasses(Enum):
     """The robot should look around."""
 
 
+class GazeFilter:
+    """Smooths the gaze target (x, y, z) with an exponential moving average whose
+    time constant is `smoothing_time` seconds. A new target is only released when
+    it moved by more than the dead-band (`dead_band` in x and y, `depth_dead_band`
+    in z) since the last released one, and at most `max_update_rate` times per
+    second."""
+
+    smoothing_time: float
+    dead_band: float
+    depth_dead_band: float
+    max_update_rate: float
+
+    _target: np.ndarray | None = None
+    _last_update_time: float = 0.0
+    _released: np.ndarray | None = None
+    _last_release_time: float = 0.0
+
+    def __init__(
+        self,
+        smoothing_time: float = 0.3,
+        dead_band: float = 0.01,
+        depth_dead_band: float = 0.1,
+        max_update_rate: float = 5.0,
+    ):
+        self.smoothing_time = smoothing_time
+        self.dead_band = dead_band
+        self.depth_dead_band = depth_dead_band
+        self.max_update_rate = max_update_rate
+
+    def update(self, location: np.ndarray, now: float) -> np.ndarray | None:
+        """Adds a raw gaze location. Returns the filtered location if it should be
+        sent to the robot, None otherwise."""
+
+        elapsed = now - self._last_update_time
+        self._last_update_time = now
+        if self._target is None or elapsed > GAZE_FILTER_RESET_AFTER:
+            self._target = location.astype(float)
+        else:
+            alpha = 1 - np.exp(-elapsed / self.smoothing_time)
+            self._target += alpha * (location - self._target)
+
+        if now - self._last_release_time < 1 / self.max_update_rate:
+            return None
+        if self._released is not None:
+            movement = np.abs(self._target - self._released)
+            if (
+                max(movement[0], movement[1]) <= self.dead_band
+                and movement[2] <= self.depth_dead_band
+            ):
+                return None
+        self._released = self._target.copy()
+        self._last_release_time = now
+        return self._released
+
+    def reset(self) -> None:
+        """Forgets the current target, the next location is released as is."""
+
+        self._target = None
+        self._released = None
+
+
 class GazeCoordinatorThread(Thread):
     """The GazeCoordinatorThread is responsible for coordinating the gaze of the robot.
     It is linked to an InteractionCoordinator and receives the gaze commands from it.
+
+    The thread sleeps until the gaze state changes or, while attending a face, until
+    the PerceptionManager publishes a new result. Face updates are sent at most every
+    `min_update_interval` seconds, and only once the face left its last cell by more
+    than `cell_hysteresis` cell sizes.
+
+    In the "smooth" `gaze_mode`, Furhat follows the face continuously through a
+    `GazeFilter` with the given `smoothing_time` instead of looking at the center
+    of the cell of the face.
     """
 
-    _furhat: FurhatRemoteAPI
+    _furhat: RobotDispatcher
     _perception_manager: PerceptionManager
     _webcam_processor: WebcamProcessor
     _stopped: bool = False
     _state: GazeClasses = GazeClasses.NONE
-    _run_loop_speed: float = 0.5  #  0.5 means 2 loops per second
+    _state_changed: Event
+    _new_result: Event
+    _min_update_interval: float
+    _cell_hysteresis: float
+    _gaze_filter: GazeFilter | None = None
 
     # Number of cells per row and column in the grid. It has to be an odd number.
     _number_of_cells_per_side: int
     _frame_width: int = 640
     _frame_height: int = 480
 
-    _grid: list[Rectangle] = []
+    _cell_width: float
+    _cell_height: float
+    # Gaze x and y value of every cell, indexed like the cells (column * n + row)
+    _gaze_table: np.ndarray
+    # Gaze z value of every face width bucket
+    _gaze_z_table: np.ndarray
     _last_face_cell: int = -1
 
     def __init__(
         self,
-        furhat: FurhatRemoteAPI,
+        furhat: RobotDispatcher,
         perception_manager: PerceptionManager,
         webcam_processor: WebcamProcessor,
         frame_width: int = 640,
         frame_height: int = 480,
         number_of_cells_per_side: int = 7,
+        min_update_interval: float = 0.1,
+        cell_hysteresis: float = 0.25,
+        gaze_mode: GazeMode = "smooth",
+        smoothing_time: float = 0.3,
     ):
         super(GazeCoordinatorThread, self).__init__(name="GazeCoordinatorThread")
         self._furhat = furhat
@@ -70,6 +165,13 @@ class GazeCoordinatorThread(Thread):
         self._frame_width = frame_width
         self._frame_height = frame_height
         self._number_of_cells_per_side = number_of_cells_per_side
+        self._min_update_interval = min_update_interval
+        self._cell_hysteresis = cell_hysteresis
+        if gaze_mode == "smooth":
+            self._gaze_filter = GazeFilter(smoothing_time=smoothing_time)
+        self._state_changed = Event()
+        self._new_result = Event()
+        self._perception_manager.add_result_listener(self._new_result)
         self._init_grid()
 
     def stopThread(self):
@@ -77,45 +179,100 @@ class GazeCoordinatorThread(Thread):
 
         logger.debug("Received stop signal. Stopping GazeCoordinatorThread...")
         self._stopped = True
+        self._state_changed.set()
+        self._new_result.set()
 
     def run(self):
         """Runs the GazeCoordinatorThread. Renders the gaze state to the screen
         such that Furhat follows his interaction partner."""
 
         while not self._stopped:
-            start_time = time.monotonic()
-            # Render the gaze state to the screen
-            if self._state == GazeClasses.NONE:
-                self._handle_none()
-            elif self._state == GazeClasses.IDLE:
-                self._handle_idle()
-            elif self._state == GazeClasses.FACE:
+            # Clear before reading the state so that a change in between is not lost
+            self._state_changed.clear()
+            state = self._state
+            if state == GazeClasses.FACE:
+                # Wait for new face data
+                self._new_result.wait()
+                self._new_result.clear()
+                if self._stopped or self._state != GazeClasses.FACE:
+                    continue
+                start_time = time.monotonic()
                 self._handle_attend_face()
-                continue
-            end_time = time.monotonic()
-            time.sleep(max(0, self._run_loop_speed - (end_time - start_time)))
+                # Results arriving in the meantime are coalesced into one update
+                end_time = time.monotonic()
+                time.sleep(max(0, self._min_update_interval - (end_time - start_time)))
+            else:
+                if self._gaze_filter is not None:
+                    # Jump to the face once we attend one again
+                    self._gaze_filter.reset()
+                if state == GazeClasses.NONE:
+                    self._handle_none()
+                else:
+                    self._handle_idle()
+                self._state_changed.wait(STATE_REFRESH_INTERVAL)
 
     def _init_grid(self):
-        """Initializes the grid and adds it to the gui."""
+        """Precomputes the gaze location of every cell and adds the grid to the
+        gui."""
 
         # Calculate the size of a cell
-        cell_width = self._frame_width / self._number_of_cells_per_side
-        cell_height = self._frame_height / self._number_of_cells_per_side
-
-        # Initialize the grid
-        self._grid = []
-        for i in range(self._number_of_cells_per_side):
-            for j in range(self._number_of_cells_per_side):
-                self._grid.append(
-                    (
-                        (i * cell_width, j * cell_height),
-                        ((i + 1) * cell_width, (j + 1) * cell_height),
-                    )
-                )
+        n = self._number_of_cells_per_side
+        self._cell_width = self._frame_width / n
+        self._cell_height = self._frame_height / n
+
+        # Calculates the location that furhat should look at for every cell center
+        columns, rows = np.divmod(np.arange(n * n), n)
+        self._gaze_table = np.stack(
+            self._gaze_xy(
+                (columns + 0.5) * self._cell_width, (rows + 0.5) * self._cell_height
+            ),
+            axis=1,
+        )
 
+        # ...and the distance for every face width bucket
+        face_widths = (np.arange(GAZE_Z_BUCKETS) + 0.5) / GAZE_Z_BUCKETS
+        self._gaze_z_table = self._gaze_z(face_widths * self._frame_width)
+
+        # Draw the grid as one rectangle per column and row
+        grid: list[Rectangle] = []
+        for i in range(n):
+            grid.append(
+                (
+                    (i * self._cell_width, 0),
+                    ((i + 1) * self._cell_width, self._frame_height),
+                )
+            )
+            grid.append(
+                (
+                    (0, i * self._cell_height),
+                    (self._frame_width, (i + 1) * self._cell_height),
+                )
+            )
         self._webcam_processor.add_rectangles_to_current_frame(
-            self._grid, color=(0, 0, 255), modifier_key="grid"
+            grid, color=(0, 0, 255), modifier_key="grid"
+        )
+
+    def _gaze_xy(self, center_x, center_y):
+        """Returns the gaze x and y value for a point (or arrays of points) in the
+        frame."""
+
+        frame_center = (self._frame_width / 2, self._frame_height / 2)
+        gaze_x = (
+            (frame_center[0] - center_x)
+            / (self._frame_width / 2)
+            * GAZE_SCALE_COEFFICIENT
         )
+        gaze_y = (
+            (frame_center[1] - center_y) / (self._frame_height / 2)
+            + GAZE_HEIGHT_COEFFICIENT
+        ) * GAZE_SCALE_COEFFICIENT
+        return gaze_x, gaze_y
+
+    def _gaze_z(self, face_width):
+        """Returns the gaze z value for a face (or an array of faces) of the given
+        width in pixels."""
+
+        return GAZE_Z_MAX - GAZE_Z_DECREASE * (face_width / self._frame_width)
 
     def _handle_none(self):
         """Handles the none gaze command."""
@@ -138,42 +295,49 @@ class GazeCoordinatorThread(Thread):
         if self._perception_manager.face_presence_counter < 10:
             return
 
-        try:
-            # Get the current face from the perception manager. Select the first face if more than one is present.
-            face = self._perception_manager.current_result.faces[0]
-        except IndexError:
+        # Follow the face that has been tracked for the longest time
+        face = self._perception_manager.current_result.primary_face
+        if face is None:
+            return
+
+        if self._gaze_filter is not None:
+            self._follow_face(face, self._gaze_filter)
             return
 
         # Get the cell of the face
         cell = self._get_cell_of_face(face)
+        if cell == -1:
+            return
 
-        # Calculate the center of the cell
-        cell_center = (
-            (self._grid[cell][0][0] + self._grid[cell][1][0]) / 2,
-            (self._grid[cell][0][1] + self._grid[cell][1][1]) / 2,
-        )
-
-        # Calculates the location that furhat should look at
-        frame_center = (self._frame_width / 2, self._frame_height / 2)
-        x = (
-            (frame_center[0] - cell_center[0])
-            / (self._frame_width / 2)
-            * GAZE_SCALE_COEFFICIENT
-        )
-        y = (
-            (frame_center[1] - cell_center[1]) / (self._frame_height / 2)
-            + GAZE_HEIGHT_COEFFICIENT
-        ) * GAZE_SCALE_COEFFICIENT
-        z = GAZE_Z_MAX - (
-            GAZE_Z_DECREASE * ((face[1][0] - face[0][0]) / self._frame_width)
-        )
+        # Look up the location that furhat should look at
+        x, y = self._gaze_table[cell]
+        face_width = (face[1][0] - face[0][0]) / self._frame_width
+        bucket = min(max(int(face_width * GAZE_Z_BUCKETS), 0), GAZE_Z_BUCKETS - 1)
+        z = self._gaze_z_table[bucket]
         location = f"{x},{y},{z}"
 
-        # Call the attend function of the furhat remote api if the face is in a different cell than the last face
-        if cell != self._last_face_cell:
+        # Call the attend function of the furhat remote api if the face moved to a
+        # different cell than the last face, with some margin around the last cell
+        if cell != self._last_face_cell and not self._is_near_cell(
+            face, self._last_face_cell
+        ):
             self._furhat.attend(location=location)
             self._last_face_cell = cell
 
+    def _follow_face(self, face: Rectangle, gaze_filter: GazeFilter):
+        """Sends the filtered location of the face to furhat if it moved enough."""
+
+        gaze_x, gaze_y = self._gaze_xy(
+            (face[0][0] + face[1][0]) / 2, (face[0][1] + face[1][1]) / 2
+        )
+        gaze_z = self._gaze_z(face[1][0] - face[0][0])
+        location = gaze_filter.update(
+            np.array([gaze_x, gaze_y, gaze_z]), time.monotonic()
+        )
+        if location is not None:
+            x, y, z = location
+            self._furhat.attend(location=f"{x},{y},{z}")
+
     def _get_cell_of_face(self, face: Rectangle) -> int:
         """Returns the cell index of the given face.
         If the face is not in the grid, -1 is returned."""
@@ -184,20 +348,47 @@ class GazeCoordinatorThread(Thread):
             (face[0][1] + face[1][1]) / 2,
         )
 
+        if not (
+            0 <= face_center[0] <= self._frame_width
+            and 0 <= face_center[1] <= self._frame_height
+        ):
+            return -1
+
         # Find the cell that contains the face
-        for i in range(len(self._grid)):
-            if (
-                self._grid[i][0][0] <= face_center[0] <= self._grid[i][1][0]
-                and self._grid[i][0][1] <= face_center[1] <= self._grid[i][1][1]
-            ):
-                return i
+        n = self._number_of_cells_per_side
+        column = min(int(face_center[0] // self._cell_width), n - 1)
+        row = min(int(face_center[1] // self._cell_height), n - 1)
+        return column * n + row
+
+    def _is_near_cell(self, face: Rectangle, cell: int) -> bool:
+        """Returns True if the center of the face lies within the given cell enlarged
+        by the hysteresis on every side."""
 
-        return -1
+        if cell == -1:
+            return False
+
+        face_center = (
+            (face[0][0] + face[1][0]) / 2,
+            (face[0][1] + face[1][1]) / 2,
+        )
+        column, row = divmod(cell, self._number_of_cells_per_side)
+        margin_x = self._cell_hysteresis * self._cell_width
+        margin_y = self._cell_hysteresis * self._cell_height
+        return (
+            column * self._cell_width - margin_x
+            <= face_center[0]
+            <= (column + 1) * self._cell_width + margin_x
+            and row * self._cell_height - margin_y
+            <= face_center[1]
+            <= (row + 1) * self._cell_height + margin_y
+        )
 
     def set_gaze_state(self, state: GazeClasses):
         """Sets the gaze state of the robot."""
 
         if self._state != state:
             self._state = state
+            self._state_changed.set()
+            self._new_result.set()
             logger.info(f"Setting gaze state to {state}")
             # self._webcam_processor.update_debug_info("Gaze State", self._state)
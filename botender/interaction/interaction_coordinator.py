@@ -4,49 +4,50 @@ import logging
 import os
 import time
 from abc import ABC, abstractmethod
+from collections.abc import Iterable
 from typing import Literal
 
 import numpy as np
-from furhat_remote_api import FurhatRemoteAPI  # type: ignore
-from openai import OpenAI
+from openai import OpenAIError
 from openai.types.chat import ChatCompletionMessageParam
-from pkg_resources import resource_filename
 
 from botender.interaction import gestures
-from botender.interaction.drink_recommendation import DrinkRecommender
+from botender.interaction.cocktail_descriptions import (
+    PREFETCH_CANDIDATES,
+    DescriptionPrefetcher,
+)
+from botender.interaction.drink_recommendation import (
+    DRINKS_DATA_PATH,
+    TASTES,
+    DrinkRecommender,
+)
 from botender.interaction.gaze_coordinator import GazeClasses, GazeCoordinatorThread
+from botender.interaction.llm_client import get_llm_client
+from botender.interaction.nlu import get_nlu
+from botender.interaction.robot_dispatcher import RobotDispatcher
 from botender.perception.detectors.speech_detector import SpeechDetector
 from botender.perception.perception_manager import PerceptionManager
 from botender.webcam_processor import WebcamProcessor
 
 logger = logging.getLogger(__name__)
 
-DRINKS_DATA_PATH = resource_filename(
-    __name__, "drinks/drinks_with_categories_and_ranks.csv"
-)
-
 
-def get_openai_response(messages: list[ChatCompletionMessageParam]) -> str:
-    """Returns the response from OpenAI API"""
-    client = OpenAI()
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=messages,
-        temperature=1,
-        max_tokens=256,
-        top_p=1,
-        frequency_penalty=0,
-        presence_penalty=0,
-    )
-    if (answer := response.choices[0].message.content) is None:
-        raise ValueError("OpenAI API returned None")
-    logger.debug(f"OpenAI API response: {answer}")
-    return answer
+def get_openai_response(
+    messages: list[ChatCompletionMessageParam], purpose: str = "chat"
+) -> str:
+    """Returns the response from OpenAI API. Raises a ValueError if the call failed
+    or missed its deadline."""
+    try:
+        return get_llm_client().complete(messages, purpose=purpose)
+    except OpenAIError as e:
+        raise ValueError("OpenAI API call failed") from e
 
 
 def get_valence_from_message(message: str) -> Literal["Positive"] | Literal["Negative"]:
     """Returns the valence from the message"""
 
+    if (valence := get_nlu().valence(message)) is not None:
+        return valence
     if os.getenv("ENABLE_OPENAI_API") != "True":
         return "Positive"
 
@@ -79,7 +80,7 @@ def get_valence_from_message(message: str) -> Literal["Positive"] | Literal["Neg
         },
     ]
     try:
-        valence = get_openai_response(chat_messages)  # type: ignore[arg-type]
+        valence = get_openai_response(chat_messages, "valence")  # type: ignore[arg-type]
         if valence == "Error":
             raise ValueError("OpenAI API returned Error")
         if valence not in ["Positive", "Negative"]:
@@ -101,8 +102,14 @@ class InteractionCoordinator:
     _webcam_processor: WebcamProcessor
     _speech_detector: SpeechDetector
     _gaze_coordinator: GazeCoordinatorThread
-    _furhat: FurhatRemoteAPI
+    _furhat: RobotDispatcher
     _recommender: DrinkRecommender
+    _description_prefetcher: DescriptionPrefetcher
+    _drink_candidates: list[tuple[str, str]]
+    """The next cocktails to recommend (name, ingredients)."""
+    _speculative_candidates: dict[str, tuple[str, str]]
+    """The first cocktail of every taste, picked before the taste is known."""
+    _recommended_drinks: set[str]
     _state: InteractionState
     _previous_state: InteractionState | None
     _last_emotion_detection: float = 0
@@ -113,7 +120,7 @@ class InteractionCoordinator:
         perception_manager: PerceptionManager,
         webcam_processor: WebcamProcessor,
         gaze_coordinator: GazeCoordinatorThread,
-        furhat: FurhatRemoteAPI,
+        furhat: RobotDispatcher,
     ):
         self._perception_manager = (
             perception_manager  # Used to get results from perception subsystem
@@ -122,6 +129,10 @@ class InteractionCoordinator:
         self._furhat = furhat  # Used to interact with Furhat
         self._gaze_coordinator = gaze_coordinator
         self._recommender = DrinkRecommender(DRINKS_DATA_PATH)
+        self._description_prefetcher = DescriptionPrefetcher()
+        self._drink_candidates = []
+        self._speculative_candidates = {}
+        self._recommended_drinks = set()
         self._speech_detector = SpeechDetector(self._furhat)
         self._state = None  # type: ignore[assignment]
         self.transition_to(GreetingState())  # Initial state
@@ -153,6 +164,78 @@ class InteractionCoordinator:
             return "neutral"
         return self._perception_manager.current_result.emotion
 
+    def speculate_recommendations(self) -> None:
+        """Picks the first cocktail of every taste that suits the current emotion
+        and starts generating their descriptions while the user is still telling
+        which taste they prefer."""
+        emotion = self.get_emotion()
+        for taste in TASTES:
+            if taste in self._speculative_candidates:
+                continue
+            for candidate in self._pick_drinks(emotion, taste, 1):
+                self._speculative_candidates[taste] = candidate
+                self._description_prefetcher.prefetch(*candidate)
+
+    def prefetch_recommendations(self, taste_preference: str) -> None:
+        """Picks the next cocktails to recommend for the current emotion and the
+        taste preference, starting with the one picked speculatively, and starts
+        generating their descriptions in the background. Descriptions of other
+        cocktails are cancelled."""
+        candidates = []
+        if (candidate := self._speculative_candidates.get(taste_preference)) and (
+            candidate[0] not in self._recommended_drinks
+        ):
+            candidates.append(candidate)
+        self._speculative_candidates = {}
+        candidates += self._pick_drinks(
+            self.get_emotion(),
+            taste_preference,
+            PREFETCH_CANDIDATES - len(candidates),
+            exclude=[cocktail_name for cocktail_name, _ in candidates],
+        )
+        self._drink_candidates = candidates
+        self._description_prefetcher.discard(
+            keep=[cocktail_name for cocktail_name, _ in candidates]
+        )
+        for cocktail_name, ingredients in candidates:
+            self._description_prefetcher.prefetch(cocktail_name, ingredients)
+
+    def next_recommendation(self, taste_preference: str) -> tuple[str, str] | None:
+        """Returns the next cocktail to recommend (name, ingredients), or None if
+        there is none."""
+        if len(self._drink_candidates) == 0:
+            self.prefetch_recommendations(taste_preference)
+        if len(self._drink_candidates) == 0:
+            return None
+        cocktail_name, ingredients = self._drink_candidates.pop(0)
+        self._recommended_drinks.add(cocktail_name)
+        if len(self._drink_candidates) == 0:
+            # Have the next ones ready in case the user rejects this one, without
+            # cancelling the description of this one
+            self._drink_candidates = self._pick_drinks(
+                self.get_emotion(), taste_preference, PREFETCH_CANDIDATES
+            )
+            for candidate in self._drink_candidates:
+                self._description_prefetcher.prefetch(*candidate)
+        return cocktail_name, ingredients
+
+    def _pick_drinks(
+        self, emotion: str, taste_preference: str, n: int, exclude: Iterable[str] = ()
+    ) -> list[tuple[str, str]]:
+        """Picks up to n cocktails (name, ingredients) that were not recommended
+        yet."""
+        drinks = self._recommender.recommend_drinks(
+            emotion,
+            taste_preference,
+            n,
+            exclude=[*self._recommended_drinks, *exclude],
+        )
+        return list(zip(drinks["Cocktail"], drinks["Ingredients"]))
+
+    def describe_cocktail(self, cocktail_name: str, ingredients: str) -> str:
+        """Returns the description of a cocktail, prefetched if possible."""
+        return self._description_prefetcher.describe(cocktail_name, ingredients)
+
     def set_gaze(self, gaze_class: GazeClasses) -> None:
         """Sets the gaze to follow the user."""
         self._gaze_coordinator.set_gaze_state(gaze_class)
@@ -164,6 +247,8 @@ class InteractionCoordinator:
         self.handle()
 
         if isinstance(self._state, FarewellState):
+            self._speculative_candidates = {}
+            self._description_prefetcher.discard()
             self.handle()  # One more time to say goodbye
             logger.info("Interaction finished.")
             return None
@@ -247,6 +332,8 @@ class IntroductionState(InteractionState):
     def get_name_from_message(message: str) -> str:
         """Returns the name from the message"""
 
+        if (name := get_nlu().name(message)) is not None:
+            return name
         if os.getenv("ENABLE_OPENAI_API") != "True":
             return "Paul"
 
@@ -261,7 +348,7 @@ class IntroductionState(InteractionState):
             },
         ]
         try:
-            name = get_openai_response(chat_messages)  # type: ignore[arg-type]
+            name = get_openai_response(chat_messages, "name")  # type: ignore[arg-type]
             if name == "Error":
                 raise ValueError("OpenAI API returned Error")
         except ValueError as e:
@@ -399,6 +486,8 @@ class AskTastePreference(InteractionState):
     def get_taste_preference_from_message(self, message: str) -> TASTE:
         """Returns the taste preference from the message"""
 
+        if (taste_preference := get_nlu().taste(message)) is not None:
+            return taste_preference
         if os.getenv("ENABLE_OPENAI_API") != "True":
             return "Sour"
 
@@ -434,7 +523,7 @@ class AskTastePreference(InteractionState):
             },
         ]
         try:
-            taste_preference = get_openai_response(chat_messages)  # type: ignore[arg-type]
+            taste_preference = get_openai_response(chat_messages, "taste")  # type: ignore[arg-type]
             if taste_preference == "Error":
                 raise ValueError("OpenAI API returned Error")
             if taste_preference not in ["Sour", "Sweet", "Milk-based", "Strong"]:
@@ -452,6 +541,8 @@ class AskTastePreference(InteractionState):
         ]
         furhat.say(text=taste_preference_question, blocking=True)
 
+        # Describe a cocktail of every taste while the user is answering
+        self.context.speculate_recommendations()
         user_response = self.context.listen()
 
         try:
@@ -465,6 +556,7 @@ class AskTastePreference(InteractionState):
             return
 
         self.context.user_info["taste_preference"] = taste_preference
+        self.context.prefetch_recommendations(taste_preference)
 
         self.context.transition_to(RecommendDrinksState())
 
@@ -472,45 +564,8 @@ class AskTastePreference(InteractionState):
 class RecommendDrinksState(InteractionState):
     """State to start the drink recommendation flow"""
 
-    def generate_cocktail_description(self, cocktail_name: str, ingredients: str):
-        """Returns a cocktail description based on the ingredients"""
-
-        default_description = f"I can recommend you a {cocktail_name}."
-
-        if os.getenv("ENABLE_OPENAI_API") != "True":
-            return default_description
-
-        chat_messages = [
-            {
-                "role": "system",
-                "content": """You are an endpoint.
-                    You will receive a cocktail name along with its ingredients.
-                    Your task is to generate an enticing but short description of the
-                    cocktail in the following format: I can recommend you a "cocktailname".
-                    It is _ Examples: Input:  KING OF KINGSTON,"1 ounce gin, 1 teaspoon grapefruit, 0.5 ounce creme de,
-                    1 teaspoon grenadine, 1 ounce pineapple juice1 ounce heavy cream, 1 ounce dark rum,
-                    1 ounce light rum, Â½ ounce cherry brandy 1 pineapple slice, 4 ounces pineapple juiceYour response:
-                    I can recommend you a King of Kingston. It is a delightful mix with a high sweetness score,
-                    combining the unique flavors of grapefruit and pineapple with a touch of creamy crème de cacao.""",
-            },
-            {
-                "role": "user",
-                "content": f'name: "{cocktail_name}" , ingredients: {ingredients}',
-            },
-        ]
-        try:
-            cocktail_description = get_openai_response(chat_messages)  # type: ignore[arg-type]
-            if cocktail_description == "Error":
-                raise ValueError("OpenAI API returned Error")
-        except ValueError:
-            return default_description
-
-        return cocktail_description  # type: ignore[return-value]
-
     def handle(self):
-        recommender = self.context._recommender
         furhat = self.context._furhat
-        emotion = self.context.get_emotion()
 
         taste_preference = self.context.user_info["taste_preference"]
 
@@ -518,18 +573,16 @@ class RecommendDrinksState(InteractionState):
             self.context.transition_to(AskTastePreference())
             return
 
-        # Call the recommend_drink method to get a recommendation
-        random_recommendation = recommender.recommend_drink(emotion, taste_preference)
+        # Take the next of the recommendations picked when the taste was known
+        recommendation = self.context.next_recommendation(taste_preference)
 
-        # Since the recommendation is a DataFrame, extract the first row
-        # and access the 'Cocktail' and 'Ingredients' columns
-        if not random_recommendation.empty:
-            cocktail_name = random_recommendation["Cocktail"].iloc[0]
+        if recommendation is not None:
+            cocktail_name, ingredients = recommendation
             self.context.user_info["cocktail_name"] = cocktail_name
-            ingredients = random_recommendation["Ingredients"].iloc[0]
 
             furhat.gesture(body=gestures.get_random_gesture("thinking"), blocking=False)
-            cocktail_description = self.generate_cocktail_description(
+            # Usually generated in the background already
+            cocktail_description = self.context.describe_cocktail(
                 cocktail_name, ingredients
             )
             furhat.say(text=cocktail_description, blocking=True)
@@ -0,0 +1,242 @@
+"""Drives the interaction and gaze loops end-to-end against the mock Furhat server
+and reports the rates and latencies of the robot commands.
+
+A scripted perception source stands in for the camera and the detection pipeline:
+guests walk up, stay for a while with a slowly swaying face and leave again.
+
+Run e.g. `python -m botender.interaction.interaction_harness --duration 120
+--latency lognormal:40:20` for a two minute soak test.
+"""
+
+import argparse
+import logging
+import math
+import threading
+import time
+from typing import get_args
+
+from botender.interaction.gaze_coordinator import GazeMode
+from botender.interaction.interaction_manager import InteractionManagerThread
+from botender.interaction.mock_furhat import (
+    DEFAULT_LISTEN_RESPONSES,
+    LatencyDistribution,
+    MockFurhatServer,
+    parse_endpoint_latency,
+)
+from botender.perception.detection_worker import DetectionResult
+
+logger = logging.getLogger(__name__)
+
+
+class ScriptedPerception(threading.Thread):
+    """Stands in for the PerceptionManager. Publishes a result `fps` times per
+    second; a guest arrives after `away` seconds, stays for `stay` seconds and
+    leaves again."""
+
+    _fps: float
+    _stay: float
+    _away: float
+    _frame_width: int
+    _frame_height: int
+    _emotion: str
+    _current_result: DetectionResult | None = None
+    _face_presence_counter: int = 0
+    _result_listeners: list[threading.Event]
+    _stopped: bool = False
+
+    def __init__(
+        self,
+        fps: float = 30.0,
+        stay: float = 60.0,
+        away: float = 5.0,
+        frame_width: int = 640,
+        frame_height: int = 480,
+        emotion: str = "happy",
+    ):
+        super().__init__(name="ScriptedPerception", daemon=True)
+        self._fps = fps
+        self._stay = stay
+        self._away = away
+        self._frame_width = frame_width
+        self._frame_height = frame_height
+        self._emotion = emotion
+        self._result_listeners = []
+
+    def run(self) -> None:
+        start_time = time.monotonic()
+        sequence = 0
+        while not self._stopped:
+            now = time.monotonic()
+            elapsed = (now - start_time) % (self._away + self._stay)
+            faces = []
+            if elapsed >= self._away:
+                # Sway around the center of the frame
+                center_x = self._frame_width * (0.5 + 0.15 * math.sin(now / 2))
+                center_y = self._frame_height * (0.4 + 0.05 * math.sin(now / 3))
+                faces = [
+                    ((center_x - 50, center_y - 60), (center_x + 50, center_y + 60))
+                ]
+            sequence += 1
+            self._current_result = DetectionResult(
+                faces,
+                self._emotion,
+                frame_sequence=sequence,
+                frame_timestamp=now,
+                faces_timestamp=now,
+                emotion_timestamp=now,
+            )
+            if len(faces) > 0:
+                self._face_presence_counter += 1
+            else:
+                self._face_presence_counter = 0
+            for listener in self._result_listeners:
+                listener.set()
+            time.sleep(max(0, 1 / self._fps - (time.monotonic() - now)))
+
+    def stop(self) -> None:
+        self._stopped = True
+
+    @property
+    def current_result(self) -> DetectionResult | None:
+        return self._current_result
+
+    @property
+    def face_present(self) -> bool:
+        result = self._current_result
+        return result is not None and len(result.faces) > 0
+
+    @property
+    def face_presence_counter(self) -> int:
+        return self._face_presence_counter
+
+    def detect_emotion(self) -> None:
+        pass
+
+    def add_result_listener(self, listener: threading.Event) -> None:
+        self._result_listeners.append(listener)
+
+
+class HeadlessDisplay:
+    """Stands in for the WebcamProcessor and keeps the debug info."""
+
+    debug_info: dict[str, str]
+
+    def __init__(self):
+        self.debug_info = {}
+
+    def update_debug_info(self, key: str, value: str) -> None:
+        self.debug_info[key] = value
+
+    def add_rectangles_to_current_frame(self, *args, **kwargs) -> None:
+        pass
+
+
+def run_harness(
+    server: MockFurhatServer,
+    duration: float,
+    perception: ScriptedPerception,
+    gaze_mode: GazeMode = "smooth",
+) -> None:
+    """Runs the InteractionManagerThread against the server for `duration` seconds
+    and prints the command rates and latencies."""
+
+    host, _ = server.address
+    display = HeadlessDisplay()
+    perception.start()
+    interaction_thread = InteractionManagerThread(
+        perception,  # type: ignore[arg-type]
+        display,  # type: ignore[arg-type]
+        host,
+        gaze_mode=gaze_mode,
+    )
+    interaction_thread.daemon = True
+    interaction_thread.start()
+    time.sleep(duration)
+
+    robot = interaction_thread.robot
+    client_latency = robot.latency_percentiles()
+    coalesced = robot.coalesced
+    interaction_thread.stopThread()
+    interaction_thread.join(5)
+    perception.stop()
+
+    print(f"{duration:.0f}s against the mock Furhat at {host}")
+    print(
+        f"{'endpoint':>10} {'requests':>9} {'rate/s':>7} {'server p50':>11} "
+        f"{'client p50':>11} {'client p90':>11} {'client p99':>11} {'coalesced':>10}"
+    )
+    commands = {
+        "say": "say",
+        "listen": "listen",
+        "attend": "attend",
+        "gesture": "gesture",
+        "led": "set_led",
+        "face": "set_face",
+        "voice": "set_voice",
+    }
+    for endpoint, count in sorted(server.requests.items()):
+        command = commands.get(endpoint, endpoint)
+        server_p50 = server.request_latency[endpoint].percentiles((50,)).get(50, 0.0)
+        latency = client_latency.get(command, {})
+        print(
+            f"{endpoint:>10} {count:>9} {count / duration:>7.2f} "
+            f"{server_p50 * 1000:>9.1f}ms "
+            + " ".join(
+                f"{latency.get(p, float('nan')) * 1000:>9.1f}ms" for p in (50, 90, 99)
+            )
+            + f" {coalesced.get(command, 0):>10}"
+        )
+    print(
+        f"{server.connections} connections for {sum(server.requests.values())} requests"
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Botender interaction harness")
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument(
+        "--stay", type=float, default=60.0, help="Seconds a guest stays"
+    )
+    parser.add_argument(
+        "--away", type=float, default=5.0, help="Seconds between two guests"
+    )
+    parser.add_argument(
+        "--latency",
+        type=LatencyDistribution.parse,
+        default=LatencyDistribution(),
+        help="Default latency as kind:mean_ms[:spread_ms]",
+    )
+    parser.add_argument(
+        "--endpoint-latency",
+        nargs="*",
+        default=[],
+        help="Per-endpoint latencies as endpoint=kind:mean_ms[:spread_ms]",
+    )
+    parser.add_argument("--listen", nargs="+", default=list(DEFAULT_LISTEN_RESPONSES))
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(
+        "--gaze-mode", type=str, choices=get_args(GazeMode), default="smooth"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    server = MockFurhatServer(
+        latency=args.latency,
+        endpoint_latency=parse_endpoint_latency(args.endpoint_latency),
+        listen_responses=tuple(args.listen),
+        seed=args.seed,
+    )
+    server.start()
+    try:
+        run_harness(
+            server,
+            args.duration,
+            ScriptedPerception(fps=args.fps, stay=args.stay, away=args.away),
+            args.gaze_mode,
+        )
+    finally:
+        server.shutdown()
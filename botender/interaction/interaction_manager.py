@@ -5,9 +5,16 @@ from threading import Thread
 import numpy as np
 from furhat_remote_api import FurhatRemoteAPI  # type: ignore
 
-from botender.interaction.gaze_coordinator import GazeClasses, GazeCoordinatorThread
+from botender.interaction.gaze_coordinator import (
+    GazeClasses,
+    GazeCoordinatorThread,
+    GazeMode,
+)
 from botender.interaction.gestures import get_random_gesture
 from botender.interaction.interaction_coordinator import InteractionCoordinator
+from botender.interaction.llm_client import get_llm_client
+from botender.interaction.nlu import get_nlu
+from botender.interaction.robot_dispatcher import CommandPriority, RobotDispatcher
 from botender.perception.perception_manager import PerceptionManager
 from botender.webcam_processor import WebcamProcessor
 
@@ -29,7 +36,7 @@ class InteractionManagerThread(Thread):
     _webcam_processor: WebcamProcessor
     _gaze_coordinator: GazeCoordinatorThread
     _current_interaction: InteractionCoordinator | None = None
-    _furhat: FurhatRemoteAPI
+    _furhat: RobotDispatcher
     _face_present_frame_counter: int = 0
     _run_loop_speed: float = 1.0  #  1.0 means 1 loop per second
 
@@ -41,6 +48,7 @@ class InteractionManagerThread(Thread):
         frame_width: int = 640,
         frame_height: int = 480,
         number_of_cells_per_side: int = 7,
+        gaze_mode: GazeMode = "smooth",
     ):
         super(InteractionManagerThread, self).__init__(name="InteractionManagerThread")
         self._perception_manager = perception_manager
@@ -53,16 +61,18 @@ class InteractionManagerThread(Thread):
             frame_width,
             frame_height,
             number_of_cells_per_side,
+            gaze_mode=gaze_mode,
         )
 
         logger.debug("Spawning GazeCoordinatorThread...")
         self._gaze_coordinator.start()
 
-    def _init_furhat(self, furhat_remote_address: str) -> FurhatRemoteAPI:
-        """Initializes the FurhatRemoteAPI object."""
+    def _init_furhat(self, furhat_remote_address: str) -> RobotDispatcher:
+        """Initializes the FurhatRemoteAPI object and the dispatcher that sends
+        all commands to it."""
 
         logger.debug("Initializing FurhatRemoteAPI...")
-        furhat = FurhatRemoteAPI(furhat_remote_address)
+        furhat = RobotDispatcher(FurhatRemoteAPI(furhat_remote_address))
         FACE = "Patricia"
         MASK = "Adult"
         VOICE = "BellaNeural"
@@ -73,6 +83,12 @@ class InteractionManagerThread(Thread):
         logger.debug("FurhatRemoteAPI initialized.")
         return furhat
 
+    @property
+    def robot(self) -> RobotDispatcher:
+        """Returns the dispatcher that sends the commands to Furhat."""
+
+        return self._furhat
+
     def stopThread(self):
         """Stops the Gazecoordinator and the InteractionManagerThread. Sets furhat to
         idle state."""
@@ -120,9 +136,19 @@ class InteractionManagerThread(Thread):
                     # ~ 30 FPS -> 1 idle gesture every 5 seconds -> p = 1/150
                     if np.random.choice(690) <= 69:
                         gesture = get_random_gesture("idle")
-                        self._furhat.gesture(body=gesture, blocking=False)
+                        self._furhat.gesture(
+                            body=gesture, blocking=False, priority=CommandPriority.IDLE
+                        )
+
+            self._webcam_processor.update_debug_info("Robot", self._furhat.summary())
+            self._webcam_processor.update_debug_info(
+                "NLU", get_nlu().summary(get_llm_client().latency_percentiles((50,)))
+            )
 
             end_time = time.monotonic()
             time.sleep(max(0, self._run_loop_speed - (end_time - start_time)))
             # else: randomly add whistles or other idle sounds and gestures
+        # Only now that no interaction waits for the robot or the LLM anymore
+        self._furhat.shutdown()
+        get_llm_client().close()
         logger.info("Received stop signal. Exiting...")
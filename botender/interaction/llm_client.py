@@ -0,0 +1,201 @@
+"""A long-lived client for the OpenAI chat completions API.
+
+The client keeps one connection pool for the lifetime of botender and gives every
+call a deadline. Calls can also be issued in the background on an asyncio event
+loop (`submit`), e.g. while the robot is still speaking. The API is configured
+with the usual environment variables (`OPENAI_API_KEY`, `OPENAI_BASE_URL`); point
+the latter to `mock_openai` to run without the real API.
+"""
+
+import asyncio
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+from openai import AsyncOpenAI, OpenAI
+from openai.types.chat import ChatCompletionMessageParam
+
+from botender.metrics import LatencyTracker
+
+logger = logging.getLogger(__name__)
+
+MODEL = "gpt-3.5-turbo"
+"""The chat model botender talks to."""
+DEFAULT_TIMEOUT = 10.0
+"""Seconds after which a call is abandoned."""
+COMPLETION_PARAMETERS = {
+    "temperature": 1,
+    "max_tokens": 256,
+    "top_p": 1,
+    "frequency_penalty": 0,
+    "presence_penalty": 0,
+}
+"""The sampling parameters of every completion."""
+
+
+class LLMClient:
+    """Sends chat completions over a persistent connection pool. The synchronous
+    and the asynchronous client are created on first use; the asynchronous one
+    lives on a background event loop. Latencies are recorded per `purpose`."""
+
+    timeout: float
+    max_retries: int
+    model: str
+
+    _base_url: str | None
+    _client: OpenAI | None = None
+    _async_client: AsyncOpenAI | None = None
+    _loop: asyncio.AbstractEventLoop | None = None
+    _loop_thread: threading.Thread | None = None
+    _lock: threading.Lock
+    _latencies: dict[str, LatencyTracker]
+    _failures: dict[str, int]
+
+    def __init__(
+        self,
+        base_url: str | None = None,
+        timeout: float = DEFAULT_TIMEOUT,
+        max_retries: int = 0,
+        model: str = MODEL,
+    ):
+        """`max_retries` is 0 by default since every retry gets a full `timeout` of
+        its own and would push the call past its deadline."""
+        self._base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.model = model
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self._failures = {}
+
+    def complete(
+        self,
+        messages: list[ChatCompletionMessageParam],
+        timeout: float | None = None,
+        purpose: str = "chat",
+    ) -> str:
+        """Returns the answer to the messages. Raises an `openai.OpenAIError` if the
+        call failed or missed its deadline."""
+
+        start_time = time.monotonic()
+        try:
+            response = self._get_client().chat.completions.create(
+                model=self.model,
+                messages=messages,
+                timeout=self.timeout if timeout is None else timeout,
+                **COMPLETION_PARAMETERS,  # type: ignore[arg-type]
+            )
+        except Exception:
+            self._record_failure(purpose)
+            raise
+        return self._answer(response, purpose, time.monotonic() - start_time)
+
+    async def acomplete(
+        self,
+        messages: list[ChatCompletionMessageParam],
+        timeout: float | None = None,
+        purpose: str = "chat",
+    ) -> str:
+        """Like `complete`, on the event loop of the client."""
+
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(
+                base_url=self._base_url, max_retries=self.max_retries
+            )
+        start_time = time.monotonic()
+        try:
+            response = await self._async_client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                timeout=self.timeout if timeout is None else timeout,
+                **COMPLETION_PARAMETERS,  # type: ignore[arg-type]
+            )
+        except Exception:
+            self._record_failure(purpose)
+            raise
+        return self._answer(response, purpose, time.monotonic() - start_time)
+
+    def submit(
+        self,
+        messages: list[ChatCompletionMessageParam],
+        timeout: float | None = None,
+        purpose: str = "chat",
+    ) -> Future:
+        """Starts a completion in the background and returns a future of the
+        answer."""
+
+        return asyncio.run_coroutine_threadsafe(
+            self.acomplete(messages, timeout, purpose), self._get_loop()
+        )
+
+    def latency_percentiles(
+        self, percentiles: tuple[int, ...] = (50, 90, 99)
+    ) -> dict[str, dict[int, float]]:
+        """Returns the latency percentiles in seconds of the successful calls per
+        purpose."""
+
+        return {
+            purpose: tracker.percentiles(percentiles)
+            for purpose, tracker in list(self._latencies.items())
+        }
+
+    @property
+    def failures(self) -> dict[str, int]:
+        """Returns the number of failed or timed out calls per purpose."""
+
+        return dict(self._failures)
+
+    def close(self) -> None:
+        """Closes the connection pools and stops the event loop."""
+
+        if self._client is not None:
+            self._client.close()
+        if self._loop is not None:
+            if self._async_client is not None:
+                asyncio.run_coroutine_threadsafe(
+                    self._async_client.close(), self._loop
+                ).result(self.timeout)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop_thread.join(self.timeout)  # type: ignore[union-attr]
+
+    def _get_client(self) -> OpenAI:
+        with self._lock:
+            if self._client is None:
+                self._client = OpenAI(
+                    base_url=self._base_url, max_retries=self.max_retries
+                )
+            return self._client
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(
+                    target=self._loop.run_forever, name="LLMClientLoop", daemon=True
+                )
+                self._loop_thread.start()
+            return self._loop
+
+    def _answer(self, response, purpose: str, latency: float) -> str:
+        """Records the latency of a call and returns its answer."""
+
+        with self._lock:
+            tracker = self._latencies.setdefault(purpose, LatencyTracker())
+        tracker.record(latency)
+        if (answer := response.choices[0].message.content) is None:
+            raise ValueError("OpenAI API returned None")
+        logger.debug(f"OpenAI API response to {purpose} in {latency:.2f}s: {answer}")
+        return answer
+
+    def _record_failure(self, purpose: str) -> None:
+        with self._lock:
+            self._failures[purpose] = self._failures.get(purpose, 0) + 1
+
+
+@functools.cache
+def get_llm_client() -> LLMClient:
+    """Returns the client shared by the whole process."""
+
+    return LLMClient()
@@ -0,0 +1,261 @@
+"""A local stand-in for the Furhat remote API, to benchmark and soak-test the
+interaction and gaze loops without a robot.
+
+It implements the endpoints botender uses (say, listen, attend, gesture, led, face,
+voice) with configurable latency distributions and scripted `listen` responses.
+The robot is addressed like a real one, e.g. `--furhat_remote_address localhost`:
+
+    python -m botender.interaction.mock_furhat --latency lognormal:30:15 \\
+        --endpoint-latency listen=normal:1500:300 --listen "I'm Alex" "Yes please"
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Literal, get_args
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from botender.metrics import LatencyTracker
+
+logger = logging.getLogger(__name__)
+
+FURHAT_PORT = 54321
+"""The port of the Furhat remote API, which the client does not allow to change."""
+SECONDS_PER_WORD = 0.3
+"""How long the mock robot takes to say a word when speech is blocking."""
+DEFAULT_LISTEN_RESPONSES = (
+    "Hi, I'm Alex.",
+    "Yes, I would love a drink.",
+    "Something sweet, please.",
+    "Yes, that sounds great.",
+)
+"""The scripted user responses, which `listen` returns in turn."""
+
+DistributionKind = Literal["constant", "uniform", "normal", "lognormal"]
+"""The shape of a latency distribution."""
+
+
+@dataclass
+class LatencyDistribution:
+    """The latency of an endpoint in milliseconds: a constant, uniform within
+    `mean` ± `spread`, or normal/lognormal with mean `mean` and standard deviation
+    `spread`."""
+
+    kind: DistributionKind = "constant"
+    mean: float = 10.0
+    spread: float = 0.0
+
+    @classmethod
+    def parse(cls, text: str) -> "LatencyDistribution":
+        """Parses `kind:mean[:spread]`, e.g. `lognormal:40:20`."""
+
+        kind, mean, *spread = text.split(":")
+        if kind not in get_args(DistributionKind):
+            raise ValueError(f"Unknown latency distribution {kind}.")
+        return cls(kind, float(mean), float(spread[0]) if spread else 0.0)  # type: ignore[arg-type]
+
+    def sample(self, rng: np.random.Generator) -> float:
+        """Draws a latency in seconds."""
+
+        if self.kind == "uniform":
+            latency = rng.uniform(self.mean - self.spread, self.mean + self.spread)
+        elif self.kind == "normal":
+            latency = rng.normal(self.mean, self.spread)
+        elif self.kind == "lognormal" and self.mean > 0:
+            # Parameters of the underlying normal distribution for the given moments
+            sigma = np.sqrt(np.log1p((self.spread / self.mean) ** 2))
+            latency = rng.lognormal(np.log(self.mean) - sigma**2 / 2, sigma)
+        else:
+            latency = self.mean
+        return max(0.0, latency) / 1000
+
+
+class MockFurhatServer:
+    """Serves the mocked Furhat remote API in a background thread. Every request
+    waits for a latency drawn from the distribution of its endpoint (e.g. `say`,
+    `listen`, `attend`) or the default one; blocking speech additionally takes
+    `SECONDS_PER_WORD` per word."""
+
+    latency: LatencyDistribution
+    endpoint_latency: dict[str, LatencyDistribution]
+    requests: Counter
+    """The number of requests per endpoint."""
+    request_latency: dict[str, LatencyTracker]
+    """The time spent on the requests per endpoint."""
+    connections: int = 0
+    """The number of connections accepted. Clients that keep their connections
+    alive open about one per concurrent request."""
+
+    _server: ThreadingHTTPServer
+    _thread: threading.Thread | None = None
+    _listen_responses: itertools.cycle
+    _lock: threading.Lock
+    _rng: np.random.Generator
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = FURHAT_PORT,
+        latency: LatencyDistribution | None = None,
+        endpoint_latency: dict[str, LatencyDistribution] | None = None,
+        listen_responses: tuple[str, ...] = DEFAULT_LISTEN_RESPONSES,
+        seed: int | None = None,
+    ):
+        self.latency = latency or LatencyDistribution()
+        self.endpoint_latency = endpoint_latency or {}
+        self.requests = Counter()
+        self.request_latency = {}
+        self._listen_responses = itertools.cycle(listen_responses)
+        self._lock = threading.Lock()
+        self._rng = np.random.default_rng(seed)
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+
+    @property
+    def address(self) -> tuple[str, int]:
+        """Returns the host and port the server listens on."""
+
+        host, port = self._server.server_address[:2]
+        return str(host), int(port)
+
+    def start(self) -> None:
+        """Starts serving in a background thread."""
+
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="MockFurhatServer", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Mock Furhat listening on {self.address[0]}:{self.address[1]}")
+
+    def serve_forever(self) -> None:
+        """Serves in the calling thread until interrupted."""
+
+        logger.info(f"Mock Furhat listening on {self.address[0]}:{self.address[1]}")
+        self._server.serve_forever()
+
+    def shutdown(self) -> None:
+        """Stops serving and closes the socket."""
+
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+        self._server.server_close()
+
+    def handle(self, path: str, query: dict[str, str]):
+        """Simulates a request and returns the JSON response."""
+
+        endpoint = path.removeprefix("/furhat").strip("/") or "status"
+        with self._lock:
+            delay = self.endpoint_latency.get(endpoint, self.latency).sample(self._rng)
+            if endpoint == "say" and query.get("blocking", "").lower() == "true":
+                delay += SECONDS_PER_WORD * len(query.get("text", "").split())
+            response: dict | list = {"success": True, "message": ""}
+            if endpoint == "listen":
+                response = {"success": True, "message": next(self._listen_responses)}
+            elif endpoint in ("gestures", "voices", "users"):
+                response = []
+        time.sleep(delay)
+        with self._lock:
+            self.requests[endpoint] += 1
+            tracker = self.request_latency.setdefault(endpoint, LatencyTracker())
+        tracker.record(delay)
+        return response
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep the connections alive like the Furhat server does
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def _respond(self):
+                url = urlparse(self.path)
+                query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                # Gesture definitions come as body, which the mock does not need
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                response = server.handle(url.path, query)
+                payload = json.dumps(response).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._respond()
+
+            def do_POST(self):
+                self._respond()
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        return Handler
+
+
+def parse_endpoint_latency(values: list[str]) -> dict[str, LatencyDistribution]:
+    """Parses `endpoint=kind:mean[:spread]` arguments."""
+
+    latencies = {}
+    for value in values:
+        endpoint, _, distribution = value.partition("=")
+        latencies[endpoint] = LatencyDistribution.parse(distribution)
+    return latencies
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Mock Furhat remote API")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=FURHAT_PORT)
+    parser.add_argument(
+        "--latency",
+        type=LatencyDistribution.parse,
+        default=LatencyDistribution(),
+        help="Default latency as kind:mean_ms[:spread_ms]",
+    )
+    parser.add_argument(
+        "--endpoint-latency",
+        nargs="*",
+        default=[],
+        help="Per-endpoint latencies as endpoint=kind:mean_ms[:spread_ms]",
+    )
+    parser.add_argument(
+        "--listen",
+        nargs="+",
+        default=list(DEFAULT_LISTEN_RESPONSES),
+        help="The user responses `listen` returns in turn",
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    server = MockFurhatServer(
+        args.host,
+        args.port,
+        latency=args.latency,
+        endpoint_latency=parse_endpoint_latency(args.endpoint_latency),
+        listen_responses=tuple(args.listen),
+        seed=args.seed,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
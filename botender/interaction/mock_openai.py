@@ -0,0 +1,176 @@
+"""A local stub of the OpenAI chat completions endpoint, to run and load-test the
+interaction without the real API.
+
+    python -m botender.interaction.mock_openai --latency lognormal:600:300
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=mock \\
+        ENABLE_OPENAI_API=True python -m botender.main
+
+The stub answers the prompts of botender with plausible replies.
+"""
+
+import argparse
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from botender.interaction.mock_furhat import LatencyDistribution
+
+logger = logging.getLogger(__name__)
+
+MOCK_OPENAI_PORT = 8765
+"""The default port of the stub."""
+DEFAULT_REPLIES = (
+    ("[Positive | Negative | Error]", "Positive"),
+    ("[Sweet | Sour | Milk-based | Strong | Error]", "Sweet"),
+    ("[NAME OR ERROR]", "Alex"),
+    ("cocktail name along with its ingredients", "It is a refreshing classic."),
+)
+"""Replies by a marker in the system prompt."""
+FALLBACK_REPLY = "Error"
+"""The reply to prompts without a known marker."""
+
+
+class MockOpenAIServer:
+    """Serves `POST /v1/chat/completions` in a background thread. Every request
+    waits for a latency drawn from `latency`."""
+
+    latency: LatencyDistribution
+    requests: int = 0
+    """The number of completions served."""
+
+    _server: ThreadingHTTPServer
+    _thread: threading.Thread | None = None
+    _lock: threading.Lock
+    _rng: np.random.Generator
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = MOCK_OPENAI_PORT,
+        latency: LatencyDistribution | None = None,
+        seed: int | None = None,
+    ):
+        self.latency = latency or LatencyDistribution("constant", 100.0)
+        self._lock = threading.Lock()
+        self._rng = np.random.default_rng(seed)
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        """Returns the base URL to configure the OpenAI client with."""
+
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> None:
+        """Starts serving in a background thread."""
+
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="MockOpenAIServer", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Mock OpenAI API at {self.base_url}")
+
+    def serve_forever(self) -> None:
+        """Serves in the calling thread until interrupted."""
+
+        logger.info(f"Mock OpenAI API at {self.base_url}")
+        self._server.serve_forever()
+
+    def shutdown(self) -> None:
+        """Stops serving and closes the socket."""
+
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+        self._server.server_close()
+
+    def complete(self, request: dict) -> dict:
+        """Simulates a chat completion and returns the response body."""
+
+        system_prompt = " ".join(
+            str(message.get("content", ""))
+            for message in request.get("messages", [])
+            if message.get("role") == "system"
+        )
+        reply = next(
+            (reply for marker, reply in DEFAULT_REPLIES if marker in system_prompt),
+            FALLBACK_REPLY,
+        )
+        with self._lock:
+            delay = self.latency.sample(self._rng)
+            self.requests += 1
+        time.sleep(delay)
+        return {
+            "id": f"chatcmpl-mock-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", ""),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": reply},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep connections alive like the API
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if self.path.rstrip("/").endswith("/chat/completions"):
+                    status, response = 200, server.complete(json.loads(body or b"{}"))
+                else:
+                    status, response = 404, {"error": {"message": "Not found"}}
+                payload = json.dumps(response).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up on the request after its deadline
+                    self.close_connection = True
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        return Handler
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Mock OpenAI chat completions API")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=MOCK_OPENAI_PORT)
+    parser.add_argument(
+        "--latency",
+        type=LatencyDistribution.parse,
+        default=LatencyDistribution("constant", 100.0),
+        help="Latency as kind:mean_ms[:spread_ms]",
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    server = MockOpenAIServer(args.host, args.port, args.latency, args.seed)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
@@ -0,0 +1,402 @@
+"""A local fast path to understand the short answers of the guests.
+
+Most answers are trivial ("yes", "sour please", "I'm Anna") and are understood with
+keyword and pattern grammars in well under a millisecond. Only answers the
+grammars are not confident about are left to the LLM. The hit rate, the time
+spent locally and the estimated time saved are reported in `summary`.
+"""
+
+import difflib
+import functools
+import logging
+import re
+import threading
+import time
+from typing import Callable, Literal, TypeVar
+
+from botender.metrics import LatencyTracker
+
+logger = logging.getLogger(__name__)
+
+Task = Literal["valence", "name", "taste"]
+"""What to understand from an answer. Matches the purposes of the LLM calls."""
+Valence = Literal["Positive", "Negative"]
+Taste = Literal["Sour", "Sweet", "Milk-based", "Strong"]
+T = TypeVar("T")
+
+CONFIDENCE_THRESHOLD = 0.8
+"""The confidence below which an answer is left to the LLM."""
+SHORT_ANSWER_WORDS = 8
+"""Answers with more words than this get less confident, as they are more likely to
+be nuanced."""
+
+POSITIVE_PHRASES = (
+    "yes",
+    "yeah",
+    "yep",
+    "yup",
+    "ya",
+    "sure",
+    "ok",
+    "okay",
+    "alright",
+    "absolutely",
+    "definitely",
+    "certainly",
+    "gladly",
+    "love",
+    "perfect",
+    "great",
+    "good",
+    "nice",
+    "tasty",
+    "delicious",
+    "fine",
+    "why not",
+    "of course",
+    "go ahead",
+    "go for it",
+    "don't mind",
+    "do not mind",
+    "not bad",
+    "no problem",
+    "not a problem",
+    "no worries",
+    "no doubt",
+    "can't complain",
+    "cannot complain",
+    "can't wait",
+    "cannot wait",
+)
+"""Words and phrases that accept an offer."""
+POLITE_PHRASES = ("please", "thanks", "thank you")
+"""Words that accept an offer only weakly, e.g. "something else please"."""
+NEGATIVE_PHRASES = (
+    "no",
+    "nope",
+    "nah",
+    "not",
+    "never",
+    "don't",
+    "do not",
+    "pass",
+    "another time",
+    "rather not",
+    "no thanks",
+    "no thank you",
+    "i'm good",
+    "i am good",
+    "i'm fine",
+    "i am fine",
+)
+"""Words and phrases that decline an offer."""
+COMPARATIVE_WORDS = frozenset(
+    """better best happier happiest more most greater nicer worse less""".split()
+)
+"""Words that turn a negation next to them into praise, e.g. "could not be
+happier". Answers with both are left to the LLM."""
+UNCERTAIN_PHRASES = (
+    "maybe",
+    "perhaps",
+    "not sure",
+    "don't know",
+    "dunno",
+    "depends",
+    "what",
+    "which",
+    "how",
+    "else",
+    "different",
+    "another",
+    "other",
+)
+"""Words and phrases after which the LLM decides, e.g. when the guest asks for
+something else."""
+
+TASTE_WORDS: dict[str, Taste] = {
+    "sweet": "Sweet",
+    "sweetness": "Sweet",
+    "sweeter": "Sweet",
+    "sugar": "Sweet",
+    "sugary": "Sweet",
+    "fruity": "Sweet",
+    "dessert": "Sweet",
+    "sour": "Sour",
+    "sourness": "Sour",
+    "tart": "Sour",
+    "tangy": "Sour",
+    "citrus": "Sour",
+    "citrusy": "Sour",
+    "lemon": "Sour",
+    "lime": "Sour",
+    "acidic": "Sour",
+    "zesty": "Sour",
+    "milk": "Milk-based",
+    "milk-based": "Milk-based",
+    "milky": "Milk-based",
+    "cream": "Milk-based",
+    "creamy": "Milk-based",
+    "dairy": "Milk-based",
+    "strong": "Strong",
+    "stronger": "Strong",
+    "heavy": "Strong",
+    "boozy": "Strong",
+    "potent": "Strong",
+    "intense": "Strong",
+}
+"""Words that name a taste."""
+NEGATIONS = frozenset(
+    """not no don't doesn't isn't aren't can't cannot won't never nothing without
+    less hate dislike avoid but except instead""".split()
+)
+"""Words that may turn a taste word into its opposite, e.g. "anything but sweet".
+Answers with any of them are left to the LLM."""
+
+NAME_PATTERNS = (
+    (re.compile(r"\bmy name(?: is|'s)\s+(\S+)", re.IGNORECASE), 1.0),
+    (re.compile(r"\b(?:call me|name is)\s+(\S+)", re.IGNORECASE), 1.0),
+    (re.compile(r"\b(?:i'm|i am|it's|it is|this is)\s+(\S+)", re.IGNORECASE), 0.9),
+)
+"""Patterns that introduce a name, with their confidence."""
+NOT_NAMES = frozenset(
+    """a an the and but so just very really quite here there fine good great well ok
+    okay alright sorry not doing feeling looking happy sad angry tired thirsty hungry
+    excited new back from in at on sure glad pleased yes no nope yeah hi hello hey
+    thanks thank called named your you my me it this that what who botender please
+    pardon cheers excuse welcome bye goodbye morning evening afternoon hmm um uh er
+    ah oh wow huh yay yep yup nah maybe perhaps whatever anyway nothing nobody again
+    sir madam i im ive id ill he she him her we us they them myself yourself
+    someone""".split()
+)
+"""Words that follow the name patterns or make up short answers but are not
+names."""
+CONTRACTION_PATTERN = re.compile(r"'(?:m|s|re|ve|ll|d|t)$", re.IGNORECASE)
+"""The ending of a contraction like "I'm" or "it's", which is not a name."""
+NAME_PATTERN = re.compile(r"^[^\W\d_][\w'-]*$")
+"""The shape of a single name."""
+WORD_PATTERN = re.compile(r"[a-z][a-z'-]*")
+
+_VALENCE_PATTERNS: list[tuple[re.Pattern, Valence, bool]] = sorted(
+    [(re.compile(rf"\b{re.escape(p)}\b"), "Positive", False) for p in POSITIVE_PHRASES]
+    + [(re.compile(rf"\b{re.escape(p)}\b"), "Positive", True) for p in POLITE_PHRASES]
+    + [
+        (re.compile(rf"\b{re.escape(p)}\b"), "Negative", False)
+        for p in NEGATIVE_PHRASES
+    ],
+    # Longest phrases first so that they consume the words they contain
+    key=lambda item: -len(item[0].pattern),
+)
+
+
+def _words(message: str) -> list[str]:
+    return WORD_PATTERN.findall(message.lower().replace("’", "'"))
+
+
+def _length_penalty(words: list[str]) -> float:
+    """Returns how much less confident to be about a long answer."""
+
+    return 0.05 * max(0, len(words) - SHORT_ANSWER_WORDS)
+
+
+def _contains(words: list[str], phrase: str) -> bool:
+    phrase_words = phrase.split()
+    n = len(phrase_words)
+    return any(words[i : i + n] == phrase_words for i in range(len(words) - n + 1))
+
+
+@functools.lru_cache(maxsize=1024)
+def _fuzzy_taste(word: str) -> Taste | None:
+    """Returns the taste of a word that is spelled similarly to a taste word."""
+
+    if len(word) < 4:
+        return None
+    matches = difflib.get_close_matches(word, TASTE_WORDS, n=1, cutoff=0.8)
+    return TASTE_WORDS[matches[0]] if len(matches) > 0 else None
+
+
+def classify_valence(message: str) -> tuple[Valence | None, float]:
+    """Returns whether the answer accepts or declines an offer and the confidence.
+    Phrases are matched before the words they contain, e.g. "why not" before
+    "not"."""
+
+    words = _words(message)
+    if len(words) == 0 or "?" in message:
+        return None, 0.0
+    if any(_contains(words, phrase) for phrase in UNCERTAIN_PHRASES):
+        return None, 0.0
+
+    remaining = " ".join(words)
+    found: set[Valence] = set()
+    only_polite = True
+    for pattern, valence, polite in _VALENCE_PATTERNS:
+        # Mark the matched phrases to tell which words they stood next to
+        remaining, count = pattern.subn(f" <{valence}> ", remaining)
+        if count > 0:
+            found.add(valence)
+            only_polite = only_polite and polite
+    if len(found) != 1:
+        return None, 0.0
+    valence = found.pop()
+    tokens = remaining.split()
+    if any(
+        token == "<Negative>" and COMPARATIVE_WORDS.intersection(tokens[i + 1 : i + 3])
+        for i, token in enumerate(tokens)
+    ):
+        # E.g. "I could not be happier" or "never better"
+        return valence, 0.5
+    # Politeness alone does not accept an offer
+    confidence = 0.6 if only_polite else 0.95
+    return valence, confidence - _length_penalty(words)
+
+
+def extract_name(message: str) -> tuple[str | None, float]:
+    """Returns the name the guest introduced themselves with and the confidence.
+    Names that are not capitalized by the speech recognition are less certain, and
+    None is returned if no name is certain enough."""
+
+    message = message.replace("’", "'")
+    words = message.strip().rstrip(".!").split()
+    if len(words) == 0:
+        return None, 0.0
+    candidates = [
+        (match.group(1), confidence)
+        for pattern, confidence in NAME_PATTERNS
+        for match in pattern.finditer(message)
+    ]
+    if len(words) <= 2:
+        # Just the name, e.g. "Anna" or "Anna Smith", which must be capitalized
+        capitalized = all(word[0].isupper() for word in words)
+        candidates.append((words[0], 0.9 if capitalized else 0.6))
+
+    for candidate, confidence in candidates:
+        name = candidate.strip('.,!?;:"')
+        if (
+            NAME_PATTERN.match(name) is None
+            or name.lower() in NOT_NAMES
+            or CONTRACTION_PATTERN.search(name) is not None
+        ):
+            continue
+        if not name[0].isupper():
+            confidence -= 0.15
+        confidence -= _length_penalty(words)
+        if confidence < CONFIDENCE_THRESHOLD:
+            continue
+        return name[0].upper() + name[1:], confidence
+    return None, 0.0
+
+
+def classify_taste(message: str) -> tuple[Taste | None, float]:
+    """Returns the taste the guest asked for and the confidence. Misrecognized taste
+    words are matched fuzzily; answers with a negation or several different tastes
+    are left to the LLM."""
+
+    words = _words(message)
+    if NEGATIONS.intersection(words) or _contains(words, "instead of"):
+        return None, 0.0
+    found = {TASTE_WORDS[word] for word in words if word in TASTE_WORDS}
+    confidence = 0.95
+    if len(found) == 0:
+        # Only then look for misrecognized taste words, which is slower
+        found = {taste for word in words if (taste := _fuzzy_taste(word)) is not None}
+        confidence = 0.85
+    if len(found) != 1:
+        return None, 0.0
+    return found.pop(), confidence - _length_penalty(words)
+
+
+class LocalNLU:
+    """Understands answers locally if confident and keeps the statistics of the
+    fast path per task."""
+
+    threshold: float
+
+    _lock: threading.Lock
+    _hits: dict[Task, int]
+    _fallbacks: dict[Task, int]
+    _latencies: dict[Task, LatencyTracker]
+
+    def __init__(self, threshold: float = CONFIDENCE_THRESHOLD):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._hits = {}
+        self._fallbacks = {}
+        self._latencies = {}
+
+    def valence(self, message: str) -> Valence | None:
+        """Returns the valence of the answer, or None to ask the LLM."""
+
+        return self._understand("valence", classify_valence, message)
+
+    def name(self, message: str) -> str | None:
+        """Returns the name in the answer, or None to ask the LLM."""
+
+        return self._understand("name", extract_name, message)
+
+    def taste(self, message: str) -> Taste | None:
+        """Returns the taste in the answer, or None to ask the LLM."""
+
+        return self._understand("taste", classify_taste, message)
+
+    def hit_rate(self, task: Task) -> float:
+        """Returns the share of the answers understood locally."""
+
+        hits, fallbacks = self._hits.get(task, 0), self._fallbacks.get(task, 0)
+        return hits / (hits + fallbacks) if hits + fallbacks > 0 else 0.0
+
+    def saved_time(self, llm_latencies: dict[str, dict[int, float]]) -> float:
+        """Returns the estimated seconds saved, given the median latencies of the
+        LLM calls per purpose (see `LLMClient.latency_percentiles`). Tasks the LLM
+        was never asked about are estimated with the other purposes."""
+
+        medians = [latency[50] for latency in llm_latencies.values() if 50 in latency]
+        if len(medians) == 0:
+            return 0.0
+        saved = 0.0
+        for task, hits in list(self._hits.items()):
+            llm_latency = llm_latencies.get(task, {}).get(
+                50, sum(medians) / len(medians)
+            )
+            local_latency = self._latencies[task].percentiles((50,)).get(50, 0.0)
+            saved += hits * (llm_latency - local_latency)
+        return saved
+
+    def summary(self, llm_latencies: dict[str, dict[int, float]] | None = None) -> str:
+        """Returns the hit rate and the local latency per task and the time saved."""
+
+        tasks = []
+        for task, tracker in list(self._latencies.items()):
+            hits = self._hits.get(task, 0)
+            total = hits + self._fallbacks.get(task, 0)
+            local_latency = tracker.percentiles((50,)).get(50, 0.0)
+            tasks.append(f"{task} {hits}/{total} ({local_latency * 1000:.2f}ms)")
+        summary = ", ".join(tasks) or "no answers yet"
+        if llm_latencies:
+            summary += f"; saved ~{self.saved_time(llm_latencies):.1f}s"
+        return summary
+
+    def _understand(
+        self,
+        task: Task,
+        classify: Callable[[str], tuple[T | None, float]],
+        message: str,
+    ) -> T | None:
+        start_time = time.perf_counter()
+        result, confidence = classify(message)
+        latency = time.perf_counter() - start_time
+        understood = result is not None and confidence >= self.threshold
+        with self._lock:
+            self._latencies.setdefault(task, LatencyTracker()).record(latency)
+            counter = self._hits if understood else self._fallbacks
+            counter[task] = counter.get(task, 0) + 1
+        logger.debug(
+            f"Local {task} of {message!r}: {result} ({confidence:.2f}) in "
+            f"{latency * 1000:.3f}ms{'' if understood else ', asking the LLM'}"
+        )
+        return result if understood else None
+
+
+@functools.cache
+def get_nlu() -> LocalNLU:
+    """Returns the NLU shared by the whole process."""
+
+    return LocalNLU()
@@ -0,0 +1,306 @@
+"""Non-blocking dispatch of commands to the Furhat remote API."""
+
+import heapq
+import itertools
+import logging
+import time
+from concurrent.futures import CancelledError, Future
+from dataclasses import dataclass, field
+from enum import IntEnum
+from threading import Condition, Thread
+
+from furhat_remote_api import FurhatRemoteAPI  # type: ignore
+
+from botender.metrics import LatencyTracker
+
+logger = logging.getLogger(__name__)
+
+
+class CommandPriority(IntEnum):
+    """The priority of a command within its lane. Lower values run first."""
+
+    SPEECH = 0
+    """Speech, listening and the settings of the robot."""
+
+    GAZE = 1
+    """Gaze targets."""
+
+    GESTURE = 2
+    """Gestures that are part of the interaction."""
+
+    IDLE = 3
+    """Idle gestures while nobody is around."""
+
+
+SPEECH_LANE = "speech"
+MOTION_LANE = "motion"
+
+COMMANDS = {
+    "say": (SPEECH_LANE, CommandPriority.SPEECH, None),
+    "listen": (SPEECH_LANE, CommandPriority.SPEECH, None),
+    "set_led": (SPEECH_LANE, CommandPriority.SPEECH, "led"),
+    "set_face": (SPEECH_LANE, CommandPriority.SPEECH, None),
+    "set_voice": (SPEECH_LANE, CommandPriority.SPEECH, None),
+    "attend": (MOTION_LANE, CommandPriority.GAZE, "attend"),
+    "gesture": (MOTION_LANE, CommandPriority.GESTURE, None),
+}
+"""The lane, default priority and coalescing key of every dispatched command.
+Pending commands with the same key are replaced by newer ones. Other methods of
+the remote API run in the speech lane."""
+
+
+@dataclass(order=True)
+class _Command:
+    priority: int
+    order: int
+    name: str = field(compare=False)
+    kwargs: dict = field(compare=False)
+    coalesce_key: str | None = field(compare=False)
+    futures: list[Future] = field(compare=False)
+    submit_time: float = field(compare=False)
+
+
+class _Lane(Thread):
+    """Runs the commands of one lane one after another in order of priority."""
+
+    _furhat: FurhatRemoteAPI
+    _dispatcher: "RobotDispatcher"
+    _queue: list[_Command]
+    _pending: dict[str, _Command]
+    _condition: Condition
+    _stopped: bool = False
+
+    def __init__(
+        self, name: str, furhat: FurhatRemoteAPI, dispatcher: "RobotDispatcher"
+    ):
+        super().__init__(name=f"RobotDispatcher-{name}", daemon=True)
+        self._furhat = furhat
+        self._dispatcher = dispatcher
+        self._queue = []
+        self._pending = {}
+        self._condition = Condition()
+
+    def put(self, command: _Command) -> None:
+        """Queues a command, or merges it into a pending one with the same key.
+        Cancels it right away if the lane was stopped."""
+
+        with self._condition:
+            if self._stopped:
+                for future in command.futures:
+                    future.cancel()
+                return
+            pending = None
+            if command.coalesce_key is not None:
+                pending = self._pending.get(command.coalesce_key)
+            if pending is not None:
+                # The merged command takes the place of the newest one in the queue
+                pending.kwargs = command.kwargs
+                pending.futures.extend(command.futures)
+                pending.order = command.order
+                pending.priority = min(pending.priority, command.priority)
+                heapq.heapify(self._queue)
+                self._dispatcher.record_coalesced(command.name)
+                return
+            heapq.heappush(self._queue, command)
+            if command.coalesce_key is not None:
+                self._pending[command.coalesce_key] = command
+            self._condition.notify()
+
+    def stop(self) -> None:
+        """Cancels the queued commands and stops the lane after the running one."""
+
+        with self._condition:
+            self._stopped = True
+            for command in self._queue:
+                for future in command.futures:
+                    future.cancel()
+            self._queue.clear()
+            self._pending.clear()
+            self._condition.notify()
+
+    def run(self) -> None:
+        while True:
+            with self._condition:
+                while len(self._queue) == 0 and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                command = heapq.heappop(self._queue)
+                key = command.coalesce_key
+                if key is not None and self._pending.get(key) is command:
+                    del self._pending[key]
+
+            # Skip the futures their callers cancelled, the others cannot be
+            # cancelled anymore
+            futures = [
+                future
+                for future in command.futures
+                if future.set_running_or_notify_cancel()
+            ]
+            if len(futures) == 0:
+                continue
+            try:
+                result = getattr(self._furhat, command.name)(**command.kwargs)
+            except Exception as error:
+                logger.warning(f"Furhat command {command.name} failed: {error}")
+                for future in futures:
+                    future.set_exception(error)
+                continue
+            self._dispatcher.record_latency(
+                command.name, time.monotonic() - command.submit_time
+            )
+            for future in futures:
+                future.set_result(result)
+
+
+def _wait(future: Future):
+    """Returns the result of a command, or None if it was cancelled because the
+    dispatcher was shut down."""
+
+    try:
+        return future.result()
+    except CancelledError:
+        logger.debug("Furhat command was cancelled by the shutdown.")
+        return None
+
+
+class RobotDispatcher:
+    """Owns the Furhat remote API client and runs its commands in background lanes,
+    so callers never block on gaze or gesture I/O. Speech runs in its own lane and
+    is never delayed by motion; within a lane, commands run in order of their
+    `CommandPriority`.
+
+    The dispatcher can be used in place of a `FurhatRemoteAPI`: `say(blocking=True)`,
+    `listen` and unknown methods wait for their result, all other commands return a
+    `Future` immediately.
+
+    All lanes share the one remote API client and with it its pool of keep-alive
+    HTTP connections, so commands do not open a connection each."""
+
+    _furhat: FurhatRemoteAPI
+    _lanes: dict[str, _Lane]
+    _order: itertools.count
+    _latencies: dict[str, LatencyTracker]
+    _coalesced: dict[str, int]
+
+    def __init__(self, furhat: FurhatRemoteAPI):
+        self._furhat = furhat
+        self._order = itertools.count()
+        self._latencies = {}
+        self._coalesced = {}
+        self._lanes = {
+            lane: _Lane(lane, furhat, self) for lane in (SPEECH_LANE, MOTION_LANE)
+        }
+        for lane in self._lanes.values():
+            lane.start()
+
+    def submit(
+        self, method: str, /, priority: CommandPriority | None = None, **kwargs
+    ) -> Future:
+        """Queues the remote API method with the given arguments. Returns a future of
+        its result."""
+
+        lane, default_priority, coalesce_key = COMMANDS.get(
+            method, (SPEECH_LANE, CommandPriority.SPEECH, None)
+        )
+        future: Future = Future()
+        self._lanes[lane].put(
+            _Command(
+                priority=default_priority if priority is None else priority,
+                order=next(self._order),
+                name=method,
+                kwargs=kwargs,
+                coalesce_key=coalesce_key,
+                futures=[future],
+                submit_time=time.monotonic(),
+            )
+        )
+        return future
+
+    def say(self, blocking: bool = False, **kwargs):
+        """Says something. Waits until it was said if `blocking`."""
+
+        future = self.submit("say", blocking=blocking, **kwargs)
+        return _wait(future) if blocking else future
+
+    def listen(self, **kwargs):
+        """Listens to the user and returns the result, or None if the dispatcher
+        was shut down."""
+
+        return _wait(self.submit("listen", **kwargs))
+
+    def attend(self, **kwargs) -> Future:
+        """Changes the gaze target. Only the newest pending target is sent."""
+
+        return self.submit("attend", **kwargs)
+
+    def gesture(self, priority: CommandPriority | None = None, **kwargs) -> Future:
+        """Performs a gesture."""
+
+        return self.submit("gesture", priority=priority, **kwargs)
+
+    def set_led(self, **kwargs) -> Future:
+        """Sets the LED color. Only the newest pending color is sent."""
+
+        return self.submit("set_led", **kwargs)
+
+    def set_face(self, **kwargs) -> Future:
+        """Changes the face of the robot."""
+
+        return self.submit("set_face", **kwargs)
+
+    def set_voice(self, name: str) -> Future:
+        """Changes the voice of the robot."""
+
+        return self.submit("set_voice", name=name)
+
+    def __getattr__(self, name: str):
+        """Runs any other remote API method in the speech lane and waits for it."""
+
+        if name.startswith("_") or not hasattr(self._furhat, name):
+            raise AttributeError(name)
+        return lambda **kwargs: _wait(self.submit(name, **kwargs))
+
+    def record_latency(self, name: str, latency: float) -> None:
+        """Records the time from submitting a command to its completion."""
+
+        self._latencies.setdefault(name, LatencyTracker()).record(latency)
+
+    def record_coalesced(self, name: str) -> None:
+        """Counts a command that was merged into a pending one."""
+
+        self._coalesced[name] = self._coalesced.get(name, 0) + 1
+
+    def latency_percentiles(
+        self, percentiles: tuple[int, ...] = (50, 90, 99)
+    ) -> dict[str, dict[int, float]]:
+        """Returns the latency percentiles in seconds of every command."""
+
+        return {
+            name: tracker.percentiles(percentiles)
+            for name, tracker in list(self._latencies.items())
+        }
+
+    @property
+    def coalesced(self) -> dict[str, int]:
+        """Returns the number of commands per method that were coalesced."""
+
+        return dict(self._coalesced)
+
+    def summary(self) -> str:
+        """Returns the median latency of every command for the debug info."""
+
+        return ", ".join(
+            f"{name} {latencies[50] * 1000:.0f}ms"
+            for name, latencies in self.latency_percentiles((50,)).items()
+            if latencies
+        )
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Cancels the queued commands and waits for the running ones. Commands
+        submitted afterwards are cancelled right away."""
+
+        for lane in self._lanes.values():
+            lane.stop()
+        for lane in self._lanes.values():
+            lane.join(timeout)
@@ -4,12 +4,16 @@ import argparse
 import logging
 import time
 from multiprocessing import Process, Queue
+from typing import get_args
 
 import cv2  # type: ignore
 from dotenv import load_dotenv
 
 import botender.logging_utils as logging_utils
+from botender.interaction.gaze_coordinator import GazeMode
 from botender.interaction.interaction_manager import InteractionManagerThread
+from botender.perception.detectors.emotion_detector import EmotionModel
+from botender.perception.inference_backends import InferenceBackend
 from botender.perception.perception_manager import PerceptionManager
 from botender.webcam_processor import WebcamProcessor
 
@@ -22,6 +26,7 @@ LOGGING_PROCESS: Process | None = None
 SCREEN_WIDTH: int = 640
 SCREEN_HEIGHT: int = 480
 MAX_FPS: int = 30
+THREADED_CAPTURE: bool = True
 NUMBER_OF_CELLS_PER_SIDE: int = 7
 
 logger = logging.getLogger(__name__)
@@ -43,10 +48,48 @@ def parse_args():
         default="localhost",
     )
 
+    parser.add_argument(
+        "--detection_workers",
+        type=int,
+        help="The number of detection worker processes",
+        default=1,
+    )
+
+    parser.add_argument(
+        "--backend",
+        type=str,
+        choices=get_args(InferenceBackend),
+        help="The inference backend of the detection models",
+        default="pytorch",
+    )
+
+    parser.add_argument(
+        "--emotion_model",
+        type=str,
+        choices=get_args(EmotionModel),
+        help="The emotion classifier: py-feat's CNN or the action unit SVM",
+        default="pyfeat",
+    )
+
+    parser.add_argument(
+        "--gaze_mode",
+        type=str,
+        choices=get_args(GazeMode),
+        help="Follow faces smoothly or by the cells of the gaze grid",
+        default="smooth",
+    )
+
     return parser.parse_args()
 
 
-def setup(debug: bool = False, furhat_remote_address: str = "localhost"):
+def setup(
+    debug: bool = False,
+    furhat_remote_address: str = "localhost",
+    detection_workers: int = 1,
+    backend: InferenceBackend = "pytorch",
+    emotion_model: EmotionModel = "pyfeat",
+    gaze_mode: GazeMode = "smooth",
+):
     """Main setup function."""
     # Load environment variables
     load_dotenv()
@@ -61,13 +104,19 @@ def setup(debug: bool = False, furhat_remote_address: str = "localhost"):
     # Webcam
     global webcam_processor
     webcam_processor = WebcamProcessor(
-        frame_height=SCREEN_HEIGHT, frame_width=SCREEN_WIDTH
+        frame_height=SCREEN_HEIGHT,
+        frame_width=SCREEN_WIDTH,
+        threaded_capture=THREADED_CAPTURE,
     )
 
     # PyFeat
     global perception_manager
     perception_manager = PerceptionManager(
-        logging_queue=LOGGING_QUEUE, webcam_processor=webcam_processor
+        logging_queue=LOGGING_QUEUE,
+        webcam_processor=webcam_processor,
+        num_workers=detection_workers,
+        backend=backend,
+        emotion_model=emotion_model,
     )
 
     # Interaction
@@ -79,6 +128,7 @@ def setup(debug: bool = False, furhat_remote_address: str = "localhost"):
         SCREEN_WIDTH,
         SCREEN_HEIGHT,
         NUMBER_OF_CELLS_PER_SIDE,
+        gaze_mode,
     )
     interaction_thread.start()
 
@@ -108,7 +158,8 @@ def teardown():
 
 
 def render():
-    """Main render loop."""
+    """Main render loop. With threaded capture, `capture` only picks up the newest
+    frame and does not wait for the camera."""
     webcam_processor.capture()
     perception_manager.run()
     webcam_processor.render()
@@ -117,7 +168,14 @@ def render():
 if __name__ == "__main__":
     args = parse_args()
 
-    setup(debug=args.debug, furhat_remote_address=args.furhat_remote_address)
+    setup(
+        debug=args.debug,
+        furhat_remote_address=args.furhat_remote_address,
+        detection_workers=args.detection_workers,
+        backend=args.backend,
+        emotion_model=args.emotion_model,
+        gaze_mode=args.gaze_mode,
+    )
 
     # Enter the render loop
     run = True
@@ -0,0 +1,71 @@
+"""Small helpers to collect runtime metrics."""
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class RateMeter:
+    """Measures the rate of events per second over a rolling window."""
+
+    _window: float
+    _lock: threading.Lock
+    _window_start: float
+    _window_count: int = 0
+    _rate: float = 0.0
+
+    def __init__(self, window: float = 1.0):
+        self._window = window
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+
+    def tick(self) -> bool:
+        """Records an event. Returns True if the rate was updated."""
+
+        with self._lock:
+            self._window_count += 1
+            now = time.monotonic()
+            elapsed = now - self._window_start
+            if elapsed < self._window:
+                return False
+            self._rate = self._window_count / elapsed
+            self._window_count = 0
+            self._window_start = now
+            return True
+
+    @property
+    def rate(self) -> float:
+        """Returns the events per second measured over the last full window."""
+
+        return self._rate
+
+
+class LatencyTracker:
+    """Keeps the most recent latency samples and reports their percentiles."""
+
+    _samples: deque[float]
+    _lock: threading.Lock
+
+    def __init__(self, window: int = 300):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float) -> None:
+        """Records a latency sample in seconds."""
+
+        with self._lock:
+            self._samples.append(latency)
+
+    def percentiles(
+        self, percentiles: tuple[int, ...] = (50, 90, 99)
+    ) -> dict[int, float]:
+        """Returns the given percentiles of the recorded latencies in seconds, or an
+        empty dict if nothing was recorded yet."""
+
+        with self._lock:
+            if len(self._samples) == 0:
+                return {}
+            values = np.percentile(np.fromiter(self._samples, float), percentiles)
+        return dict(zip(percentiles, values.tolist()))
@@ -0,0 +1,350 @@
+"""Offline reports to pick the operating point of the detection pipeline per
+deployment.
+
+Run e.g. `python -m botender.perception.benchmarks detection-scale --source 0` to
+compare the detection scales on 100 webcam frames, or pass a video file as source.
+"""
+
+import argparse
+import time
+from typing import get_args
+
+import cv2  # type: ignore
+import numpy as np
+from feat import Detector  # type: ignore
+
+from botender.perception.detection_worker import get_device
+from botender.perception.detectors import EmotionDetector, FacialExpressionDetector
+from botender.perception.face_tracker import box_iou
+from botender.perception.inference_backends import InferenceBackend
+from botender.perception.model_cache import load_detector
+from botender.webcam_processor import Rectangle
+
+MATCH_IOU_THRESHOLD = 0.5
+"""The IoU above which a face counts as found."""
+
+
+def read_frames(source: str, count: int) -> list[np.ndarray]:
+    """Reads up to `count` frames from a camera index or a video file."""
+
+    capture = cv2.VideoCapture(int(source) if source.isdigit() else source)
+    frames = []
+    while len(frames) < count:
+        ret, frame = capture.read()
+        if not ret:
+            break
+        frames.append(frame)
+    capture.release()
+    return frames
+
+
+def _match(faces: list[Rectangle], reference: list[Rectangle]) -> list[float]:
+    """Returns the best IoU of every reference face with the given faces."""
+
+    return [
+        max((box_iou(face, ref) for face in faces), default=0.0) for ref in reference
+    ]
+
+
+def detection_scale_report(
+    detector: Detector, frames: list[np.ndarray], scales: list[float]
+) -> None:
+    """Prints latency and accuracy of face detection at the given scales. The
+    full-resolution detections serve as reference."""
+
+    reference_detector = FacialExpressionDetector(detector)
+    reference_detector.detect_faces(frames[0])  # warm up
+    reference = []
+    start_time = time.perf_counter()
+    for frame in frames:
+        reference.append(reference_detector.detect_faces(frame))
+    reference_latency = (time.perf_counter() - start_time) / len(frames)
+    reference_faces = sum(len(faces) for faces in reference)
+
+    print(f"Face detection on {len(frames)} frames, {reference_faces} reference faces")
+    print(f"{'scale':>6} {'ms/frame':>9} {'speedup':>8} {'recall':>7} {'mean IoU':>9}")
+    for scale in scales:
+        scaled_detector = FacialExpressionDetector(detector, detection_scale=scale)
+        ious: list[float] = []
+        start_time = time.perf_counter()
+        for frame, faces in zip(frames, reference):
+            ious.extend(_match(scaled_detector.detect_faces(frame), faces))
+        latency = (time.perf_counter() - start_time) / len(frames)
+        found = [iou for iou in ious if iou >= MATCH_IOU_THRESHOLD]
+        recall = len(found) / len(ious) if ious else 1.0
+        mean_iou = float(np.mean(found)) if found else 0.0
+        print(
+            f"{scale:>6.2f} {latency * 1000:>9.1f} {reference_latency / latency:>7.1f}x "
+            f"{recall:>7.1%} {mean_iou:>9.2f}"
+        )
+
+
+def emotion_roi_report(
+    detector: Detector, frames: list[np.ndarray], paddings: list[float]
+) -> None:
+    """Prints latency and agreement with full-frame inference of landmark and
+    emotion detection on padded regions of interest around the first face."""
+
+    face_detector = FacialExpressionDetector(detector)
+    emotion_detector = EmotionDetector(detector)
+    samples = []
+    for frame in frames:
+        face_detector.detect_faces(frame)
+        if len(face_detector.faces) > 0:
+            samples.append((frame, face_detector.faces[:1]))
+    if len(samples) == 0:
+        print("No faces found, skipping the emotion ROI report.")
+        return
+
+    def run(inputs) -> tuple[list[str], float]:
+        emotions = []
+        start_time = time.perf_counter()
+        for frame, faces in inputs:
+            features, faces = face_detector.extract_features(frame, faces)
+            emotions.append(emotion_detector.detect_emotion(frame, faces, features))
+        return emotions, (time.perf_counter() - start_time) / len(inputs)
+
+    reference, reference_latency = run(samples)
+    print(f"Emotion detection on {len(samples)} frames with faces")
+    print(f"{'padding':>8} {'ms/frame':>9} {'speedup':>8} {'agreement':>10}")
+    print(f"{'full':>8} {reference_latency * 1000:>9.1f} {1:>7.1f}x {1:>10.1%}")
+    for padding in paddings:
+        crops = []
+        for frame, faces in samples:
+            crop, face = FacialExpressionDetector.crop_face(frame, faces[0], padding)
+            crops.append((crop, [face]))
+        emotions, latency = run(crops)
+        agreement = np.mean([a == b for a, b in zip(emotions, reference)])
+        print(
+            f"{padding:>8.2f} {latency * 1000:>9.1f} "
+            f"{reference_latency / latency:>7.1f}x {agreement:>10.1%}"
+        )
+
+
+def emotion_batch_report(
+    detector: Detector, frames: list[np.ndarray], batch_sizes: list[int]
+) -> None:
+    """Prints the per-frame latency of landmark and emotion detection run frame by
+    frame versus as one batch, and how often both voting methods agree with the
+    majority vote over single-frame predictions."""
+
+    face_detector = FacialExpressionDetector(detector)
+    emotion_detector = EmotionDetector(detector)
+    samples = []
+    for frame in frames:
+        face_detector.detect_faces(frame)
+        if len(face_detector.faces) > 0:
+            samples.append((frame, face_detector.faces[:1]))
+    if len(samples) == 0:
+        print("No faces found, skipping the emotion batch report.")
+        return
+
+    print(f"Emotion detection on {len(samples)} frames with faces")
+    print(f"{'batch':>6} {'ms/frame':>9} {'speedup':>8} {'majority':>9} {'average':>8}")
+    for batch_size in batch_sizes:
+        windows = [
+            samples[start : start + batch_size]
+            for start in range(0, len(samples) - batch_size + 1, batch_size)
+        ]
+        if len(windows) == 0:
+            continue
+
+        single_votes = []
+        start_time = time.perf_counter()
+        for window in windows:
+            emotions = []
+            for frame, faces in window:
+                features, faces = face_detector.extract_features(frame, faces)
+                emotions.append(emotion_detector.detect_emotion(frame, faces, features))
+            single_votes.append(max(set(emotions), key=emotions.count))
+        single_latency = (time.perf_counter() - start_time) / (
+            len(windows) * batch_size
+        )
+
+        majority_votes, average_votes = [], []
+        start_time = time.perf_counter()
+        for window in windows:
+            batch = np.stack([frame for frame, _ in window])
+            faces = [faces for _, faces in window]
+            features = face_detector.extract_features_batch(batch, faces)
+            probabilities = emotion_detector.emotion_probabilities(
+                batch, faces, features
+            )
+            majority_votes.append(emotion_detector.vote(probabilities, "majority"))
+            average_votes.append(emotion_detector.vote(probabilities, "average"))
+        batch_latency = (time.perf_counter() - start_time) / (len(windows) * batch_size)
+
+        majority_agreement = np.mean(
+            [a == b for a, b in zip(majority_votes, single_votes)]
+        )
+        average_agreement = np.mean(
+            [a == b for a, b in zip(average_votes, single_votes)]
+        )
+        print(
+            f"{batch_size:>6} {batch_latency * 1000:>9.1f} "
+            f"{single_latency / batch_latency:>7.1f}x "
+            f"{majority_agreement:>9.1%} {average_agreement:>8.1%}"
+        )
+
+
+def _run_models(
+    detector: Detector, frames: list[np.ndarray], reference_faces: list[list]
+) -> tuple[list[list[Rectangle]], list, list, float]:
+    """Runs face, landmark and emotion detection on every frame. Landmarks and
+    emotions are detected on the reference faces so that backends can be compared
+    model by model. Returns faces, landmarks, emotion probabilities and the mean
+    latency per frame."""
+
+    faces, landmarks, emotions = [], [], []
+    start_time = time.perf_counter()
+    for frame, frame_faces in zip(frames, reference_faces):
+        faces.append(
+            [
+                ((x1, y1), (x2, y2))
+                for x1, y1, x2, y2, _ in detector.detect_faces(frame)[0]
+            ]
+        )
+        if len(frame_faces) == 0:
+            landmarks.append(None)
+            emotions.append(None)
+            continue
+        frame_landmarks = detector.detect_landmarks(frame, [frame_faces])
+        landmarks.append(np.asarray(frame_landmarks[0]))
+        emotions.append(
+            np.asarray(
+                detector.detect_emotions(frame, [frame_faces], frame_landmarks)[0]
+            )
+        )
+    return faces, landmarks, emotions, (time.perf_counter() - start_time) / len(frames)
+
+
+def backend_parity_report(
+    frames: list[np.ndarray], backends: list[InferenceBackend], device: str
+) -> None:
+    """Prints the latency of the inference backends and how closely their face
+    boxes, landmarks and emotion probabilities match the py-feat (PyTorch)
+    outputs."""
+
+    reference_detector, _ = load_detector(device)
+    reference_faces = [reference_detector.detect_faces(frame)[0] for frame in frames]
+    faces, landmarks, emotions, reference_latency = _run_models(
+        reference_detector, frames, reference_faces
+    )
+    del reference_detector
+
+    print(f"Backend parity on {len(frames)} frames ({device})")
+    print(
+        f"{'backend':>12} {'ms/frame':>9} {'speedup':>8} {'recall':>7} "
+        f"{'landmark px':>12} {'emotion':>8} {'max dp':>7}"
+    )
+    print(
+        f"{'pytorch':>12} {reference_latency * 1000:>9.1f} {1:>7.1f}x {1:>7.1%} "
+        f"{0:>12.2f} {1:>8.1%} {0:>7.3f}"
+    )
+    for backend in backends:
+        detector, timings = load_detector(device, backend=backend)
+        backend_faces, backend_landmarks, backend_emotions, latency = _run_models(
+            detector, frames, reference_faces
+        )
+        ious = [
+            iou
+            for found, reference in zip(backend_faces, faces)
+            for iou in _match(found, reference)
+        ]
+        recall = np.mean([iou >= MATCH_IOU_THRESHOLD for iou in ious]) if ious else 1
+        pairs = [
+            (a, b)
+            for a, b in zip(backend_landmarks, landmarks)
+            if a is not None and b is not None
+        ]
+        landmark_error = (
+            np.mean([np.abs(a - b).mean() for a, b in pairs]) if pairs else 0
+        )
+        pairs = [
+            (a, b)
+            for a, b in zip(backend_emotions, emotions)
+            if a is not None and b is not None
+        ]
+        agreement = (
+            np.mean([np.argmax(a[0]) == np.argmax(b[0]) for a, b in pairs])
+            if pairs
+            else 1
+        )
+        max_difference = max((np.abs(a - b).max() for a, b in pairs), default=0)
+        print(
+            f"{backend:>12} {latency * 1000:>9.1f} "
+            f"{reference_latency / latency:>7.1f}x {recall:>7.1%} "
+            f"{landmark_error:>12.2f} {agreement:>8.1%} {max_difference:>7.3f}"
+        )
+        print(f"{'':>12} {timings.summary()}")
+        del detector
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Botender perception benchmarks")
+    subparsers = parser.add_subparsers(dest="report", required=True)
+
+    scale_parser = subparsers.add_parser(
+        "detection-scale",
+        help="Accuracy versus latency of downscaled detection and emotion ROIs",
+    )
+    scale_parser.add_argument(
+        "--source", type=str, default="0", help="Camera index or video file"
+    )
+    scale_parser.add_argument(
+        "--frames", type=int, default=100, help="Number of frames to evaluate"
+    )
+    scale_parser.add_argument(
+        "--scales", type=float, nargs="+", default=[0.75, 0.5, 0.25]
+    )
+    scale_parser.add_argument("--paddings", type=float, nargs="+", default=[0.1, 0.25])
+
+    batch_parser = subparsers.add_parser(
+        "emotion-batch",
+        help="Latency of batched versus frame by frame emotion detection",
+    )
+    batch_parser.add_argument(
+        "--source", type=str, default="0", help="Camera index or video file"
+    )
+    batch_parser.add_argument(
+        "--frames", type=int, default=100, help="Number of frames to evaluate"
+    )
+    batch_parser.add_argument("--batch-sizes", type=int, nargs="+", default=[3, 8, 16])
+
+    parity_parser = subparsers.add_parser(
+        "backend-parity",
+        help="Latency and output parity of the inference backends with py-feat",
+    )
+    parity_parser.add_argument(
+        "--source", type=str, default="0", help="Camera index or video file"
+    )
+    parity_parser.add_argument(
+        "--frames", type=int, default=100, help="Number of frames to evaluate"
+    )
+    parity_parser.add_argument(
+        "--backends",
+        type=str,
+        nargs="+",
+        choices=get_args(InferenceBackend),
+        default=["quantized", "onnx", "onnx-int8"],
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    frames = read_frames(args.source, args.frames)
+    if len(frames) == 0:
+        raise SystemExit(f"Could not read any frames from {args.source}.")
+
+    if args.report == "backend-parity":
+        backend_parity_report(frames, args.backends, get_device())
+    elif args.report == "detection-scale":
+        detector = Detector(device=get_device())
+        detection_scale_report(detector, frames, args.scales)
+        emotion_roi_report(detector, frames, args.paddings)
+    elif args.report == "emotion-batch":
+        detector = Detector(device=get_device())
+        emotion_batch_report(detector, frames, args.batch_sizes)
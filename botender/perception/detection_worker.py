@@ -1,149 +1,261 @@
 import logging
+import time
 import warnings
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from multiprocessing import Process, Queue
 from multiprocessing.connection import Connection
+from multiprocessing.sharedctypes import Synchronized
+from queue import Full
 
 import numpy as np
 import torch
 from feat import Detector  # type: ignore
 
 import botender.logging_utils as logging_utils
-from botender.perception.detectors import EmotionDetector, FacialExpressionDetector
+from botender.perception.detectors import FacialExpressionDetector
+from botender.perception.face_tracker import FaceTracker
+from botender.perception.frame_buffer import SharedFrameBuffer
+from botender.perception.inference_backends import InferenceBackend
+from botender.perception.result_buffer import SharedResultBuffer
+from botender.perception.model_cache import load_detector
+from botender.perception.motion_gate import MotionGate
 from botender.webcam_processor import Rectangle
 
 warnings.filterwarnings("ignore")
 logger = logging.getLogger(__name__)
 
-EMOTION_DETECTION_FRAME_COUNT = 60
-"""The number of frames to use for emotion detection."""
-EMOTION_DETECTION_FRAME_SKIP = 30
-"""The number of frames to skip between emotion detections."""
+FRAME_WAIT_TIMEOUT = 0.1
+"""Seconds to block waiting for a new frame before checking the stop signal again."""
 
 
 @dataclass
 class DetectionResult:
     faces: list[Rectangle]
     """A list of rectangles representing the faces detected in the frame."""
-    features: list
-    """A list containing all the features extracted from the frame."""
     emotion: str
     """A string that defines the detected emotion."""
+    frame_sequence: int = 0
+    """The frame buffer sequence number of the frame the faces were detected in."""
+    frame_timestamp: float = 0.0
+    """The time (`time.monotonic`) at which that frame was captured."""
+    faces_timestamp: float = 0.0
+    """The time (`time.monotonic`) at which the faces were detected."""
+    emotion_timestamp: float = 0.0
+    """The time (`time.monotonic`) at which the emotion was detected."""
+    emotion_probabilities: dict[str, float] = field(default_factory=dict)
+    """The probability of every emotion in the last voting window."""
+    face_ids: list[int] = field(default_factory=list)
+    """Ids of the faces that are stable across results, assigned by the manager."""
+
+    @property
+    def primary_face(self) -> Rectangle | None:
+        """Returns the face that has been tracked for the longest time."""
+
+        if len(self.faces) == 0:
+            return None
+        if len(self.face_ids) != len(self.faces):
+            return self.faces[0]
+        return self.faces[self.face_ids.index(min(self.face_ids))]
+
+
+@dataclass
+class EmotionRequest:
+    """A frame handed from the face detection stage to the emotion stage."""
+
+    frame_sequence: int
+    """The frame buffer sequence number of the frame."""
+    frame: np.ndarray
+    """The frame the faces were detected in, or a region of interest of it."""
+    faces: list[tuple[float, float, float, float, float]]
+    """The raw face boxes (x1, y1, x2, y2, score) in the coordinates of `frame`."""
 
 
 class DetectionWorker(Process):
-    """A worker process that detects faces and emotions in frames."""
+    """A worker process that detects faces in frames. Several workers can share one
+    frame buffer; each published frame is claimed by exactly one idle worker.
+    Once the models are loaded the worker sends its `ModelTimings` over the control
+    connection. Results are published in its slot of the shared result buffer.
 
+    While no face is visible, frames that barely differ from the last frame the
+    detector ran on skip detection and republish the empty result (see
+    `MotionGate`).
+
+    While emotion detection is requested, frames the emotion stage asks for (see
+    `EmotionWorker`) are forwarded to it together with their face boxes."""
+
+    worker_id: int
     _logging_queue: Queue
-    _result_connection: Connection
-    _current_result: DetectionResult
+    _frame_buffer: SharedFrameBuffer
+    _result_buffer: SharedResultBuffer
+    _control_connection: Connection
 
     facial_expression_detector: FacialExpressionDetector
-    emotion_detector: EmotionDetector
     work_frame: np.ndarray
 
-    _last_emotions: list[str] = []
-    _detect_emotion_counter: int = 0
+    _emotion_queue: Queue
+    _next_emotion_sequence: Synchronized
+    _torch_threads: int | None
+    _redetect_interval: int
+    _detection_scale: float
+    _emotion_roi_padding: float | None
+    _backend: InferenceBackend
+    _motion_threshold: float | None
+    _motion_gate: MotionGate | None = None
 
     _detector: Detector
 
     def __init__(
         self,
         logging_queue: Queue,
-        frame_shape: tuple[int, ...],
-        shared_array,
-        result_connection: Connection,
+        frame_buffer: SharedFrameBuffer,
+        result_buffer: SharedResultBuffer,
+        control_connection: Connection,
         stop_event,
         detect_emotion_event,
+        emotion_queue: Queue,
+        next_emotion_sequence: Synchronized,
+        worker_id: int = 0,
+        torch_threads: int | None = None,
+        redetect_interval: int = 5,
+        detection_scale: float = 1.0,
+        emotion_roi_padding: float | None = 0.25,
+        backend: InferenceBackend = "pytorch",
+        motion_threshold: float | None = 3.0,
     ):
-        super().__init__(name="DetectionWorkerProcess")
-        logger.debug("Initializing detection worker...")
+        """`detection_scale` < 1 detects faces on a downscaled frame. With an
+        `emotion_roi_padding`, only a padded crop around the first face is handed to
+        the emotion stage instead of the full frame. `backend` selects how the models
+        are run (see `inference_backends`). `motion_threshold` is the mean gray value
+        difference below which a frame of an empty scene counts as unchanged; None
+        runs the detector on every frame."""
+        super().__init__(name=f"DetectionWorkerProcess-{worker_id}")
+        logger.debug(f"Initializing detection worker {worker_id}...")
+        self.worker_id = worker_id
+        self._emotion_queue = emotion_queue
+        self._next_emotion_sequence = next_emotion_sequence
+        self._torch_threads = torch_threads
+        self._redetect_interval = redetect_interval
+        self._detection_scale = detection_scale
+        self._emotion_roi_padding = emotion_roi_padding
+        self._backend = backend
+        self._motion_threshold = motion_threshold
         self._logging_queue = logging_queue
-        self.frame_shape = frame_shape
-        self._shared_array = shared_array
-        self._result_connection = result_connection
+        self._frame_buffer = frame_buffer
+        self._result_buffer = result_buffer
+        self._control_connection = control_connection
         self._stop_event = stop_event
         self._detect_emotion_event = detect_emotion_event
-        self._current_result = DetectionResult(faces=[], features=[], emotion="neutral")
 
     def run(self):
-        """Uses the detectors to detect faces and emotions in the newest frames."""
+        """Uses the detector to detect faces in the newest frames."""
 
         logging_utils.configure_publisher(self._logging_queue)
         logger.debug("Successfully spawned detection worker. Initializing detector...")
-        self._detector = Detector(device=_get_device())
+        if self._torch_threads is not None:
+            # Avoid oversubscribing the cores when several workers run in parallel
+            torch.set_num_threads(self._torch_threads)
+        # Warm up on frames of the size the face detector will actually see
+        height, width, *channels = self._frame_buffer.frame_shape
+        warmup_frame_shape = (
+            max(1, round(height * self._detection_scale)),
+            max(1, round(width * self._detection_scale)),
+            *channels,
+        )
+        self._detector, timings = load_detector(
+            get_device(), warmup_frame_shape, backend=self._backend
+        )
+        # Track faces between detections; an interval of 1 detects on every frame
+        tracker = None
+        if self._redetect_interval > 1:
+            tracker = FaceTracker(redetect_interval=self._redetect_interval)
         self.facial_expression_detector = FacialExpressionDetector(
-            detector=self._detector
+            detector=self._detector,
+            tracker=tracker,
+            detection_scale=self._detection_scale,
+        )
+        if self._motion_threshold is not None:
+            self._motion_gate = MotionGate(threshold=self._motion_threshold)
+        logger.debug(
+            f"Successfully initialized detector ({timings.summary()}). "
+            "Starting work loop..."
+        )
+        self.work_frame = np.empty(
+            self._frame_buffer.frame_shape, dtype=self._frame_buffer.dtype
         )
-        self.emotion_detector = EmotionDetector(detector=self._detector)
-        logger.debug("Successfully initialized detector. Starting work loop...")
-        self._result_connection.send(True)  # Signal that we are ready
+        self._control_connection.send(timings)  # Signal that we are ready
 
         while True:
             # React to stop signal
             if self._stop_event.is_set():
                 logger.debug("Received stop signal. Exiting...")
+                # Do not wait for queued frames the emotion stage won't consume
+                self._emotion_queue.cancel_join_thread()
+                self._frame_buffer.close()
                 return
 
-            # Get new frame
-            with self._shared_array.get_lock():
-                _work_frame = _to_numpy_array(self._shared_array, self.frame_shape)
-                self.work_frame = _work_frame.copy()
-                _work_frame[:] = 0
-            # No new work available
-            if np.array_equal(
-                self.work_frame, np.zeros(self.frame_shape, dtype=np.uint8)
-            ):
+            # Block until a new frame is published
+            sequence = self._frame_buffer.claim(timeout=FRAME_WAIT_TIMEOUT)
+            if sequence is None:
+                continue
+            frame_timestamp = self._frame_buffer.read(sequence, out=self.work_frame)
+            if frame_timestamp is None:
+                # Slot was overwritten before we could copy it
                 continue
 
-            # Do the work
-            faces = self.facial_expression_detector.detect_faces(self.work_frame)
-            self._current_result.faces = faces
-
-            clear_flag = False
-            if self._detect_emotion_event.is_set():
-                clear_flag = self.detect_emotion()
+            # Do the work, unless the scene is empty and did not change
+            start_time = time.monotonic()
+            if self._should_detect():
+                self.facial_expression_detector.detect_faces(self.work_frame)
+            faces_timestamp = time.monotonic()
 
-            # Send the result
-            self._result_connection.send(self._current_result)
-            if clear_flag:
-                self._detect_emotion_event.clear()
+            # Publish the result
+            self._result_buffer.write_faces(
+                self.worker_id,
+                sequence,
+                frame_timestamp,
+                self.facial_expression_detector.faces,
+                faces_timestamp,
+                faces_timestamp - start_time,
+            )
 
-    def detect_emotion(self) -> bool:
-        """Detects the emotion of the user."""
-        clear_flag = False
+            if self._detect_emotion_event.is_set():
+                self._forward_to_emotion_stage(sequence)
 
-        if self._detect_emotion_counter % EMOTION_DETECTION_FRAME_SKIP != 0:
-            self._detect_emotion_counter += 1
-            return clear_flag
+    def _should_detect(self) -> bool:
+        """Returns False if the work frame shows the same empty scene as the frame
+        the detector last ran on, so the previous (empty) result stays valid."""
 
-        # extract features
-        features, faces = self.facial_expression_detector.extract_features(
-            self.work_frame
-        )
-        self._current_result.features = features
-        # predict emotion
-        emotion = self.emotion_detector.detect_emotion(
-            frame=self.work_frame, faces=faces, features=features
-        )
-        self._last_emotions.append(emotion)
+        if self._motion_gate is None:
+            return True
+        if len(self.facial_expression_detector.faces) > 0:
+            # Faces are tracked on every frame; compare against the scene they left
+            self._motion_gate.reset()
+            return True
+        return self._motion_gate.should_detect(self.work_frame)
 
-        self._detect_emotion_counter += 1
+    def _forward_to_emotion_stage(self, sequence: int) -> None:
+        """Hands the work frame to the emotion stage if it asked for this frame."""
 
-        if self._detect_emotion_counter > EMOTION_DETECTION_FRAME_COUNT:
-            # update emotion by majority vote
-            self._current_result.emotion = max(
-                set(self._last_emotions), key=self._last_emotions.count
+        faces = self.facial_expression_detector.faces
+        if len(faces) == 0 or sequence < self._next_emotion_sequence.value:
+            return
+        if self._emotion_roi_padding is None:
+            frame, faces = self.work_frame.copy(), list(faces)
+        else:
+            # Emotions are predicted for the first face only, so its ROI is enough
+            frame, face = FacialExpressionDetector.crop_face(
+                self.work_frame, faces[0], self._emotion_roi_padding
             )
-            # reset emotion detection attributes
-            self._last_emotions = []
-            self._detect_emotion_counter = 0
-            clear_flag = True
-
-        return clear_flag
+            faces = [face]
+        try:
+            self._emotion_queue.put_nowait(
+                EmotionRequest(frame_sequence=sequence, frame=frame, faces=faces)
+            )
+        except Full:
+            pass
 
 
-def _get_device():
+def get_device():
     """Get the device to use for detection."""
 
     if torch.backends.cudnn.is_available():
@@ -154,11 +266,3 @@ def _get_device():
         device = "cpu"
     logger.info(f"Using device: {device}")
     return device
-
-
-def _to_numpy_array(shared_array, shape: tuple[int, ...] | None = None):
-    """Converts a shared array to a numpy array."""
-    if shape is None:
-        return np.frombuffer(shared_array.get_obj(), dtype=np.uint8)
-    else:
-        return np.frombuffer(shared_array.get_obj(), dtype=np.uint8).reshape(shape)
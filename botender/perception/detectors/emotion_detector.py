@@ -1,4 +1,8 @@
+import functools
 import logging
+import pickle
+from pathlib import Path
+from typing import Literal
 
 import numpy as np
 from feat import Detector  # type: ignore
@@ -13,14 +17,43 @@ PYFEAT_EMOTIONS_TO_EMOTIONS = {
     "sadness": "sad",
 }
 
+EMOTIONS = ("neutral", "angry", "happy", "sad")
+"""The emotions botender distinguishes."""
+
+VotingMethod = Literal["majority", "average"]
+"""How the emotions of several frames are combined: a majority vote over the
+per-frame emotions or the argmax of the averaged probabilities."""
+
+EmotionModel = Literal["pyfeat", "svm"]
+"""The classifier that predicts emotions: py-feat's ResMaskNet CNN or our SVM on
+the action units of the face (see `model-training/`)."""
+
+SVM_MODEL_DIR = Path(__file__).parent / "models"
+"""The directory containing the SVM, its feature scaler and its label encoder."""
+
 
 class EmotionDetector:
     """The EmotionDetector is responsible for predict the emotion of the user."""
 
     _detector: Detector  # use built-in pyfeat classifier
+    _model: EmotionModel
+    _labels: list[str]
+    """The emotion of every column of the probabilities."""
+    _label_indices: np.ndarray
+    """The index in `EMOTIONS` of every column of the probabilities."""
 
-    def __init__(self, detector: Detector):
+    def __init__(self, detector: Detector, model: EmotionModel = "pyfeat"):
         self._detector = detector
+        self._model = model
+        if model == "svm":
+            _, _, label_encoder = load_svm_model()
+            self._labels = [str(label) for label in label_encoder.classes_]
+        else:
+            self._labels = [
+                PYFEAT_EMOTIONS_TO_EMOTIONS.get(column, "neutral")
+                for column in FEAT_EMOTION_COLUMNS
+            ]
+        self._label_indices = np.array([EMOTIONS.index(x) for x in self._labels])
 
     def detect_emotion(
         self,
@@ -33,11 +66,85 @@ class EmotionDetector:
         if len(faces) == 0 or len(features) == 0:
             return "neutral"
 
-        detected_emotions = self._detector.detect_emotions(frame, [faces], features)[0]
+        return self.detect_emotions(frame, faces, features)[0]
+
+    def detect_emotions(
+        self,
+        frame: np.ndarray,
+        faces: list[tuple[float, float, float, float, float]],
+        features: list,
+    ) -> list[str]:
+        """Predicts the emotions of all given faces at once."""
+
+        if len(faces) == 0 or len(features) == 0:
+            return []
+
+        probabilities = self._predict(frame, [faces], features)[0]
+        return [self._to_emotion(p) for p in probabilities]
+
+    def emotion_probabilities(
+        self,
+        frames: np.ndarray,
+        faces: list[list[tuple[float, float, float, float, float]]],
+        features: list,
+    ) -> np.ndarray:
+        """Predicts the emotions of the first face in every frame of a batch of
+        equally sized frames in a single call. Returns an array of shape
+        (frames, emotion classes)."""
+
+        detected_emotions = self._predict(frames, faces, features)
+        return np.stack([emotions[0] for emotions in detected_emotions])
+
+    def vote(self, probabilities: np.ndarray, method: VotingMethod = "majority") -> str:
+        """Combines the emotion probabilities of several frames into one emotion."""
+
+        if len(probabilities) == 0:
+            return "neutral"
+        if method == "average":
+            return self._to_emotion(probabilities.mean(axis=0))
+        emotions = [self._to_emotion(p) for p in probabilities]
+        return max(set(emotions), key=emotions.count)
+
+    def to_emotion_probabilities(self, probabilities: np.ndarray) -> np.ndarray:
+        """Sums the probabilities of the model per emotion in `EMOTIONS`."""
+
+        return np.bincount(
+            self._label_indices, weights=probabilities, minlength=len(EMOTIONS)
+        )
+
+    def _predict(self, frames: np.ndarray, faces: list, features: list) -> list:
+        """Returns the emotion probabilities of every face, per frame."""
+
+        if self._model == "svm":
+            action_units = self._detector.detect_aus(frames, features)
+            return [classify_action_units(np.asarray(aus)) for aus in action_units]
+        detected_emotions = self._detector.detect_emotions(frames, faces, features)
+        return [np.asarray(emotions) for emotions in detected_emotions]
+
+    def _to_emotion(self, probabilities: np.ndarray) -> str:
+        """Maps the probabilities of the model to one of our emotions."""
+
+        return self._labels[int(np.argmax(probabilities))]
+
+
+@functools.cache
+def load_svm_model():
+    """Loads the SVM, its scaler and its label encoder once per process."""
+
+    models = []
+    for name in ["svm_model", "scaler", "label_encoder"]:
+        with open(SVM_MODEL_DIR / f"{name}.pkl", "rb") as file:
+            models.append(pickle.load(file))
+    return tuple(models)
+
 
-        detected_emotion = FEAT_EMOTION_COLUMNS[np.argmax(detected_emotions[0])]
-        if detected_emotion not in PYFEAT_EMOTIONS_TO_EMOTIONS.keys():
-            detected_emotion = "neutral"
-        predicted_emotion = PYFEAT_EMOTIONS_TO_EMOTIONS[detected_emotion]
+def classify_action_units(action_units: np.ndarray) -> np.ndarray:
+    """Classifies the action units of several faces (faces x 20 AUs in py-feat's
+    order) in one call. Returns the softmax of the SVM decision values per face."""
 
-        return predicted_emotion
+    svm, scaler, _ = load_svm_model()
+    # Action units py-feat could not estimate fall back to the training mean
+    features = np.nan_to_num(scaler.transform(action_units), nan=0.0)
+    scores = svm.decision_function(features)
+    scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+    return scores / scores.sum(axis=1, keepdims=True)
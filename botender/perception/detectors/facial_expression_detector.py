@@ -1,7 +1,9 @@
+import cv2  # type: ignore
 import numpy as np
 from feat import Detector  # type: ignore
 from typing import Tuple
 
+from botender.perception.face_tracker import FaceTracker
 from botender.webcam_processor import Rectangle
 
 
@@ -10,27 +12,111 @@ class FacialExpressionDetector:
     features from them."""
 
     _detector: Detector
+    _tracker: FaceTracker | None
+    _detection_scale: float
+    _scaled_frame: np.ndarray | None = None
     _faces: list[tuple[float, float, float, float, float]]
     _features: list
 
-    def __init__(self, detector: Detector):
+    def __init__(
+        self,
+        detector: Detector,
+        tracker: FaceTracker | None = None,
+        detection_scale: float = 1.0,
+    ):
+        """`detection_scale` < 1 runs the face detector on a downscaled copy of the
+        frame and maps the boxes back to full resolution."""
+
+        if not 0 < detection_scale <= 1:
+            raise ValueError("detection_scale must be in (0, 1].")
         self._detector = detector
+        self._tracker = tracker
+        self._detection_scale = detection_scale
+        self._faces = []
 
     def detect_faces(self, frame) -> list[Rectangle]:
         """Detects faces in a frame and returns a list of rectangles representing the
-        faces."""
+        faces. With a tracker, the detector only runs when the faces cannot be
+        tracked from the previous frame."""
 
-        self._faces = self._detector.detect_faces(frame)[0]
+        if self._tracker is not None:
+            self._faces = self._tracker.update(frame, self._run_detector)
+        else:
+            self._faces = self._run_detector(frame)
         return [((x1, y1), (x2, y2)) for x1, y1, x2, y2, _ in self._faces]
 
-    def extract_features(self, frame: np.ndarray) -> Tuple[list, list]:
-        """Extracts features from the faces detected in the last frame and returns them
-        as a list. Returns additionally a list of the faces that were used to extract."""
+    def _run_detector(
+        self, frame: np.ndarray
+    ) -> list[tuple[float, float, float, float, float]]:
+        """Runs the face detector on the frame, downscaled by the detection scale."""
+
+        scale = self._detection_scale
+        if scale == 1:
+            return self._detector.detect_faces(frame)[0]
+
+        height, width = frame.shape[:2]
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        if self._scaled_frame is None or self._scaled_frame.shape[1::-1] != size:
+            self._scaled_frame = np.empty(
+                (size[1], size[0], *frame.shape[2:]), np.uint8
+            )
+        cv2.resize(frame, size, dst=self._scaled_frame, interpolation=cv2.INTER_AREA)
+
+        faces = self._detector.detect_faces(self._scaled_frame)[0]
+        return [
+            (x1 / scale, y1 / scale, x2 / scale, y2 / scale, score)
+            for x1, y1, x2, y2, score in faces
+        ]
+
+    @property
+    def faces(self) -> list[tuple[float, float, float, float, float]]:
+        """Returns the raw faces (x1, y1, x2, y2, score) detected in the last frame."""
+
+        return self._faces
 
-        faces = self._faces
+    def extract_features(
+        self,
+        frame: np.ndarray,
+        faces: list[tuple[float, float, float, float, float]] | None = None,
+    ) -> Tuple[list, list]:
+        """Extracts features from the given faces (by default the faces detected in the
+        last frame) and returns them as a list. Returns additionally a list of the
+        faces that were used to extract."""
+
+        if faces is None:
+            faces = self._faces
         if len(faces) == 0:
             return ([], faces)
 
         landmarks = self._detector.detect_landmarks(frame, [faces])
 
         return (landmarks, faces)
+
+    def extract_features_batch(
+        self,
+        frames: np.ndarray,
+        faces: list[list[tuple[float, float, float, float, float]]],
+    ) -> list:
+        """Extracts the features of a batch of equally sized frames, stacked along
+        the first axis, in a single call. `faces` holds the faces of every frame."""
+
+        return self._detector.detect_landmarks(frames, faces)
+
+    @staticmethod
+    def crop_face(
+        frame: np.ndarray,
+        face: tuple[float, float, float, float, float],
+        padding: float = 0.25,
+    ) -> tuple[np.ndarray, tuple[float, float, float, float, float]]:
+        """Crops a region of interest around the face, padded by the given fraction of
+        the face size on every side. Returns the crop and the face in crop
+        coordinates."""
+
+        x1, y1, x2, y2, score = face
+        pad_x, pad_y = (x2 - x1) * padding, (y2 - y1) * padding
+        height, width = frame.shape[:2]
+        left, top = max(0, int(x1 - pad_x)), max(0, int(y1 - pad_y))
+        right = min(width, int(np.ceil(x2 + pad_x)))
+        bottom = min(height, int(np.ceil(y2 + pad_y)))
+        crop = np.ascontiguousarray(frame[top:bottom, left:right])
+        return crop, (x1 - left, y1 - top, x2 - left, y2 - top, score)
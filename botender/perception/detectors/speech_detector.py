@@ -1,17 +1,25 @@
 import logging
-
-from furhat_remote_api import FurhatRemoteAPI  # type: ignore
+from typing import Any, Protocol
 
 logger = logging.getLogger(__name__)
 
 
+class SpeechRobot(Protocol):
+    """The methods of the robot the SpeechDetector uses, as offered by the
+    `FurhatRemoteAPI` and the dispatcher of the interaction."""
+
+    def set_led(self, **kwargs) -> Any: ...
+
+    def listen(self, **kwargs) -> Any: ...
+
+
 class SpeechDetector:
     """The SpeechDetector is responsible for capturing speech from the user.
     It runs in the same thread as the InteractionManager."""
 
-    _furhat: FurhatRemoteAPI
+    _furhat: SpeechRobot
 
-    def __init__(self, furhat: FurhatRemoteAPI):
+    def __init__(self, furhat: SpeechRobot):
         self._furhat = furhat
 
     def capture_speech(self) -> str:
@@ -26,6 +34,10 @@ class SpeechDetector:
             # Turn off LED (reset to default or turn off completely)
             self._furhat.set_led(red=0, green=255, blue=0)
 
+            if speech_result is None:
+                # The robot was shut down while listening
+                return ""
+
             # Check if the speech was successfully captured
             if speech_result.success:
                 captured_speech = speech_result.message
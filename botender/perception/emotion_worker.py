@@ -0,0 +1,226 @@
+import logging
+import time
+import warnings
+from multiprocessing import Process, Queue
+from multiprocessing.connection import Connection
+from multiprocessing.sharedctypes import Synchronized
+from queue import Empty
+
+import cv2  # type: ignore
+import numpy as np
+import torch
+from feat import Detector  # type: ignore
+
+import botender.logging_utils as logging_utils
+from botender.perception.detection_worker import EmotionRequest, get_device
+from botender.perception.detectors import EmotionDetector, FacialExpressionDetector
+from botender.perception.detectors.emotion_detector import EmotionModel, VotingMethod
+from botender.perception.face_tracker import RawFace
+from botender.perception.inference_backends import InferenceBackend
+from botender.perception.model_cache import load_detector
+from botender.perception.result_buffer import SharedResultBuffer
+
+warnings.filterwarnings("ignore")
+logger = logging.getLogger(__name__)
+
+EMOTION_DETECTION_FRAME_COUNT = 60
+"""The number of frames to use for emotion detection."""
+EMOTION_DETECTION_FRAME_SKIP = 30
+"""The number of frames to skip between emotion detections."""
+REQUEST_WAIT_TIMEOUT = 0.1
+"""Seconds to block waiting for a request before checking the stop signal again."""
+BATCH_FRAME_SIZE = 256
+"""Side length of the square frames that face crops of different sizes are
+letterboxed into so that a window can be stacked into one batch."""
+
+
+class EmotionWorker(Process):
+    """The second stage of the detection pipeline. Runs landmark and emotion
+    detection on frames handed over by the face detection stage, so that face
+    detection keeps running at frame rate while emotions are detected.
+
+    The worker asks for frames by publishing the next sequence number it wants to
+    sample in `next_emotion_sequence`. The sampled frames of a voting window are
+    collected and run through landmark and emotion detection as one batch once the
+    window is complete. The voted emotion is published in slot `result_slot` of the
+    shared result buffer and the detect emotion event is cleared. Once the models
+    are loaded the worker sends its `ModelTimings` over the control connection."""
+
+    _logging_queue: Queue
+    _emotion_queue: Queue
+    _result_buffer: SharedResultBuffer
+    _result_slot: int
+    _control_connection: Connection
+    _next_emotion_sequence: Synchronized
+    _torch_threads: int | None
+    _voting: VotingMethod
+    _emotion_model: EmotionModel
+    _backend: InferenceBackend
+
+    facial_expression_detector: FacialExpressionDetector
+    emotion_detector: EmotionDetector
+
+    _window_frames: list[np.ndarray]
+    _window_faces: list[list[RawFace]]
+    _window_start: int | None = None
+
+    _detector: Detector
+
+    def __init__(
+        self,
+        logging_queue: Queue,
+        emotion_queue: Queue,
+        result_buffer: SharedResultBuffer,
+        result_slot: int,
+        control_connection: Connection,
+        next_emotion_sequence: Synchronized,
+        stop_event,
+        detect_emotion_event,
+        torch_threads: int | None = None,
+        voting: VotingMethod = "majority",
+        backend: InferenceBackend = "pytorch",
+        emotion_model: EmotionModel = "pyfeat",
+    ):
+        super().__init__(name="EmotionWorkerProcess")
+        logger.debug("Initializing emotion worker...")
+        self._logging_queue = logging_queue
+        self._emotion_queue = emotion_queue
+        self._result_buffer = result_buffer
+        self._result_slot = result_slot
+        self._control_connection = control_connection
+        self._next_emotion_sequence = next_emotion_sequence
+        self._stop_event = stop_event
+        self._detect_emotion_event = detect_emotion_event
+        self._torch_threads = torch_threads
+        self._voting = voting
+        self._backend = backend
+        self._emotion_model = emotion_model
+        self._window_frames = []
+        self._window_faces = []
+
+    def run(self):
+        """Detects emotions in the frames handed over by the face detection stage."""
+
+        logging_utils.configure_publisher(self._logging_queue)
+        logger.debug("Successfully spawned emotion worker. Initializing detector...")
+        if self._torch_threads is not None:
+            torch.set_num_threads(self._torch_threads)
+        self._detector, timings = load_detector(
+            get_device(),
+            (BATCH_FRAME_SIZE, BATCH_FRAME_SIZE, 3),
+            backend=self._backend,
+            warmup_action_units=self._emotion_model == "svm",
+        )
+        self.facial_expression_detector = FacialExpressionDetector(
+            detector=self._detector
+        )
+        self.emotion_detector = EmotionDetector(
+            detector=self._detector, model=self._emotion_model
+        )
+        logger.debug(
+            f"Successfully initialized detector ({timings.summary()}). "
+            "Starting work loop..."
+        )
+        self._control_connection.send(timings)  # Signal that we are ready
+
+        while not self._stop_event.is_set():
+            request = self._get_latest_request()
+            if request is None:
+                continue
+            if not self._detect_emotion_event.is_set():
+                # Emotion detection was not requested (anymore)
+                self._reset_window()
+                continue
+            self.detect_emotion(request)
+        logger.debug("Received stop signal. Exiting...")
+
+    def _get_latest_request(self) -> EmotionRequest | None:
+        """Blocks until a request arrives and returns the newest queued one."""
+
+        try:
+            request = self._emotion_queue.get(timeout=REQUEST_WAIT_TIMEOUT)
+        except Empty:
+            return None
+        # Several face workers may have answered the same call
+        while True:
+            try:
+                newer_request = self._emotion_queue.get_nowait()
+            except Empty:
+                break
+            if newer_request.frame_sequence > request.frame_sequence:
+                request = newer_request
+        if request.frame_sequence < self._next_emotion_sequence.value:
+            return None
+        return request
+
+    def detect_emotion(self, request: EmotionRequest) -> None:
+        """Adds the requested frame to the voting window and detects the emotion
+        once the window is complete."""
+
+        if self._window_start is None:
+            self._window_start = request.frame_sequence
+        self._next_emotion_sequence.value = (
+            request.frame_sequence + EMOTION_DETECTION_FRAME_SKIP
+        )
+        self._window_frames.append(request.frame)
+        self._window_faces.append(request.faces)
+
+        if request.frame_sequence - self._window_start >= (
+            EMOTION_DETECTION_FRAME_COUNT
+        ):
+            frames, faces = self._stack_window()
+            features = self.facial_expression_detector.extract_features_batch(
+                frames, faces
+            )
+            probabilities = self.emotion_detector.emotion_probabilities(
+                frames, faces, features
+            )
+            voted_emotion = self.emotion_detector.vote(probabilities, self._voting)
+            self._result_buffer.write_emotion(
+                self._result_slot,
+                voted_emotion,
+                self.emotion_detector.to_emotion_probabilities(
+                    probabilities.mean(axis=0)
+                ),
+                time.monotonic(),
+            )
+            self._reset_window()
+            self._detect_emotion_event.clear()
+
+    def _stack_window(self) -> tuple[np.ndarray, list[list[RawFace]]]:
+        """Stacks the frames of the window into one batch. Face crops differ in
+        size and are letterboxed into squares of `BATCH_FRAME_SIZE` first."""
+
+        shapes = {frame.shape for frame in self._window_frames}
+        if len(shapes) == 1:
+            return np.stack(self._window_frames), self._window_faces
+
+        batch = np.zeros(
+            (len(self._window_frames), BATCH_FRAME_SIZE, BATCH_FRAME_SIZE, 3),
+            dtype=np.uint8,
+        )
+        faces = []
+        for index, (frame, frame_faces) in enumerate(
+            zip(self._window_frames, self._window_faces)
+        ):
+            height, width = frame.shape[:2]
+            scale = BATCH_FRAME_SIZE / max(height, width)
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            batch[index, : size[1], : size[0]] = cv2.resize(
+                frame, size, interpolation=cv2.INTER_AREA
+            )
+            faces.append(
+                [
+                    (x1 * scale, y1 * scale, x2 * scale, y2 * scale, score)
+                    for x1, y1, x2, y2, score in frame_faces
+                ]
+            )
+        return batch, faces
+
+    def _reset_window(self) -> None:
+        """Resets the emotion detection attributes."""
+
+        self._window_frames = []
+        self._window_faces = []
+        self._window_start = None
+        self._next_emotion_sequence.value = 0
@@ -0,0 +1,234 @@
+"""Track-by-detection helpers to avoid running the face detector on every frame."""
+
+import logging
+from typing import Callable
+
+import cv2  # type: ignore
+import numpy as np
+
+from botender.webcam_processor import Rectangle
+
+logger = logging.getLogger(__name__)
+
+RawFace = tuple[float, float, float, float, float]
+"""A face as returned by py-feat: x1, y1, x2, y2 and the detection score."""
+
+_SCENE_SCALE = 0.125
+"""Scale of the thumbnail used to detect scene changes."""
+_MIN_TRACKED_POINTS = 4
+"""The minimum number of points per face that must be tracked successfully."""
+
+
+class FaceTracker:
+    """Propagates face boxes from frame to frame with sparse optical flow and only
+    runs the (expensive) face detector every `redetect_interval` frames, when the
+    tracking quality drops or when the scene changes a lot."""
+
+    _redetect_interval: int
+    _min_tracking_quality: float
+    _scene_change_threshold: float
+
+    _faces: list[RawFace]
+    _points: list[np.ndarray]
+    _previous_gray: np.ndarray | None = None
+    _previous_thumbnail: np.ndarray | None = None
+    _frames_since_detection: int = 0
+    detections: int = 0
+    """The number of frames the full detector ran on."""
+    tracked_frames: int = 0
+    """The number of frames the faces were propagated by tracking."""
+
+    def __init__(
+        self,
+        redetect_interval: int = 5,
+        min_tracking_quality: float = 0.6,
+        scene_change_threshold: float = 20.0,
+    ):
+        self._redetect_interval = redetect_interval
+        self._min_tracking_quality = min_tracking_quality
+        self._scene_change_threshold = scene_change_threshold
+        self._faces = []
+        self._points = []
+
+    def update(
+        self, frame: np.ndarray, detect: Callable[[np.ndarray], list[RawFace]]
+    ) -> list[RawFace]:
+        """Returns the faces in the frame. Calls `detect` only if the faces cannot be
+        propagated from the previous frame."""
+
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        thumbnail = cv2.resize(
+            gray, None, fx=_SCENE_SCALE, fy=_SCENE_SCALE, interpolation=cv2.INTER_AREA
+        )
+
+        faces = None
+        if not self._needs_detection(thumbnail):
+            faces = self._track(gray)
+        if faces is None:
+            faces = detect(frame)
+            self._init_points(gray, faces)
+            self._frames_since_detection = 0
+            self.detections += 1
+        else:
+            self._frames_since_detection += 1
+            self.tracked_frames += 1
+
+        self._faces = faces
+        self._previous_gray = gray
+        self._previous_thumbnail = thumbnail
+        return faces
+
+    def _needs_detection(self, thumbnail: np.ndarray) -> bool:
+        """Returns True if the detector has to run on the current frame."""
+
+        if self._previous_gray is None or self._previous_thumbnail is None:
+            return True
+        # Nothing to track. Keep detecting so that new faces are picked up quickly.
+        if len(self._faces) == 0:
+            return True
+        if self._frames_since_detection + 1 >= self._redetect_interval:
+            return True
+        scene_change = float(np.mean(cv2.absdiff(thumbnail, self._previous_thumbnail)))
+        return scene_change > self._scene_change_threshold
+
+    def _init_points(self, gray: np.ndarray, faces: list[RawFace]) -> None:
+        """Selects good features to track inside every face box."""
+
+        self._points = []
+        height, width = gray.shape
+        for x1, y1, x2, y2, _ in faces:
+            left, top = max(0, int(x1)), max(0, int(y1))
+            right, bottom = min(width, int(x2)), min(height, int(y2))
+            points = None
+            if right - left > 1 and bottom - top > 1:
+                points = cv2.goodFeaturesToTrack(
+                    gray[top:bottom, left:right],
+                    maxCorners=30,
+                    qualityLevel=0.01,
+                    minDistance=5,
+                )
+            if points is None:
+                self._points.append(np.empty((0, 1, 2), dtype=np.float32))
+                continue
+            points += np.array([left, top], dtype=np.float32)
+            self._points.append(points)
+
+    def _track(self, gray: np.ndarray) -> list[RawFace] | None:
+        """Propagates the faces of the previous frame with optical flow. Returns
+        None if the tracking quality is too low."""
+
+        if any(len(points) < _MIN_TRACKED_POINTS for points in self._points):
+            return None
+
+        all_points = np.concatenate(self._points)
+        next_points, status, _ = cv2.calcOpticalFlowPyrLK(
+            self._previous_gray, gray, all_points, None
+        )
+        status = status.reshape(-1).astype(bool)
+
+        faces: list[RawFace] = []
+        points_per_face: list[np.ndarray] = []
+        offset = 0
+        for face, points in zip(self._faces, self._points):
+            count = len(points)
+            face_status = status[offset : offset + count]
+            face_next_points = next_points[offset : offset + count]
+            offset += count
+
+            quality = float(np.mean(face_status))
+            if (
+                quality < self._min_tracking_quality
+                or np.count_nonzero(face_status) < _MIN_TRACKED_POINTS
+            ):
+                return None
+
+            # Move the box by the median displacement of its points
+            shift = np.median(
+                (face_next_points - points)[face_status].reshape(-1, 2), axis=0
+            )
+            x1, y1, x2, y2, score = face
+            faces.append(
+                (
+                    x1 + float(shift[0]),
+                    y1 + float(shift[1]),
+                    x2 + float(shift[0]),
+                    y2 + float(shift[1]),
+                    score * quality,
+                )
+            )
+            points_per_face.append(face_next_points[face_status])
+
+        self._points = points_per_face
+        return faces
+
+
+class FaceIdAssigner:
+    """Assigns stable ids to faces across frames by matching them to the faces of
+    the previous results via their intersection over union."""
+
+    _iou_threshold: float
+    _max_missed: int
+    _tracks: dict[int, Rectangle]
+    _missed: dict[int, int]
+    _next_id: int = 0
+
+    def __init__(self, iou_threshold: float = 0.3, max_missed: int = 5):
+        self._iou_threshold = iou_threshold
+        self._max_missed = max_missed
+        self._tracks = {}
+        self._missed = {}
+
+    def assign(self, faces: list[Rectangle]) -> list[int]:
+        """Returns an id for every face. Faces that overlap a known face keep its
+        id, all others get a new one."""
+
+        candidates = sorted(
+            (
+                (box_iou(face, track), face_index, face_id)
+                for face_index, face in enumerate(faces)
+                for face_id, track in self._tracks.items()
+            ),
+            reverse=True,
+        )
+
+        ids: list[int | None] = [None] * len(faces)
+        matched: set[int] = set()
+        for iou, face_index, face_id in candidates:
+            if iou < self._iou_threshold:
+                break
+            if ids[face_index] is not None or face_id in matched:
+                continue
+            ids[face_index] = face_id
+            matched.add(face_id)
+
+        for face_index, face_id in enumerate(ids):
+            if face_id is None:
+                face_id = self._next_id
+                self._next_id += 1
+                ids[face_index] = face_id
+            self._tracks[face_id] = faces[face_index]
+            self._missed[face_id] = 0
+
+        # Keep unmatched tracks around for a few results to bridge missed detections
+        for face_id in list(self._tracks):
+            if face_id in matched or face_id in ids:
+                continue
+            self._missed[face_id] += 1
+            if self._missed[face_id] > self._max_missed:
+                del self._tracks[face_id]
+                del self._missed[face_id]
+
+        return [face_id for face_id in ids if face_id is not None]
+
+
+def box_iou(a: Rectangle, b: Rectangle) -> float:
+    """Returns the intersection over union of two rectangles."""
+
+    width = min(a[1][0], b[1][0]) - max(a[0][0], b[0][0])
+    height = min(a[1][1], b[1][1]) - max(a[0][1], b[0][1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    intersection = width * height
+    area_a = (a[1][0] - a[0][0]) * (a[1][1] - a[0][1])
+    area_b = (b[1][0] - b[0][0]) * (b[1][1] - b[0][1])
+    return intersection / (area_a + area_b - intersection)
@@ -0,0 +1,230 @@
+"""Shared-memory ring buffer used to hand frames to the detection workers."""
+
+import logging
+import multiprocessing as mp
+import os
+import time
+from multiprocessing.shared_memory import SharedMemory
+from multiprocessing.synchronize import Condition
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CONTROL_DTYPE = np.dtype([("published", np.uint64), ("claimed", np.uint64)])
+"""Control block of the ring buffer. `published` is the newest sequence number that
+is available as work, `claimed` the newest one that was taken by a worker."""
+SLOT_HEADER_DTYPE = np.dtype([("sequence", np.uint64), ("timestamp", np.float64)])
+"""Header of every frame slot. A sequence number of 0 marks a slot as invalid."""
+_ALIGNMENT = 64
+"""Byte alignment of the frame slots inside the shared memory block."""
+
+
+class SharedFrameBuffer:
+    """A ring buffer of frame slots in shared memory.
+
+    Every written frame gets a monotonically increasing sequence number (starting at
+    1) and a capture timestamp (`time.monotonic`, which is shared between processes).
+    Checking for new work is therefore an integer compare and readers can block on a
+    condition instead of polling. There must only be a single writer per buffer."""
+
+    frame_shape: tuple[int, ...]
+    dtype: np.dtype
+    num_slots: int
+
+    _shm: SharedMemory
+    _condition: Condition
+    _owner_pid: int
+    _write_sequence: int = 0
+    _pending_slot: int | None = None
+    _reserved_slot: int | None = None
+
+    _control: np.ndarray
+    _headers: np.ndarray
+    _frames: np.ndarray
+
+    def __init__(
+        self,
+        frame_shape: tuple[int, ...],
+        dtype: np.dtype | type = np.uint8,
+        num_slots: int = 4,
+    ):
+        if num_slots < 2:
+            raise ValueError("SharedFrameBuffer needs at least two slots.")
+
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = np.dtype(dtype)
+        self.num_slots = num_slots
+        self._owner_pid = os.getpid()
+        self._condition = mp.Condition()
+        self._shm = SharedMemory(create=True, size=self._buffer_size())
+        self._attach()
+        self._control[:] = 0
+        self._headers[:] = 0
+        logger.debug(
+            f"Allocated frame buffer {self._shm.name} with {num_slots} slots "
+            f"({self._shm.size / 1e6:.1f} MB)."
+        )
+
+    def __getstate__(self) -> dict:
+        """Only pickle what is needed to re-attach to the shared memory block."""
+
+        return {
+            "frame_shape": self.frame_shape,
+            "dtype": self.dtype,
+            "num_slots": self.num_slots,
+            "shm_name": self._shm.name,
+            "condition": self._condition,
+            "owner_pid": self._owner_pid,
+        }
+
+    def __setstate__(self, state: dict) -> None:
+        self.frame_shape = state["frame_shape"]
+        self.dtype = state["dtype"]
+        self.num_slots = state["num_slots"]
+        self._condition = state["condition"]
+        self._owner_pid = state["owner_pid"]
+        self._shm = SharedMemory(name=state["shm_name"])
+        self._attach()
+
+    def _frame_nbytes(self) -> int:
+        return int(np.prod(self.frame_shape)) * self.dtype.itemsize
+
+    def _frames_offset(self) -> int:
+        header_bytes = CONTROL_DTYPE.itemsize + SLOT_HEADER_DTYPE.itemsize * (
+            self.num_slots
+        )
+        return -(-header_bytes // _ALIGNMENT) * _ALIGNMENT
+
+    def _buffer_size(self) -> int:
+        return self._frames_offset() + self._frame_nbytes() * self.num_slots
+
+    def _attach(self) -> None:
+        """Creates the numpy views onto the shared memory block."""
+
+        buffer = self._shm.buf
+        self._control = np.ndarray((1,), dtype=CONTROL_DTYPE, buffer=buffer)
+        self._headers = np.ndarray(
+            (self.num_slots,),
+            dtype=SLOT_HEADER_DTYPE,
+            buffer=buffer,
+            offset=CONTROL_DTYPE.itemsize,
+        )
+        self._frames = np.ndarray(
+            (self.num_slots, *self.frame_shape),
+            dtype=self.dtype,
+            buffer=buffer,
+            offset=self._frames_offset(),
+        )
+
+    @property
+    def latest_sequence(self) -> int:
+        """Returns the sequence number of the newest published frame."""
+
+        return int(self._control["published"][0])
+
+    @property
+    def pending(self) -> bool:
+        """Returns True if the newest published frame was not claimed yet."""
+
+        return self._has_unclaimed_frame()
+
+    def reserve(self, sequence: int | None) -> None:
+        """Keeps the writer from overwriting the slot of the frame with the given
+        sequence number, e.g. while that frame is rendered. Only one slot can be
+        reserved at a time, None releases it. Only the writer may reserve."""
+
+        if sequence is None:
+            self._reserved_slot = None
+            return
+        if self.num_slots < 3:
+            raise ValueError("Reserving a slot needs at least three slots.")
+        self._reserved_slot = (sequence - 1) % self.num_slots
+
+    def begin_write(self) -> np.ndarray:
+        """Invalidates the next slot and returns a writable view onto it. A reserved
+        slot is skipped together with its sequence number."""
+
+        if self._write_sequence % self.num_slots == self._reserved_slot:
+            self._write_sequence += 1
+        slot = self._write_sequence % self.num_slots
+        with self._condition:
+            self._headers["sequence"][slot] = 0
+        self._pending_slot = slot
+        return self._frames[slot]
+
+    def commit(self, timestamp: float | None = None) -> int:
+        """Marks the slot returned by `begin_write` as valid and returns its sequence
+        number."""
+
+        if self._pending_slot is None:
+            raise RuntimeError("commit() called without begin_write().")
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        self._write_sequence += 1
+        with self._condition:
+            self._headers[self._pending_slot] = (self._write_sequence, timestamp)
+        self._pending_slot = None
+        return self._write_sequence
+
+    def publish(self, sequence: int) -> None:
+        """Makes the frame with the given sequence number available as work and wakes
+        up waiting readers."""
+
+        with self._condition:
+            self._control["published"][0] = sequence
+            self._condition.notify_all()
+
+    def write(self, frame: np.ndarray, timestamp: float | None = None) -> int:
+        """Copies a frame into the next slot, publishes it and returns its sequence
+        number."""
+
+        np.copyto(self.begin_write(), frame)
+        sequence = self.commit(timestamp)
+        self.publish(sequence)
+        return sequence
+
+    def claim(self, timeout: float | None = None) -> int | None:
+        """Blocks until an unclaimed frame was published and claims it. Returns its
+        sequence number or None if the timeout expired."""
+
+        with self._condition:
+            if not self._condition.wait_for(self._has_unclaimed_frame, timeout):
+                return None
+            sequence = int(self._control["published"][0])
+            self._control["claimed"][0] = sequence
+            return sequence
+
+    def _has_unclaimed_frame(self) -> bool:
+        return int(self._control["published"][0]) > int(self._control["claimed"][0])
+
+    def read(self, sequence: int, out: np.ndarray) -> float | None:
+        """Copies the frame with the given sequence number into `out`. Returns its
+        capture timestamp or None if the slot was overwritten in the meantime."""
+
+        # Sequence numbers start at 1, slot of sequence s is (s - 1) % num_slots
+        slot = (sequence - 1) % self.num_slots
+        if int(self._headers["sequence"][slot]) != sequence:
+            return None
+        timestamp = float(self._headers["timestamp"][slot])
+        np.copyto(out, self._frames[slot])
+        # The writer invalidates the header before touching the slot
+        if int(self._headers["sequence"][slot]) != sequence:
+            return None
+        return timestamp
+
+    def wake_all(self) -> None:
+        """Wakes up all readers blocked in `claim`, e.g. to let them shut down."""
+
+        with self._condition:
+            self._condition.notify_all()
+
+    def close(self) -> None:
+        """Releases the views and detaches from the shared memory block. The creating
+        process also frees the block."""
+
+        del self._control, self._headers, self._frames
+        self._shm.close()
+        if os.getpid() == self._owner_pid:
+            self._shm.unlink()
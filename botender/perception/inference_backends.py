@@ -0,0 +1,186 @@
+"""Alternative inference backends for the py-feat face, landmark and emotion models.
+
+py-feat runs its models as eager PyTorch modules. The backends below replace these
+modules inside a loaded `Detector` with drop-in modules that are faster on CPU:
+
+- `torchscript`: TorchScript traces of the models.
+- `quantized`: INT8 dynamic quantization of the linear layers with torch.
+- `onnx`: the models exported to ONNX and run with ONNX Runtime.
+- `onnx-int8`: the ONNX exports with dynamically quantized INT8 weights, which
+  also covers the convolutions.
+
+Exports are stored in the model cache (see `model_cache`). ONNX Runtime is an
+optional dependency: `pip install onnxruntime`.
+"""
+
+import logging
+import time
+from pathlib import Path
+from typing import Literal
+
+import torch
+from feat import Detector  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+InferenceBackend = Literal["pytorch", "torchscript", "quantized", "onnx", "onnx-int8"]
+"""The backend that runs the face, landmark and emotion models."""
+
+EXPORTED_MODELS = {
+    "face": ("face_detector.net", (1, 3, 480, 640)),
+    "landmark": ("landmark_detector", (1, 3, 112, 112)),
+    "emotion": ("emotion_model.model", (1, 3, 224, 224)),
+}
+"""The models that are swapped by the backends: the attribute path in the py-feat
+`Detector` and the input shape to export them with."""
+
+_EXPORT_SUFFIXES = {
+    "torchscript": ".torchscript.pt",
+    "onnx": ".onnx",
+    "onnx-int8": ".int8.onnx",
+}
+
+
+class OnnxModule(torch.nn.Module):
+    """Runs an ONNX Runtime session in place of a PyTorch module. Takes and returns
+    CPU tensors; models with several outputs return a tuple."""
+
+    def __init__(self, path: Path):
+        super().__init__()
+        try:
+            import onnxruntime  # type: ignore
+        except ImportError as error:
+            raise ImportError(
+                "The ONNX backends require onnxruntime: pip install onnxruntime"
+            ) from error
+
+        options = onnxruntime.SessionOptions()
+        # Share the cores like torch does in the worker
+        options.intra_op_num_threads = torch.get_num_threads()
+        self._session = onnxruntime.InferenceSession(
+            str(path), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = [node.name for node in self._session.get_inputs()]
+
+    def forward(self, *inputs: torch.Tensor):
+        feeds = {
+            name: tensor.detach().cpu().float().numpy()
+            for name, tensor in zip(self._input_names, inputs)
+        }
+        outputs = [
+            torch.from_numpy(output) for output in self._session.run(None, feeds)
+        ]
+        return outputs[0] if len(outputs) == 1 else tuple(outputs)
+
+
+def apply_backend(
+    detector: Detector, backend: InferenceBackend, device: str, cache_dir: Path
+) -> dict[str, float]:
+    """Replaces the models of the detector with the given backend. Models that
+    cannot be replaced keep running on PyTorch. Returns the load time of every
+    replaced model."""
+
+    if backend == "pytorch":
+        return {}
+    if backend in ("quantized", "onnx", "onnx-int8") and device != "cpu":
+        logger.warning(f"The {backend} backend runs on CPU only, using PyTorch.")
+        return {}
+
+    load_times = {}
+    for name, (attribute, _) in EXPORTED_MODELS.items():
+        start_time = time.perf_counter()
+        try:
+            model = _load_model(detector, backend, name, device, cache_dir)
+        except (ImportError, FileNotFoundError, RuntimeError, AttributeError) as error:
+            logger.warning(f"Using PyTorch for the {name} model: {error}")
+            continue
+        owner_path, _, model_attribute = attribute.rpartition(".")
+        setattr(_get_attribute(detector, owner_path), model_attribute, model.eval())
+        load_times[name] = time.perf_counter() - start_time
+    return load_times
+
+
+def _load_model(
+    detector: Detector,
+    backend: InferenceBackend,
+    name: str,
+    device: str,
+    cache_dir: Path,
+) -> torch.nn.Module:
+    """Loads the model `name` for the given backend."""
+
+    if backend == "quantized":
+        # Dynamic quantization covers linear layers only, convolutions stay FP32
+        return torch.ao.quantization.quantize_dynamic(
+            _get_attribute(detector, EXPORTED_MODELS[name][0]),
+            {torch.nn.Linear},
+            dtype=torch.qint8,
+        )
+
+    path = export_path(cache_dir, backend, name, device)
+    if not path.exists():
+        raise FileNotFoundError(
+            f"No {backend} export in {cache_dir}, run "
+            f"`python -m botender.perception.model_cache --export {backend}`."
+        )
+    if backend == "torchscript":
+        return torch.jit.load(str(path), map_location=device)
+    return OnnxModule(path)
+
+
+def export_path(
+    cache_dir: Path, backend: InferenceBackend, name: str, device: str
+) -> Path:
+    """Returns the path of the export of a model for the given backend."""
+
+    if backend == "torchscript":
+        return cache_dir / f"{name}-{device}{_EXPORT_SUFFIXES[backend]}"
+    return cache_dir / f"{name}{_EXPORT_SUFFIXES[backend]}"
+
+
+def export_models(
+    detector: Detector, backend: InferenceBackend, device: str, cache_dir: Path
+) -> list[Path]:
+    """Exports the models of an unmodified (PyTorch) detector for the given backend
+    into the cache. Returns the paths of the exports."""
+
+    if backend not in _EXPORT_SUFFIXES:
+        raise ValueError(f"The {backend} backend does not need an export.")
+
+    paths = []
+    for name, (attribute, input_shape) in EXPORTED_MODELS.items():
+        model = _get_attribute(detector, attribute).eval()
+        example = torch.zeros(input_shape, device=device)
+        path = export_path(cache_dir, backend, name, device)
+        with torch.no_grad():
+            if backend == "torchscript":
+                torch.jit.trace(model, example).save(str(path))
+            else:
+                onnx_path = export_path(cache_dir, "onnx", name, device)
+                torch.onnx.export(
+                    model.cpu(),
+                    example.cpu(),
+                    str(onnx_path),
+                    input_names=["input"],
+                    dynamic_axes={"input": {0: "batch", 2: "height", 3: "width"}},
+                    opset_version=17,
+                )
+                if backend == "onnx-int8":
+                    from onnxruntime.quantization import (  # type: ignore
+                        QuantType,
+                        quantize_dynamic,
+                    )
+
+                    quantize_dynamic(
+                        str(onnx_path), str(path), weight_type=QuantType.QUInt8
+                    )
+        paths.append(path)
+    return paths
+
+
+def _get_attribute(obj, path: str):
+    """Resolves a dotted attribute path."""
+
+    for attribute in filter(None, path.split(".")):
+        obj = getattr(obj, attribute)
+    return obj
@@ -0,0 +1,146 @@
+"""Loading and warming up the py-feat models in the detection workers.
+
+py-feat loads its weights from its own package resources. The exports of the
+inference backends (see `inference_backends`) are kept in a local cache directory
+(`BOTENDER_MODEL_CACHE`, by default `~/.cache/botender/models`). Run e.g.
+`python -m botender.perception.model_cache --export onnx` once to create them.
+"""
+
+import argparse
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import get_args
+
+import numpy as np
+from feat import Detector  # type: ignore
+
+from botender.perception.inference_backends import (
+    InferenceBackend,
+    apply_backend,
+    export_models,
+)
+
+logger = logging.getLogger(__name__)
+
+MODEL_CACHE_ENV = "BOTENDER_MODEL_CACHE"
+"""The environment variable that overrides the directory of the exports."""
+DEFAULT_MODEL_CACHE_DIR = Path.home() / ".cache" / "botender" / "models"
+"""The model cache directory used if the environment variable is not set."""
+WARMUP_FRAME_SHAPE = (480, 640, 3)
+"""The default shape of the dummy frame used to warm up the models."""
+
+
+@dataclass
+class ModelTimings:
+    """Load and warmup times of the models of one worker in seconds."""
+
+    load_times: dict[str, float] = field(default_factory=dict)
+    """The time it took to load every model."""
+    warmup_times: dict[str, float] = field(default_factory=dict)
+    """The time of the first (dummy) inference of every model."""
+
+    @property
+    def total(self) -> float:
+        """Returns the total time spent loading and warming up."""
+
+        return sum(self.load_times.values()) + sum(self.warmup_times.values())
+
+    def summary(self) -> str:
+        """Returns the timings as a human readable string."""
+
+        load = ", ".join(f"{name} {t:.2f}s" for name, t in self.load_times.items())
+        warmup = ", ".join(f"{name} {t:.2f}s" for name, t in self.warmup_times.items())
+        return f"load: {load}; warmup: {warmup or 'skipped'}"
+
+
+def get_cache_dir() -> Path:
+    """Returns the model cache directory and creates it if necessary."""
+
+    cache_dir = Path(os.environ.get(MODEL_CACHE_ENV, DEFAULT_MODEL_CACHE_DIR))
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
+def load_detector(
+    device: str,
+    warmup_frame_shape: tuple[int, ...] | None = WARMUP_FRAME_SHAPE,
+    backend: InferenceBackend = "pytorch",
+    warmup_action_units: bool = False,
+) -> tuple[Detector, ModelTimings]:
+    """Loads the py-feat detector, swaps in the models of the inference backend
+    and runs a dummy inference on a frame of `warmup_frame_shape` unless it is
+    None, so that the first real frame is not delayed. The action unit model is
+    only warmed up if `warmup_action_units` is set."""
+
+    timings = ModelTimings()
+    start_time = time.perf_counter()
+    detector = Detector(device=device)
+    timings.load_times["detector"] = time.perf_counter() - start_time
+
+    timings.load_times.update(apply_backend(detector, backend, device, get_cache_dir()))
+    if warmup_frame_shape is not None:
+        warm_up(detector, warmup_frame_shape, timings, warmup_action_units)
+    return detector, timings
+
+
+def warm_up(
+    detector: Detector,
+    frame_shape: tuple[int, ...],
+    timings: ModelTimings,
+    action_units: bool = False,
+) -> None:
+    """Runs every model once on a dummy frame so that lazy initialization and
+    kernel selection do not delay the first real frame."""
+
+    frame = np.full(frame_shape, 127, dtype=np.uint8)
+    height, width = frame_shape[:2]
+    # A made up face in the center; landmarks and emotions run on any box
+    face = (width * 0.3, height * 0.2, width * 0.7, height * 0.8, 1.0)
+
+    start_time = time.perf_counter()
+    detector.detect_faces(frame)
+    timings.warmup_times["face"] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    landmarks = detector.detect_landmarks(frame, [[face]])
+    timings.warmup_times["landmark"] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    detector.detect_emotions(frame, [[face]], landmarks)
+    timings.warmup_times["emotion"] = time.perf_counter() - start_time
+
+    if action_units:
+        start_time = time.perf_counter()
+        detector.detect_aus(frame, landmarks)
+        timings.warmup_times["action units"] = time.perf_counter() - start_time
+
+
+if __name__ == "__main__":
+    from botender.perception.detection_worker import get_device
+
+    parser = argparse.ArgumentParser(description="Botender model cache")
+    parser.add_argument(
+        "--export",
+        choices=["torchscript", "onnx", "onnx-int8"],
+        help="Export the face, landmark and emotion models for a backend",
+    )
+    parser.add_argument(
+        "--backend",
+        default="pytorch",
+        choices=get_args(InferenceBackend),
+        help="The backend to measure the load and warmup times of",
+    )
+    args = parser.parse_args()
+
+    device = get_device()
+    print(f"Cache directory: {get_cache_dir()}")
+    if args.export:
+        detector, _ = load_detector(device, warmup_frame_shape=None)
+        for path in export_models(detector, args.export, device, get_cache_dir()):
+            print(f"Exported {path}")
+    else:
+        detector, timings = load_detector(device, backend=args.backend)
+        print(f"Timings ({args.backend} on {device}): {timings.summary()}")
@@ -0,0 +1,54 @@
+"""Cheap frame differencing to skip face detection on an unchanged scene."""
+
+import cv2  # type: ignore
+import numpy as np
+
+_THUMBNAIL_SCALE = 0.125
+"""Scale of the thumbnail the frames are compared on."""
+
+
+class MotionGate:
+    """Compares frames with the frame the detector last ran on. Frames whose mean
+    absolute difference on a downscaled grayscale thumbnail stays below `threshold`
+    are considered unchanged; at least every `max_skipped` frames the detector runs
+    anyway."""
+
+    threshold: float
+    max_skipped: int
+    skipped_frames: int = 0
+    """The number of frames inference was skipped on."""
+
+    _reference: np.ndarray | None = None
+    _skipped_in_row: int = 0
+
+    def __init__(self, threshold: float = 3.0, max_skipped: int = 10):
+        self.threshold = threshold
+        self.max_skipped = max_skipped
+
+    def should_detect(self, frame: np.ndarray) -> bool:
+        """Returns True if the frame changed enough to run the detector on it. The
+        frame then becomes the new reference."""
+
+        thumbnail = cv2.resize(
+            cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY),
+            None,
+            fx=_THUMBNAIL_SCALE,
+            fy=_THUMBNAIL_SCALE,
+            interpolation=cv2.INTER_AREA,
+        )
+        if (
+            self._reference is None
+            or self._skipped_in_row >= self.max_skipped
+            or float(np.mean(cv2.absdiff(thumbnail, self._reference))) > self.threshold
+        ):
+            self._reference = thumbnail
+            self._skipped_in_row = 0
+            return True
+        self._skipped_in_row += 1
+        self.skipped_frames += 1
+        return False
+
+    def reset(self) -> None:
+        """Forces detection on the next frame."""
+
+        self._reference = None
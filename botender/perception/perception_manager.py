@@ -1,73 +1,251 @@
 import logging
 import multiprocessing as mp
+import os
+import threading
+import time
+from dataclasses import dataclass, field, replace
 from multiprocessing import Pipe, Queue
 from multiprocessing.connection import Connection
 
-import numpy as np
-
+from botender import STARTUP_TIME
+from botender.metrics import LatencyTracker
 from botender.perception.detection_worker import DetectionResult, DetectionWorker
+from botender.perception.detectors.emotion_detector import (
+    EMOTIONS,
+    EmotionModel,
+    VotingMethod,
+)
+from botender.perception.emotion_worker import EmotionWorker
+from botender.perception.face_tracker import FaceIdAssigner
+from botender.perception.frame_buffer import SharedFrameBuffer
+from botender.perception.inference_backends import InferenceBackend
+from botender.perception.model_cache import ModelTimings
+from botender.perception.rate_controller import AdaptiveRateController
+from botender.perception.result_buffer import SharedResultBuffer, faces_from_record
 from botender.webcam_processor import WebcamProcessor
 
 logger = logging.getLogger(__name__)
 
+EMOTION_QUEUE_SIZE = 4
+"""The maximum number of frames waiting for the emotion stage."""
+WORKER_STATS_LOG_INTERVAL = 10.0
+"""Seconds between two log messages with the worker statistics."""
+STALE_AFTER_MS: float | None = None
+"""Default age of a result in milliseconds after which its faces are dropped.
+Off by default, as inference on a CPU can take longer than any fixed limit."""
+TARGET_LATENCY_MS = 250.0
+"""Default capture to result latency the frame submission rate is adapted to."""
+
+
+@dataclass
+class WorkerStats:
+    """Latency and utilisation statistics of a single detection worker."""
+
+    ready_time: float = field(default_factory=time.monotonic)
+    """The time the worker signalled that it is ready."""
+    results: int = 0
+    """The number of results received from the worker."""
+    busy_time: float = 0.0
+    """The total time the worker spent computing results."""
+    latency: float = 0.0
+    """Exponential moving average of the service time per frame in seconds."""
+    model_timings: ModelTimings = field(default_factory=ModelTimings)
+    """The load and warmup times of the models of the worker."""
+
+    def record(self, service_time: float) -> None:
+        """Records the service time of a result."""
+
+        self.results += 1
+        self.busy_time += service_time
+        if self.results == 1:
+            self.latency = service_time
+        else:
+            self.latency = 0.9 * self.latency + 0.1 * service_time
+
+    @property
+    def utilisation(self) -> float:
+        """Returns the fraction of time the worker was busy since it got ready."""
+
+        elapsed = time.monotonic() - self.ready_time
+        return self.busy_time / elapsed if elapsed > 0 else 0.0
+
 
 class PerceptionManager:
     """The PerceptionManager class is responsible for spawning and managing the
-    detection worker process and communicating results."""
+    detection pipeline and communicating results. The pipeline consists of a pool of
+    face detection workers and a single emotion worker. They publish their results
+    in a shared result buffer, one slot each, which is merged into one
+    `DetectionResult`."""
 
     _stopped: bool = False
     _current_result: DetectionResult | None = None
-    _child_process: DetectionWorker
+    _emotion: str = "neutral"
+    _emotion_timestamp: float = 0.0
+    _emotion_probabilities: dict[str, float]
+    _child_processes: list[DetectionWorker]
+    _emotion_process: EmotionWorker
+    _emotion_pipe: tuple[Connection, Connection]
     _child_process_working: bool = False
     _webcam_processor: WebcamProcessor
-    _result_pipe: tuple[Connection, Connection]
+    _frame_buffer: SharedFrameBuffer
+    _result_buffer: SharedResultBuffer
+    _control_pipes: list[tuple[Connection, Connection]]
+    _last_frame_sequences: list[int]
+    _worker_stats: dict[int, WorkerStats]
+    _face_id_assigner: FaceIdAssigner
+    _last_stats_log: float = 0.0
     _drop_counter: int = 0
+    _out_of_order_counter: int = 0
     _face_presence_counter: int = 0
-
-    def __init__(self, logging_queue: Queue, webcam_processor: WebcamProcessor):
+    _startup_time: float
+    _time_to_first_face_box: float | None = None
+    _stale_after: float | None
+    _result_latency: LatencyTracker
+    _rate_controller: AdaptiveRateController | None
+    _result_listeners: list[threading.Event]
+
+    def __init__(
+        self,
+        logging_queue: Queue,
+        webcam_processor: WebcamProcessor,
+        frame_buffer_slots: int = 4,
+        zero_copy_capture: bool = True,
+        num_workers: int = 1,
+        redetect_interval: int = 5,
+        detection_scale: float = 1.0,
+        emotion_roi_padding: float | None = 0.25,
+        emotion_voting: VotingMethod = "majority",
+        emotion_model: EmotionModel = "pyfeat",
+        backend: InferenceBackend = "pytorch",
+        startup_time: float = STARTUP_TIME,
+        stale_after_ms: float | None = STALE_AFTER_MS,
+        target_latency_ms: float | None = TARGET_LATENCY_MS,
+        idle_rate: float = 2.0,
+        motion_threshold: float | None = 3.0,
+    ):
+        """`backend` selects how the workers run the face, landmark and emotion
+        models (see `inference_backends`), `emotion_model` the emotion classifier.
+        The time to first face box is measured from `startup_time`. The faces of
+        results whose frame was captured more than `stale_after_ms` ago are
+        dropped; None keeps them forever.
+
+        Frames are submitted at a rate that holds `target_latency_ms` and drops to
+        `idle_rate` frames per second while nobody is around. With a target of None
+        every frame is submitted. While no face is visible, the workers skip frames
+        that differ by less than `motion_threshold` gray values on average from the
+        last frame they ran the detector on."""
         logger.debug("Initializing PerceptionManager...")
         self._webcam_processor = webcam_processor
+        self._startup_time = startup_time
+        self._stale_after = None if stale_after_ms is None else stale_after_ms / 1000
+        self._result_latency = LatencyTracker()
+        self._result_listeners = []
+        self._rate_controller = None
+        if target_latency_ms is not None:
+            self._rate_controller = AdaptiveRateController(
+                target_latency=target_latency_ms / 1000, idle_rate=idle_rate
+            )
 
         # Initializing child workers
-        # Queue cannot fill up; Pipe buffer fills up and becomes blocking
         self.frame_shape = webcam_processor.current_frame.shape
-        c_type = np.ctypeslib.as_ctypes_type(self._webcam_processor.current_frame.dtype)
-        self._shared_array = mp.Array(c_type, int(np.prod(self.frame_shape)))
+        self._frame_buffer = SharedFrameBuffer(
+            self.frame_shape,
+            dtype=webcam_processor.current_frame.dtype,
+            num_slots=max(frame_buffer_slots, num_workers + 2),
+        )
+        if zero_copy_capture:
+            # The webcam decodes straight into the slots the workers read from
+            self._webcam_processor.attach_frame_buffer(self._frame_buffer)
         self._stop_event = mp.Event()
         self._detect_emotion_event = mp.Event()
-        self._result_pipe = Pipe(duplex=False)
-        self._child_process = DetectionWorker(
+        self._emotion_queue: Queue = mp.Queue(maxsize=EMOTION_QUEUE_SIZE)
+        self._next_emotion_sequence = mp.Value("Q", 0)
+        self._worker_stats = {}
+        self._face_id_assigner = FaceIdAssigner()
+        self._emotion_probabilities = {}
+        # One result slot per face worker plus one for the emotion worker. The
+        # pipes only carry the ready signals, so workers never block on them.
+        self._result_buffer = SharedResultBuffer(num_workers + 1)
+        self._last_frame_sequences = [0] * num_workers
+        self._control_pipes = []
+        self._child_processes = []
+        # Avoid oversubscribing the cores as all stages run in parallel
+        torch_threads = max(1, (os.cpu_count() or 1) // (num_workers + 1))
+        for worker_id in range(num_workers):
+            control_pipe = Pipe(duplex=False)
+            self._control_pipes.append(control_pipe)
+            self._child_processes.append(
+                DetectionWorker(
+                    logging_queue,
+                    self._frame_buffer,
+                    self._result_buffer,
+                    control_pipe[1],  # conn2 can only send
+                    self._stop_event,
+                    self._detect_emotion_event,
+                    self._emotion_queue,
+                    self._next_emotion_sequence,
+                    worker_id=worker_id,
+                    torch_threads=torch_threads,
+                    redetect_interval=redetect_interval,
+                    detection_scale=detection_scale,
+                    emotion_roi_padding=emotion_roi_padding,
+                    backend=backend,
+                    motion_threshold=motion_threshold,
+                )
+            )
+        self._emotion_pipe = Pipe(duplex=False)
+        self._emotion_process = EmotionWorker(
             logging_queue,
-            self.frame_shape,
-            self._shared_array,
-            self._result_pipe[1],  # conn2 can only send
+            self._emotion_queue,
+            self._result_buffer,
+            num_workers,
+            self._emotion_pipe[1],
+            self._next_emotion_sequence,
             self._stop_event,
             self._detect_emotion_event,
+            torch_threads=torch_threads,
+            voting=emotion_voting,
+            backend=backend,
+            emotion_model=emotion_model,
         )
-        logger.debug("Spawning child worker...")
-        self._child_process.start()
+        logger.debug(f"Spawning {num_workers} child worker(s) and emotion worker...")
+        for child_process in self._child_processes:
+            child_process.start()
+        self._emotion_process.start()
+        self._webcam_processor.update_debug_info("Workers", "loading models...")
 
     def shutdown(self):
-        """Shutdowns the PerceptionManager and terminate its child worker."""
+        """Shutdowns the PerceptionManager and terminate its child workers."""
 
         logger.debug("Received stop signal. Stopping PerceptionManager...")
 
-        logger.debug("Sending stop signal to detection worker...")
+        logger.debug("Sending stop signal to detection workers...")
         self._stop_event.set()
-        self._child_process.join(5)
-        if self._child_process.is_alive():
-            logger.warning(
-                "Detection worker could not be terminated gracefully. Killing..."
-            )
-            self._child_process.terminate()
-        else:  # Child process terminated gracefully
-            logger.debug("Detection worker stopped.")
+        self._frame_buffer.wake_all()
+        for child_process in [*self._child_processes, self._emotion_process]:
+            child_process.join(5)
+            if child_process.is_alive():
+                logger.warning(
+                    f"{child_process.name} could not be terminated gracefully. "
+                    "Killing..."
+                )
+                child_process.terminate()
+            else:  # Child process terminated gracefully
+                logger.debug(f"{child_process.name} stopped.")
+        if self._webcam_processor.frame_buffer is self._frame_buffer:
+            self._webcam_processor.detach_frame_buffer()
+        self._frame_buffer.close()
+        self._result_buffer.close()
 
     @property
     def current_result(self) -> DetectionResult | None:
-        """Returns the current detection result."""
+        """Returns the current detection result, or None if there is none. The
+        faces of a stale result are dropped."""
 
-        return self._current_result
+        result = self._current_result
+        if result is not None and self.result_stale:
+            return replace(result, faces=[], face_ids=[])
+        return result
 
     @current_result.setter
     def current_result(self, value: DetectionResult | None) -> None:
@@ -78,7 +256,8 @@ class PerceptionManager:
     def face_present(self) -> bool:
         """Returns True if a face is present in the current frame."""
 
-        return self._current_result is not None and len(self._current_result.faces) > 0
+        result = self.current_result
+        return result is not None and len(result.faces) > 0
 
     @property
     def face_presence_counter(self) -> int:
@@ -86,6 +265,33 @@ class PerceptionManager:
 
         return self._face_presence_counter
 
+    @property
+    def result_age(self) -> float | None:
+        """Returns the seconds since the frame of the current result was captured,
+        or None if there is no result yet."""
+
+        if self._current_result is None:
+            return None
+        return time.monotonic() - self._current_result.frame_timestamp
+
+    @property
+    def result_stale(self) -> bool:
+        """Returns True if the current result is older than the stale threshold."""
+
+        age = self.result_age
+        return (
+            self._stale_after is not None
+            and age is not None
+            and (age > self._stale_after)
+        )
+
+    @property
+    def latency_percentiles(self) -> dict[int, float]:
+        """Returns the 50th, 90th and 99th percentile of the latency from frame
+        capture until the result reaches the main loop, in seconds."""
+
+        return self._result_latency.percentiles()
+
     def detect_emotion(self) -> None:
         """Tells the PerceptionManager to detect emotions."""
         self._detect_emotion_event.set()
@@ -94,48 +300,197 @@ class PerceptionManager:
         """Returns True if the PerceptionManager is currently detecting emotions."""
         return self._detect_emotion_event.is_set()
 
+    @property
+    def worker_stats(self) -> dict[int, WorkerStats]:
+        """Returns the statistics of all workers that signalled readiness."""
+
+        return self._worker_stats
+
+    @property
+    def time_to_first_face_box(self) -> float | None:
+        """Returns the seconds from startup until the first face was detected, or
+        None if no face was detected yet."""
+
+        return self._time_to_first_face_box
+
     def run(self) -> None:
-        """Runs the PerceptionManager. Adds new work to the child worker and
+        """Runs the PerceptionManager. Adds new work to the child workers and
         retrieves results."""
 
-        result_connection = self._result_pipe[0]
+        results = self._receive_results()
 
-        # Check if child process is ready to go
+        # Check if at least one child process is ready to go
         if not self._child_process_working:
-            if result_connection.poll():
-                _ = result_connection.recv()
-                logger.debug("Child process working. Received first result.")
-                self._child_process_working = True
-            else:
+            if len(self._worker_stats) == 0:
                 return
-
-        # Add new work
-        current_frame = self._webcam_processor.current_frame
-        with self._shared_array.get_lock():
-            array = _to_numpy_array(self._shared_array, self.frame_shape)
-            if not np.array_equal(array, np.zeros(self.frame_shape, dtype=np.uint8)):
-                self._drop_counter += 1
-            else:
-                self._drop_counter = 0
-            if self._drop_counter > 10:
-                logger.debug(
-                    f"Detection worker can't keep up! Dropped {self._drop_counter} frames."
-                )
-
-            array[:] = current_frame.copy()
-
-        # Retrieve results
-        if result_connection.poll():
-            self._current_result = result_connection.recv()
-            if self.face_present:
+            logger.debug("Child process working. Received first result.")
+            self._child_process_working = True
+
+        if self._rate_controller is None or self._rate_controller.should_submit():
+            self._submit_frame()
+
+        # Apply results in frame order so that the current result never goes
+        # backwards in time
+        updated = False
+        for result in sorted(results, key=lambda result: result.frame_sequence):
+            if (
+                self._current_result is not None
+                and result.frame_sequence <= self._current_result.frame_sequence
+            ):
+                self._out_of_order_counter += 1
+                continue
+            result.face_ids = self._face_id_assigner.assign(result.faces)
+            self._current_result = result
+            updated = True
+            if len(result.faces) > 0:
                 self._face_presence_counter += 1
+                if self._time_to_first_face_box is None:
+                    self._record_first_face_box(result)
             else:
                 self._face_presence_counter = 0
+        if self._rate_controller is not None:
+            self._rate_controller.update_presence(self.face_present)
+
+        # Merge the emotion stream into the current result
+        if self._current_result is not None:
+            self._current_result.emotion = self._emotion
+            self._current_result.emotion_timestamp = self._emotion_timestamp
+            self._current_result.emotion_probabilities = self._emotion_probabilities
+
+        # Wake up the threads waiting for new results
+        if updated:
+            for listener in self._result_listeners:
+                listener.set()
+
+        self._log_worker_stats()
 
         # Render results
         self._render_face_rectangles()
         self._render_emotion()
 
+    def add_result_listener(self, listener: threading.Event) -> None:
+        """Registers an event that is set whenever a new result was applied. Threads
+        wait on it instead of polling `current_result`."""
+
+        self._result_listeners.append(listener)
+
+    def _submit_frame(self) -> None:
+        """Offers the current frame to the workers. The previous frame was dropped
+        if no worker claimed it."""
+
+        if self._frame_buffer.pending:
+            self._drop_counter += 1
+            if self._rate_controller is not None:
+                self._rate_controller.record_drop()
+        else:
+            self._drop_counter = 0
+        if self._drop_counter > 10:
+            logger.debug(
+                f"Detection workers can't keep up! Dropped {self._drop_counter} frames."
+            )
+        if self._webcam_processor.frame_buffer is self._frame_buffer:
+            # Zero-copy capture already committed the frame to the buffer
+            self._frame_buffer.publish(self._webcam_processor.current_sequence)
+        else:
+            self._frame_buffer.write(
+                self._webcam_processor.current_frame,
+                self._webcam_processor.current_timestamp,
+            )
+
+    def _receive_results(self) -> list[DetectionResult]:
+        """Reads the newest result of every worker from the result buffer and
+        updates the worker statistics."""
+
+        for worker_id, (control_connection, _) in enumerate(self._control_pipes):
+            while control_connection.poll():
+                timings = control_connection.recv()  # Worker is ready
+                logger.info(
+                    f"Detection worker {worker_id} is ready after "
+                    f"{time.monotonic() - self._startup_time:.1f}s "
+                    f"({timings.summary()})."
+                )
+                self._worker_stats[worker_id] = WorkerStats(model_timings=timings)
+        while self._emotion_pipe[0].poll():
+            timings = self._emotion_pipe[0].recv()  # Emotion worker is ready
+            logger.info(f"Emotion worker is ready ({timings.summary()}).")
+
+        results = []
+        for worker_id in self._worker_stats:
+            record = self._result_buffer.read(worker_id)
+            if record is None:
+                continue
+            frame_sequence = int(record["frame_sequence"])
+            if frame_sequence <= self._last_frame_sequences[worker_id]:
+                continue  # No new result
+            self._last_frame_sequences[worker_id] = frame_sequence
+            self._worker_stats[worker_id].record(float(record["service_time"]))
+            frame_timestamp = float(record["frame_timestamp"])
+            latency = time.monotonic() - frame_timestamp
+            self._result_latency.record(latency)
+            if self._rate_controller is not None:
+                self._rate_controller.record_result(latency)
+            results.append(
+                DetectionResult(
+                    faces=faces_from_record(record),
+                    emotion=self._emotion,
+                    frame_sequence=frame_sequence,
+                    frame_timestamp=frame_timestamp,
+                    faces_timestamp=float(record["faces_timestamp"]),
+                )
+            )
+
+        record = self._result_buffer.read(len(self._control_pipes))
+        if record is not None and record["emotion_timestamp"] > self._emotion_timestamp:
+            self._emotion = EMOTIONS[int(record["emotion"])]
+            self._emotion_timestamp = float(record["emotion_timestamp"])
+            self._emotion_probabilities = dict(
+                zip(EMOTIONS, record["emotion_probabilities"].tolist())
+            )
+        return results
+
+    def _record_first_face_box(self, result: DetectionResult) -> None:
+        """Records the time from startup until the first face was detected."""
+
+        self._time_to_first_face_box = result.faces_timestamp - self._startup_time
+        logger.info(
+            f"Time to first face box: {self._time_to_first_face_box:.2f}s after "
+            "startup."
+        )
+        self._webcam_processor.update_debug_info(
+            "First face", f"{self._time_to_first_face_box:.2f}s"
+        )
+
+    def _log_worker_stats(self) -> None:
+        """Periodically logs the latency and utilisation of every worker and the
+        capture to result latency."""
+
+        now = time.monotonic()
+        if now - self._last_stats_log < WORKER_STATS_LOG_INTERVAL:
+            return
+        self._last_stats_log = now
+
+        summary = ", ".join(
+            f"#{worker_id}: {stats.latency * 1000:.0f} ms "
+            f"{stats.utilisation * 100:.0f}%"
+            for worker_id, stats in sorted(self._worker_stats.items())
+        )
+        latency = ", ".join(
+            f"p{percentile} {value * 1000:.0f} ms"
+            for percentile, value in self.latency_percentiles.items()
+        )
+        logger.debug(
+            f"Detection workers {summary}; {self._out_of_order_counter} "
+            f"out-of-order results discarded; capture to result latency {latency}."
+        )
+        self._webcam_processor.update_debug_info("Workers", summary)
+        self._webcam_processor.update_debug_info("Latency", latency)
+        if self._rate_controller is not None:
+            rate = f"{self._rate_controller.rate:.1f} fps"
+            if self._rate_controller.idle:
+                rate += " (idle)"
+            logger.debug(f"Submitting frames at {rate}.")
+            self._webcam_processor.update_debug_info("Rate", rate)
+
     def _render_face_rectangles(self) -> None:
         """Renders face rectangles to the current frame."""
 
@@ -151,25 +506,14 @@ class PerceptionManager:
         if self._current_result is None:
             return
 
-        try:
-            # pt1 = (x coord of bottom right corner, y coord of top left corner)
-            # this is because the image is mirrored
-            pt1 = (
-                self._current_result.faces[0][1][0],
-                self._current_result.faces[0][0][1],
-            )
-        except IndexError:
+        face = self._current_result.primary_face
+        if face is None:
             return
+        # pt1 = (x coord of bottom right corner, y coord of top left corner)
+        # this is because the image is mirrored
+        pt1 = (face[1][0], face[0][1])
 
         origin = (int(pt1[0]), int(pt1[1] - 10))
         self._webcam_processor.add_text_to_current_frame(
             self._current_result.emotion, origin=origin, modifier_key="emotion"
         )
-
-
-def _to_numpy_array(shared_array, shape: tuple[int, ...] | None = None):
-    """Converts a shared array to a numpy array."""
-    if shape is None:
-        return np.frombuffer(shared_array.get_obj(), dtype=np.uint8)
-    else:
-        return np.frombuffer(shared_array.get_obj(), dtype=np.uint8).reshape(shape)
@@ -0,0 +1,110 @@
+"""Adapts the rate at which frames are submitted to the detection workers."""
+
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+RATE_INCREASE = 1.0
+"""Frames per second added after every result that met the latency target."""
+RATE_DECREASE = 0.8
+"""Factor the rate is multiplied with when the latency target is missed."""
+DECREASE_COOLDOWN = 0.5
+"""Seconds to wait after a decrease before decreasing again, so that results of
+frames submitted at the old rate do not cut the rate several times."""
+
+
+class AdaptiveRateController:
+    """Holds a target capture to result latency by adapting the submission rate
+    additively up and multiplicatively down (AIMD). Missing the latency target or
+    a frame that no worker claimed decreases the rate.
+
+    When no face was present for `idle_after` seconds the controller falls back to
+    the low-power `idle_rate` and returns to the active rate as soon as a face is
+    detected."""
+
+    target_latency: float
+    min_rate: float
+    max_rate: float
+    idle_rate: float
+    idle_after: float
+
+    _rate: float
+    _last_submission: float = 0.0
+    _last_decrease: float = 0.0
+    _last_face_time: float
+    _idle: bool = False
+
+    def __init__(
+        self,
+        target_latency: float = 0.25,
+        min_rate: float = 5.0,
+        max_rate: float = 30.0,
+        idle_rate: float = 2.0,
+        idle_after: float = 30.0,
+    ):
+        self.target_latency = target_latency
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.idle_rate = idle_rate
+        self.idle_after = idle_after
+        self._rate = max_rate
+        self._last_face_time = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        """Returns the current submission rate in frames per second."""
+
+        return self.idle_rate if self._idle else self._rate
+
+    @property
+    def idle(self) -> bool:
+        """Returns True if the controller runs at the idle rate."""
+
+        return self._idle
+
+    def should_submit(self) -> bool:
+        """Returns True if the next frame should be submitted. Records the
+        submission if so."""
+
+        now = time.monotonic()
+        if now - self._last_submission < 1 / self.rate:
+            return False
+        self._last_submission = now
+        return True
+
+    def record_result(self, latency: float) -> None:
+        """Adapts the rate to the capture to result latency of a new result."""
+
+        if latency > self.target_latency:
+            self._decrease()
+        else:
+            self._rate = min(self.max_rate, self._rate + RATE_INCREASE)
+
+    def record_drop(self) -> None:
+        """Decreases the rate because a submitted frame was not claimed in time."""
+
+        self._decrease()
+
+    def update_presence(self, face_present: bool) -> None:
+        """Switches between the idle and the active rate."""
+
+        now = time.monotonic()
+        if face_present:
+            self._last_face_time = now
+            if self._idle:
+                logger.debug("Face detected, leaving idle rate.")
+                self._idle = False
+        elif not self._idle and now - self._last_face_time > self.idle_after:
+            logger.debug(
+                f"No face for {self.idle_after:.0f}s, "
+                f"idling at {self.idle_rate:.1f} fps."
+            )
+            self._idle = True
+
+    def _decrease(self) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < DECREASE_COOLDOWN:
+            return
+        self._last_decrease = now
+        self._rate = max(self.min_rate, self._rate * RATE_DECREASE)
@@ -0,0 +1,159 @@
+"""Fixed-layout shared-memory block the detection workers publish their results in."""
+
+import logging
+import os
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from botender.perception.detectors.emotion_detector import EMOTIONS
+from botender.webcam_processor import Rectangle
+
+logger = logging.getLogger(__name__)
+
+MAX_FACES = 8
+"""The maximum number of faces per result. Further faces are dropped."""
+RESULT_DTYPE = np.dtype(
+    [
+        ("version", np.uint64),
+        ("frame_sequence", np.uint64),
+        ("frame_timestamp", np.float64),
+        ("faces_timestamp", np.float64),
+        ("service_time", np.float64),
+        ("emotion_timestamp", np.float64),
+        ("face_count", np.uint32),
+        ("emotion", np.uint32),
+        ("faces", np.float32, (MAX_FACES, 5)),
+        ("emotion_probabilities", np.float32, (len(EMOTIONS),)),
+    ]
+)
+"""Layout of a result slot. `version` is the seqlock counter, which is odd while
+the slot is written. Faces are stored as (x1, y1, x2, y2, score) rows, the emotion
+as index into `EMOTIONS`."""
+READ_RETRIES = 100
+"""How often a reader retries a slot that is being written before giving up."""
+
+
+class SharedResultBuffer:
+    """One result slot per producer in shared memory, protected by a seqlock.
+
+    Every slot has a single writer that never blocks: it makes the version odd,
+    writes its fields and makes the version even again. Readers copy the slot and
+    retry if the version was odd or changed in the meantime, so they never see a
+    torn result and nothing has to be pickled."""
+
+    num_slots: int
+
+    _shm: SharedMemory
+    _owner_pid: int
+    _slots: np.ndarray
+
+    def __init__(self, num_slots: int):
+        self.num_slots = num_slots
+        self._owner_pid = os.getpid()
+        self._shm = SharedMemory(create=True, size=RESULT_DTYPE.itemsize * num_slots)
+        self._attach()
+        self._slots[:] = np.zeros(1, dtype=RESULT_DTYPE)
+        logger.debug(
+            f"Allocated result buffer {self._shm.name} with {num_slots} slots "
+            f"({self._shm.size} bytes)."
+        )
+
+    def __getstate__(self) -> dict:
+        """Only pickle what is needed to re-attach to the shared memory block."""
+
+        return {
+            "num_slots": self.num_slots,
+            "shm_name": self._shm.name,
+            "owner_pid": self._owner_pid,
+        }
+
+    def __setstate__(self, state: dict) -> None:
+        self.num_slots = state["num_slots"]
+        self._owner_pid = state["owner_pid"]
+        self._shm = SharedMemory(name=state["shm_name"])
+        self._attach()
+
+    def _attach(self) -> None:
+        """Creates the numpy view onto the shared memory block."""
+
+        self._slots = np.ndarray(
+            (self.num_slots,), dtype=RESULT_DTYPE, buffer=self._shm.buf
+        )
+
+    def write_faces(
+        self,
+        slot: int,
+        frame_sequence: int,
+        frame_timestamp: float,
+        faces: list[tuple[float, float, float, float, float]],
+        faces_timestamp: float,
+        service_time: float,
+    ) -> None:
+        """Publishes the raw faces detected in a frame."""
+
+        count = min(len(faces), MAX_FACES)
+        self._begin_write(slot)
+        record = self._slots[slot]
+        record["frame_sequence"] = frame_sequence
+        record["frame_timestamp"] = frame_timestamp
+        record["faces_timestamp"] = faces_timestamp
+        record["service_time"] = service_time
+        record["face_count"] = count
+        if count > 0:
+            record["faces"][:count] = faces[:count]
+        self._end_write(slot)
+
+    def write_emotion(
+        self,
+        slot: int,
+        emotion: str,
+        probabilities: np.ndarray,
+        emotion_timestamp: float,
+    ) -> None:
+        """Publishes an emotion and its probabilities (in the order of `EMOTIONS`)."""
+
+        self._begin_write(slot)
+        record = self._slots[slot]
+        record["emotion"] = EMOTIONS.index(emotion)
+        record["emotion_probabilities"] = probabilities
+        record["emotion_timestamp"] = emotion_timestamp
+        self._end_write(slot)
+
+    def _begin_write(self, slot: int) -> None:
+        self._slots["version"][slot] += 1
+
+    def _end_write(self, slot: int) -> None:
+        self._slots["version"][slot] += 1
+
+    def read(self, slot: int) -> np.void | None:
+        """Returns a consistent copy of a slot, or None if it was written to during
+        all retries."""
+
+        versions = self._slots["version"]
+        for _ in range(READ_RETRIES):
+            version = int(versions[slot])
+            if version % 2 == 1:
+                continue
+            record = self._slots[slot].copy()
+            if int(versions[slot]) == version:
+                return record
+        return None
+
+    def close(self) -> None:
+        """Releases the view and detaches from the shared memory block. The creating
+        process also frees the block."""
+
+        del self._slots
+        self._shm.close()
+        if os.getpid() == self._owner_pid:
+            self._shm.unlink()
+
+
+def faces_from_record(record: np.void) -> list[Rectangle]:
+    """Converts the faces of a result record into rectangles."""
+
+    return [
+        ((float(x1), float(y1)), (float(x2), float(y2)))
+        for x1, y1, x2, y2, _ in record["faces"][: int(record["face_count"])]
+    ]
@@ -2,12 +2,16 @@
 
 import logging
 import threading
+import time
 from functools import partial
 from typing import Callable
 
 import cv2  # type: ignore
 import numpy as np
 
+from botender.metrics import RateMeter
+from botender.perception.frame_buffer import SharedFrameBuffer
+
 logger = logging.getLogger(__name__)
 
 ModifierKeyType = int | str
@@ -23,7 +27,29 @@ class WebcamProcessor:
     """Class for capturing the webcam footage and rendering information to the screen."""
 
     _current_frame: np.ndarray
+    _current_sequence: int = 0
+    _current_timestamp: float = 0.0
+    _render_frame: np.ndarray
+    _frame_buffer: SharedFrameBuffer | None = None
+    _warned_about_reallocation: bool = False
     _camera: cv2.VideoCapture
+
+    # Threaded capture: the capture thread fills the back frame and swaps it with the
+    # latest frame, `capture` then swaps the latest frame with the current frame.
+    _threaded_capture: bool
+    _capture_thread: threading.Thread | None = None
+    _capture_stop_event: threading.Event
+    _frame_lock: threading.Lock
+    _back_frame: np.ndarray
+    _latest_frame: np.ndarray
+    _latest_sequence: int = 0
+    _latest_timestamp: float = 0.0
+    _latest_is_fresh: bool = False
+    _frame_counter: int = 0
+    _dropped_grabs: int = 0
+    _capture_meter: RateMeter
+    _render_meter: RateMeter
+
     _window_name: str
     _modifier_lock: threading.Lock
     _modifier_dict: dict[ModifierKeyType, FrameModifier]
@@ -42,8 +68,10 @@ class WebcamProcessor:
         window_name: str = "Botender",
         frame_width: int = 640,
         frame_height: int = 480,
+        threaded_capture: bool = False,
     ):
-        """Initialize the ImageProcessor class."""
+        """Initialize the ImageProcessor class. With `threaded_capture` a background
+        thread grabs frames continuously and `capture` only picks up the newest one."""
 
         self._FRAME_WIDTH = frame_width
         self._FRAME_HEIGHT = frame_height
@@ -56,6 +84,13 @@ class WebcamProcessor:
         self._current_frame = np.zeros(
             (self._FRAME_HEIGHT, self._FRAME_WIDTH, 3), np.uint8
         )
+        self._render_frame = np.empty_like(self._current_frame)
+        self._back_frame = np.zeros_like(self._current_frame)
+        self._latest_frame = np.zeros_like(self._current_frame)
+
+        # initialize the metrics
+        self._capture_meter = RateMeter()
+        self._render_meter = RateMeter()
 
         # initialize the modifier lock
         self._modifier_lock = threading.Lock()
@@ -68,28 +103,167 @@ class WebcamProcessor:
         cv2.namedWindow(self._window_name, cv2.WINDOW_NORMAL)
         cv2.resizeWindow(self._window_name, self._FRAME_WIDTH, self._FRAME_HEIGHT)
 
+        # initialize the capture thread
+        self._frame_lock = threading.Lock()
+        self._capture_stop_event = threading.Event()
+        self._threaded_capture = threaded_capture
+        if self._threaded_capture:
+            self._start_capture_thread()
+
     def shutdown(self):
         """Deinitialize the ImageProcessor class."""
 
         logger.debug("Deinitializing WebcamProcessor...")
+        self._stop_capture_thread()
         self._camera.release()
         cv2.destroyAllWindows()
 
+    def attach_frame_buffer(self, frame_buffer: SharedFrameBuffer) -> None:
+        """Capture directly into the slots of the given frame buffer (zero-copy).
+        The captured frames are committed but not published to the readers."""
+
+        if frame_buffer.frame_shape != self._current_frame.shape:
+            raise ValueError(
+                f"Frame buffer shape {frame_buffer.frame_shape} does not match the "
+                f"frame shape {self._current_frame.shape}."
+            )
+        self._stop_capture_thread()
+        self._frame_buffer = frame_buffer
+        if self._threaded_capture:
+            self._start_capture_thread()
+
+    def detach_frame_buffer(self) -> None:
+        """Stop capturing into the frame buffer and release all views onto it."""
+
+        if self._frame_buffer is None:
+            return
+        self._stop_capture_thread()
+        self._frame_buffer.reserve(None)
+        self._current_frame = self._current_frame.copy()
+        self._latest_frame = self._latest_frame.copy()
+        self._latest_is_fresh = False
+        self._frame_buffer = None
+        if self._threaded_capture:
+            self._start_capture_thread()
+
+    @property
+    def frame_buffer(self) -> SharedFrameBuffer | None:
+        """Return the frame buffer that is captured into, if any."""
+
+        return self._frame_buffer
+
     def capture(self) -> None:
-        """Capture a frame from the webcam."""
+        """Capture a frame from the webcam. With threaded capture this only picks up
+        the newest frame grabbed by the capture thread and never blocks on I/O."""
+
+        if self._threaded_capture:
+            with self._frame_lock:
+                if not self._latest_is_fresh:
+                    return
+                self._current_frame, self._latest_frame = (
+                    self._latest_frame,
+                    self._current_frame,
+                )
+                self._current_sequence = self._latest_sequence
+                self._current_timestamp = self._latest_timestamp
+                self._latest_is_fresh = False
+                if self._frame_buffer is not None:
+                    # The capture thread must not write into the rendered frame
+                    self._frame_buffer.reserve(self._current_sequence)
+            return
 
-        ret, current_frame = self._camera.read()
+        target = (
+            None if self._frame_buffer is None else self._frame_buffer.begin_write()
+        )
+        grabbed = self._grab(target)
+        if grabbed is None:
+            return
+        self._current_frame, self._current_sequence, self._current_timestamp = grabbed
+
+    def _grab(self, target: np.ndarray | None) -> tuple[np.ndarray, int, float] | None:
+        """Read the next frame from the camera, decoding into `target` if given.
+        Returns the frame, its frame buffer sequence number (0 if not captured
+        into the frame buffer) and its capture time or None if reading failed."""
+
+        ret, frame = self._camera.read(image=target)
         if not ret:
             logger.warning("Failed to capture frame from webcam.")
+            return None
+        timestamp = time.monotonic()
+        self._frame_counter += 1
+        self._capture_meter.tick()
+
+        if self._frame_buffer is None or target is None:
+            return frame, 0, timestamp
+
+        if frame.ctypes.data != target.ctypes.data:
+            # OpenCV reallocates if the camera ignored the requested resolution
+            if not self._warned_about_reallocation:
+                logger.warning(
+                    "Camera delivered frames of shape "
+                    f"{frame.shape}, resizing to {target.shape}."
+                )
+                self._warned_about_reallocation = True
+            cv2.resize(frame, (self._FRAME_WIDTH, self._FRAME_HEIGHT), dst=target)
+        return target, self._frame_buffer.commit(timestamp), timestamp
+
+    def _capture_loop(self) -> None:
+        """Grab frames continuously and publish the newest one."""
+
+        logger.debug("Capture thread started.")
+        while not self._capture_stop_event.is_set():
+            if self._frame_buffer is not None:
+                grabbed = self._grab(self._frame_buffer.begin_write())
+            else:
+                grabbed = self._grab(self._back_frame)
+            if grabbed is None:
+                time.sleep(0.01)
+                continue
+            frame, sequence, timestamp = grabbed
+
+            with self._frame_lock:
+                if self._latest_is_fresh:
+                    # The previous frame was never picked up
+                    self._dropped_grabs += 1
+                if self._frame_buffer is None:
+                    self._back_frame = self._latest_frame
+                self._latest_frame = frame
+                self._latest_sequence = sequence
+                self._latest_timestamp = timestamp
+                self._latest_is_fresh = True
+        logger.debug("Capture thread stopped.")
+
+    def _start_capture_thread(self) -> None:
+        """Start the background capture thread."""
+
+        self._capture_stop_event.clear()
+        self._capture_thread = threading.Thread(
+            target=self._capture_loop, name="CaptureThread", daemon=True
+        )
+        self._capture_thread.start()
+
+    def _stop_capture_thread(self) -> None:
+        """Stop the background capture thread if it is running."""
+
+        if self._capture_thread is None:
             return
-        self._current_frame = current_frame
+        self._capture_stop_event.set()
+        self._capture_thread.join()
+        self._capture_thread = None
 
     def render(self) -> None:
         """Render the frame to the screen."""
 
-        render_frame = self._current_frame.copy()
+        if self._render_meter.tick():
+            self.update_debug_info(
+                "FPS",
+                f"capture {self.capture_fps:.1f}, render {self.render_fps:.1f}, "
+                f"dropped {self._dropped_grabs}",
+            )
 
-        cv2.flip(render_frame, 1, render_frame)
+        # Flipping into the preallocated render frame is the only copy
+        render_frame = self._render_frame
+        cv2.flip(self._current_frame, 1, render_frame)
 
         self._modifier_lock.acquire()
 
@@ -112,6 +286,45 @@ class WebcamProcessor:
 
         return self._current_frame
 
+    @property
+    def current_sequence(self) -> int:
+        """Return the frame buffer sequence number of the current frame. Only
+        meaningful while capturing into a frame buffer."""
+
+        return self._current_sequence
+
+    @property
+    def current_timestamp(self) -> float:
+        """Return the time (`time.monotonic`) at which the current frame was
+        captured."""
+
+        return self._current_timestamp
+
+    @property
+    def frame_counter(self) -> int:
+        """Return the number of frames grabbed from the camera so far."""
+
+        return self._frame_counter
+
+    @property
+    def capture_fps(self) -> float:
+        """Return the rate at which frames are grabbed from the camera."""
+
+        return self._capture_meter.rate
+
+    @property
+    def render_fps(self) -> float:
+        """Return the rate at which frames are rendered to the screen."""
+
+        return self._render_meter.rate
+
+    @property
+    def dropped_grabs(self) -> int:
+        """Return the number of grabbed frames that were superseded before being
+        picked up by `capture`."""
+
+        return self._dropped_grabs
+
     def add_frame_modifier(
         self,
         modifier_func: FrameModifier,
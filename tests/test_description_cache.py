@@ -0,0 +1,110 @@
+import sqlite3
+
+import pytest
+
+from botender.interaction import description_cache
+from botender.interaction.description_cache import DescriptionCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(description_cache.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    cache = DescriptionCache(
+        tmp_path / "descriptions.sqlite3", "1", max_entries=3, ttl=60, variants=2
+    )
+    yield cache
+    cache.close()
+
+
+def test_put_and_get(cache):
+    assert cache.get("Mojito", "rum, mint") is None
+    cache.put("Mojito", "rum, mint", "Fresh.")
+
+    assert cache.get("Mojito", "rum, mint") == "Fresh."
+    assert cache.get("Mojito", "gin, mint") is None
+    assert cache.count("Mojito", "rum, mint") == 1
+
+
+def test_keeps_the_newest_variants(cache, clock):
+    for description in ("One.", "Two.", "Three."):
+        cache.put("Mojito", "rum, mint", description)
+        clock.now += 1
+
+    assert cache.count("Mojito", "rum, mint") == 2
+    assert {cache.get("Mojito", "rum, mint") for _ in range(50)} == {"Two.", "Three."}
+
+
+def test_evicts_the_least_recently_used(cache, clock):
+    for name in ("A", "B", "C"):
+        cache.put(name, "", name)
+        clock.now += 1
+    cache.get("A", "")
+    clock.now += 1
+    cache.put("D", "", "D")
+
+    assert len(cache) == 3
+    assert cache.get("B", "") is None
+    assert cache.get("A", "") == "A"
+
+
+def test_descriptions_expire(cache, clock):
+    cache.put("Mojito", "rum, mint", "Fresh.")
+    clock.now += 61
+
+    assert cache.get("Mojito", "rum, mint") is None
+    assert cache.count("Mojito", "rum, mint") == 0
+    cache.put("Negroni", "gin", "Bitter.")
+    assert len(cache) == 1
+
+
+def test_pregenerated_descriptions_do_not_expire(cache, clock):
+    cache.put("Mojito", "rum, mint", "Fresh.", expires=False)
+    cache.put("Negroni", "gin", "Bitter.")
+    clock.now += 61
+    cache.put("Martini", "gin, vermouth", "Dry.")
+
+    assert cache.get("Mojito", "rum, mint") == "Fresh."
+    assert cache.count("Mojito", "rum, mint") == 1
+    assert cache.get("Negroni", "gin") is None
+    assert len(cache) == 2
+
+
+def test_adds_the_expires_column(tmp_path, clock):
+    path = tmp_path / "descriptions.sqlite3"
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE descriptions (id INTEGER PRIMARY KEY, key TEXT NOT NULL, "
+        "cocktail TEXT NOT NULL, description TEXT NOT NULL, created REAL NOT NULL, "
+        "last_used REAL NOT NULL)"
+    )
+    connection.close()
+    cache = DescriptionCache(path, "1")
+    cache.put("Mojito", "rum, mint", "Fresh.", expires=False)
+
+    assert cache.get("Mojito", "rum, mint") == "Fresh."
+    cache.close()
+
+
+def test_prompt_version_invalidates(tmp_path, clock):
+    path = tmp_path / "descriptions.sqlite3"
+    cache = DescriptionCache(path, "1")
+    cache.put("Mojito", "rum, mint", "Fresh.")
+    cache.close()
+    cache = DescriptionCache(path, "2")
+
+    assert cache.get("Mojito", "rum, mint") is None
+    cache.close()
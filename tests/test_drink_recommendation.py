@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+
+from botender.interaction import drink_recommendation
+from botender.interaction.drink_recommendation import (
+    EMOTION_TASTES,
+    TASTES,
+    TOP_K,
+    DrinkRecommender,
+)
+
+
+@pytest.fixture(scope="module")
+def recommender():
+    return DrinkRecommender(seed=0)
+
+
+@pytest.mark.parametrize("taste", TASTES)
+def test_candidates_are_sorted_by_taste_score(recommender, taste):
+    candidates = recommender.candidates("neutral", taste)
+    scores = recommender.scores[candidates, TASTES.index(taste)]
+
+    assert len(candidates) > 0
+    assert (scores > 0).all()
+    assert (np.diff(scores) <= 0).all()
+
+
+def test_recommend_drinks_from_the_top(recommender):
+    top = set(
+        recommender.drinks_data.iloc[recommender.candidates("happy", "Sweet")[:TOP_K]][
+            "Cocktail"
+        ]
+    )
+    drinks = recommender.recommend_drinks("happy", "Sweet", n=3)
+
+    assert len(drinks) == 3
+    assert set(drinks["Cocktail"]) <= top
+    assert drinks["Cocktail"].is_unique
+
+
+def test_recommend_drinks_excludes(recommender):
+    top = recommender.drinks_data.iloc[recommender.candidates("sad", "Sweet")[:TOP_K]]
+    excluded = list(top["Cocktail"][:5])
+    drinks = recommender.recommend_drinks("sad", "Sweet", n=TOP_K, exclude=excluded)
+
+    assert not set(drinks["Cocktail"]) & set(excluded)
+
+
+def test_recommend_drinks_excludes_every_row_of_a_name(recommender, monkeypatch):
+    monkeypatch.setattr(drink_recommendation, "TOP_K", len(recommender.drinks_data))
+    rows = recommender.drinks_data.index[
+        recommender.drinks_data["Cocktail"] == "SHADY LADY"
+    ]
+    assert len(rows) == 2
+
+    for taste in TASTES:
+        drinks = recommender.recommend_drinks(
+            "neutral", taste, n=len(recommender.drinks_data), exclude=["SHADY LADY"]
+        )
+        assert "SHADY LADY" not in set(drinks["Cocktail"])
+
+
+def test_unknown_emotion_is_neutral(recommender):
+    np.testing.assert_array_equal(
+        recommender.candidates("surprise", "Strong"),
+        recommender.candidates("neutral", "Strong"),
+    )
+
+
+def test_recommend_many(recommender):
+    requests = [("happy", "Sweet"), ("angry", "Sour"), ("happy", "Sweet")] * 10
+    selections = recommender.recommend_many(requests, n=2)
+
+    assert len(selections) == len(requests)
+    for (emotion, taste), selected in zip(requests, selections):
+        assert len(selected) == 2
+        assert set(selected) <= set(recommender.candidates(emotion, taste)[:TOP_K])
+
+
+@pytest.mark.parametrize("emotion", EMOTION_TASTES)
+@pytest.mark.parametrize("taste", TASTES)
+def test_candidates_suit_the_emotion(recommender, emotion, taste):
+    candidates = recommender.candidates(emotion, taste)
+    unsuitable = [i for i, t in enumerate(TASTES) if t not in EMOTION_TASTES[emotion]]
+
+    if taste not in EMOTION_TASTES[emotion]:
+        assert len(candidates) == 0
+    else:
+        assert len(candidates) > 0
+        assert (recommender.scores[np.ix_(candidates, unsuitable)] == 0).all()
+
+
+def test_unsuitable_taste_gives_no_recommendation(recommender):
+    assert len(recommender.recommend_drinks("happy", "Strong", n=1)) == 0
+    assert len(recommender.recommend_many([("angry", "Sweet")])[0]) == 0
+
+
+def test_every_row_is_kept(recommender):
+    missing = recommender.drinks_data["Category_with_Scales"] == "Missing Data"
+
+    assert len(recommender.drinks_data) == 717
+    assert missing.sum() == 4
+    candidates = np.concatenate(
+        [
+            recommender.candidates(emotion, taste)
+            for emotion in EMOTION_TASTES
+            for taste in TASTES
+        ]
+    )
+    assert not missing.to_numpy()[candidates].any()
@@ -0,0 +1,67 @@
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("feat")
+pytest.importorskip("sklearn")
+
+from botender.perception.detectors.emotion_detector import (  # noqa: E402
+    classify_action_units,
+    load_svm_model,
+)
+
+ACTION_UNITS_PATH = Path(__file__).parents[1] / "model-training" / "aus_combined.csv"
+"""The action units the SVM was trained on, with their emotion."""
+SAMPLES_PER_EMOTION = 10
+
+
+@pytest.fixture(scope="module")
+def samples() -> pd.DataFrame:
+    if not ACTION_UNITS_PATH.exists():
+        pytest.skip("The SVM training data is not available")
+    data = pd.read_csv(ACTION_UNITS_PATH)
+    return data.groupby("emotion").head(SAMPLES_PER_EMOTION)
+
+
+@pytest.fixture(autouse=True)
+def ignore_sklearn_warnings():
+    # The pickles were made with another scikit-learn version and feature names
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        yield
+
+
+def test_probabilities_per_face(samples):
+    action_units = samples.drop(columns="emotion").to_numpy()
+    _, _, label_encoder = load_svm_model()
+    probabilities = classify_action_units(action_units)
+
+    assert probabilities.shape == (len(samples), len(label_encoder.classes_))
+    np.testing.assert_allclose(probabilities.sum(axis=1), 1.0)
+
+
+def test_matches_svm_predict(samples):
+    action_units = samples.drop(columns="emotion").to_numpy()
+    svm, scaler, _ = load_svm_model()
+    predicted = svm.predict(scaler.transform(action_units))
+    probabilities = classify_action_units(action_units)
+
+    assert np.mean(np.argmax(probabilities, axis=1) == predicted) >= 0.95
+
+
+def test_batch_matches_single_faces(samples):
+    action_units = samples.drop(columns="emotion").to_numpy()
+    batch = classify_action_units(action_units)
+    single = np.concatenate([classify_action_units(row[None]) for row in action_units])
+
+    np.testing.assert_allclose(batch, single)
+
+
+def test_missing_action_units(samples):
+    action_units = samples.drop(columns="emotion").to_numpy()[:2].copy()
+    action_units[0, :5] = np.nan
+
+    assert np.isfinite(classify_action_units(action_units)).all()
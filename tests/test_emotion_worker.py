@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("feat")
+
+from botender.perception.emotion_worker import (  # noqa: E402
+    BATCH_FRAME_SIZE,
+    EmotionWorker,
+)
+
+
+def window(frames, faces) -> EmotionWorker:
+    """Returns an emotion worker with the given voting window, without starting
+    its process."""
+
+    worker = EmotionWorker.__new__(EmotionWorker)
+    worker._window_frames = frames
+    worker._window_faces = faces
+    return worker
+
+
+def test_equally_sized_frames_are_stacked():
+    frames = [np.full((48, 64, 3), i, dtype=np.uint8) for i in range(3)]
+    faces = [[(1.0, 2.0, 30.0, 40.0, 0.9)] for _ in frames]
+    batch, batch_faces = window(frames, faces)._stack_window()
+
+    assert batch.shape == (3, 48, 64, 3)
+    np.testing.assert_array_equal(batch, np.stack(frames))
+    assert batch_faces == faces
+
+
+def test_crops_are_letterboxed():
+    frames = [
+        np.full((100, 50, 3), 10, dtype=np.uint8),
+        np.full((64, 128, 3), 20, dtype=np.uint8),
+    ]
+    faces = [[(0.0, 0.0, 50.0, 100.0, 0.9)], [(32.0, 16.0, 64.0, 48.0, 0.8)]]
+    batch, batch_faces = window(frames, faces)._stack_window()
+
+    assert batch.shape == (2, BATCH_FRAME_SIZE, BATCH_FRAME_SIZE, 3)
+    assert batch.dtype == np.uint8
+    # The crops fill the top left and the rest stays black
+    assert (batch[0, :, : BATCH_FRAME_SIZE // 2] == 10).all()
+    assert (batch[0, :, BATCH_FRAME_SIZE // 2 :] == 0).all()
+    assert (batch[1, : BATCH_FRAME_SIZE // 2] == 20).all()
+    assert (batch[1, BATCH_FRAME_SIZE // 2 :] == 0).all()
+    # The faces are scaled with their crop
+    assert batch_faces[0] == [(0.0, 0.0, BATCH_FRAME_SIZE / 2, BATCH_FRAME_SIZE, 0.9)]
+    assert batch_faces[1] == [(64.0, 32.0, 128.0, 96.0, 0.8)]
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from botender.perception.frame_buffer import SharedFrameBuffer
+
+FRAME_SHAPE = (4, 6, 3)
+
+
+@pytest.fixture
+def frame_buffer():
+    buffer = SharedFrameBuffer(FRAME_SHAPE, num_slots=3)
+    yield buffer
+    buffer.close()
+
+
+def frame(value: int) -> np.ndarray:
+    return np.full(FRAME_SHAPE, value, dtype=np.uint8)
+
+
+def test_write_and_read(frame_buffer):
+    sequence = frame_buffer.write(frame(7), timestamp=1.5)
+    out = np.empty(FRAME_SHAPE, dtype=np.uint8)
+
+    assert sequence == 1
+    assert frame_buffer.latest_sequence == 1
+    assert frame_buffer.read(sequence, out) == 1.5
+    assert (out == 7).all()
+
+
+def test_claim_takes_the_newest_frame_once(frame_buffer):
+    frame_buffer.write(frame(1))
+    newest = frame_buffer.write(frame(2))
+
+    assert frame_buffer.pending
+    assert frame_buffer.claim(timeout=0) == newest
+    assert not frame_buffer.pending
+    assert frame_buffer.claim(timeout=0) is None
+
+
+def test_read_of_overwritten_frame_fails(frame_buffer):
+    first = frame_buffer.write(frame(1))
+    for value in range(frame_buffer.num_slots):
+        frame_buffer.write(frame(value + 2))
+    out = np.empty(FRAME_SHAPE, dtype=np.uint8)
+
+    assert frame_buffer.read(first, out) is None
+
+
+def test_read_during_write_fails(frame_buffer):
+    sequence = frame_buffer.write(frame(1))
+    for value in range(frame_buffer.num_slots - 1):
+        frame_buffer.write(frame(value + 2))
+    # The next write reuses the slot of the first frame
+    frame_buffer.begin_write()
+    out = np.empty(FRAME_SHAPE, dtype=np.uint8)
+
+    assert frame_buffer.read(sequence, out) is None
+
+
+def test_reserved_slot_is_not_overwritten(frame_buffer):
+    reserved = frame_buffer.write(frame(1))
+    frame_buffer.reserve(reserved)
+    sequences = [frame_buffer.write(frame(value + 2)) for value in range(5)]
+    out = np.empty(FRAME_SHAPE, dtype=np.uint8)
+
+    assert frame_buffer.read(reserved, out) is not None
+    assert (out == 1).all()
+    # Sequence numbers stay increasing and map to their slots
+    assert sequences == sorted(sequences)
+    assert frame_buffer.read(sequences[-1], out) is not None
+    assert (out == 6).all()
+
+    frame_buffer.reserve(None)
+    for value in range(frame_buffer.num_slots):
+        frame_buffer.write(frame(value + 7))
+    assert frame_buffer.read(reserved, out) is None
+
+
+def test_reserve_needs_three_slots():
+    frame_buffer = SharedFrameBuffer(FRAME_SHAPE, num_slots=2)
+    try:
+        with pytest.raises(ValueError):
+            frame_buffer.reserve(1)
+    finally:
+        frame_buffer.close()
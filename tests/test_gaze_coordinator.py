@@ -0,0 +1,117 @@
+import threading
+
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("feat")
+pytest.importorskip("furhat_remote_api")
+
+from botender.interaction import gaze_coordinator  # noqa: E402
+from botender.interaction.gaze_coordinator import (  # noqa: E402
+    GazeCoordinatorThread,
+    GazeFilter,
+)
+from botender.perception.detection_worker import DetectionResult  # noqa: E402
+
+
+class FakeFurhat:
+    def __init__(self):
+        self.locations = []
+
+    def attend(self, location: str):
+        self.locations.append(np.array([float(x) for x in location.split(",")]))
+
+
+class FakePerception:
+    face_presence_counter = 10
+    current_result: DetectionResult | None = None
+
+    def add_result_listener(self, listener: threading.Event) -> None:
+        pass
+
+
+class FakeDisplay:
+    def add_rectangles_to_current_frame(self, *args, **kwargs) -> None:
+        pass
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(gaze_coordinator.time, "monotonic", clock)
+    return clock
+
+
+def coordinator(gaze_mode) -> tuple[GazeCoordinatorThread, FakeFurhat, FakePerception]:
+    furhat, perception = FakeFurhat(), FakePerception()
+    thread = GazeCoordinatorThread(
+        furhat,  # type: ignore[arg-type]
+        perception,  # type: ignore[arg-type]
+        FakeDisplay(),  # type: ignore[arg-type]
+        gaze_mode=gaze_mode,
+    )
+    return thread, furhat, perception
+
+
+def show_face(perception: FakePerception, center_x: float, center_y: float) -> None:
+    face = ((center_x - 50, center_y - 60), (center_x + 50, center_y + 60))
+    perception.current_result = DetectionResult([face], "neutral")
+
+
+def test_grid_mode_looks_at_the_cell_center(clock):
+    thread, furhat, perception = coordinator("grid")
+    cell_width = 640 / 7
+    cell_height = 480 / 7
+
+    show_face(perception, 3.2 * cell_width, 3.7 * cell_height)
+    thread._handle_attend_face()
+    # Moves within the hysteresis of its cell
+    show_face(perception, 4.1 * cell_width, 3.7 * cell_height)
+    thread._handle_attend_face()
+    show_face(perception, 5.5 * cell_width, 1.5 * cell_height)
+    thread._handle_attend_face()
+
+    assert len(furhat.locations) == 2
+    np.testing.assert_allclose(
+        furhat.locations[0][:2], thread._gaze_xy(3.5 * cell_width, 3.5 * cell_height)
+    )
+    np.testing.assert_allclose(
+        furhat.locations[1][:2], thread._gaze_xy(5.5 * cell_width, 1.5 * cell_height)
+    )
+
+
+def test_smooth_mode_follows_the_face(clock):
+    thread, furhat, perception = coordinator("smooth")
+
+    show_face(perception, 300, 200)
+    thread._handle_attend_face()
+    # Too soon after the last update
+    clock.now += 0.05
+    show_face(perception, 400, 200)
+    thread._handle_attend_face()
+    clock.now += 0.5
+    thread._handle_attend_face()
+
+    assert len(furhat.locations) == 2
+    np.testing.assert_allclose(furhat.locations[0][:2], thread._gaze_xy(300, 200))
+    # Part of the way to the new position
+    x = furhat.locations[1][0]
+    assert thread._gaze_xy(400, 200)[0] < x < thread._gaze_xy(300, 200)[0]
+
+
+def test_gaze_filter_dead_band():
+    gaze_filter = GazeFilter(smoothing_time=0.3, dead_band=0.01)
+    start = np.array([0.0, 0.0, 1.0])
+
+    assert gaze_filter.update(start, 100.0) is not None
+    assert gaze_filter.update(start + [0.005, 0, 0], 100.5) is None
+    assert gaze_filter.update(start + [0.1, 0, 0], 101.0) is not None
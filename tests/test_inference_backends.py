@@ -0,0 +1,91 @@
+"""Parity of the inference backends with py-feat. Skipped unless py-feat and the
+weights of its default models are installed; backends whose exports are missing
+(see `model_cache --export`) are skipped as well."""
+
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+feat_io = pytest.importorskip("feat.utils.io")
+
+import cv2  # type: ignore  # noqa: E402
+
+from botender.perception.benchmarks import (  # noqa: E402
+    MATCH_IOU_THRESHOLD,
+    _match,
+    _run_models,
+)
+from botender.perception.inference_backends import (  # noqa: E402
+    EXPORTED_MODELS,
+    export_path,
+)
+from botender.perception.model_cache import get_cache_dir, load_detector  # noqa: E402
+
+WEIGHTS = (
+    "mobilenet0.25_Final.pth",
+    "mobilefacenet_model_best.pth.tar",
+    "ResMaskNet_Z_resmasking_dropout1_rot30.pth",
+)
+"""The weights of the default py-feat face, landmark and emotion models."""
+IMAGES = ("single_face.jpg", "multi_face.jpg")
+EMOTION_TOLERANCE = {
+    "torchscript": 1e-3,
+    "onnx": 1e-3,
+    "quantized": 0.1,
+    "onnx-int8": 0.15,
+}
+"""The largest difference of an emotion probability to py-feat per backend."""
+LANDMARK_TOLERANCE = 3.0
+"""The largest mean landmark difference to py-feat in pixels."""
+
+pytestmark = pytest.mark.skipif(
+    not all(
+        os.path.exists(os.path.join(feat_io.get_resource_path(), w)) for w in WEIGHTS
+    ),
+    reason="py-feat model weights are not downloaded",
+)
+
+
+@pytest.fixture(scope="module")
+def frames():
+    return [
+        cv2.imread(os.path.join(feat_io.get_test_data_path(), name)) for name in IMAGES
+    ]
+
+
+@pytest.fixture(scope="module")
+def reference(frames):
+    detector, _ = load_detector("cpu", warmup_frame_shape=None)
+    reference_faces = [detector.detect_faces(frame)[0] for frame in frames]
+    faces, landmarks, emotions, _ = _run_models(detector, frames, reference_faces)
+    return reference_faces, faces, landmarks, emotions
+
+
+@pytest.mark.parametrize("backend", list(EMOTION_TOLERANCE))
+def test_backend_matches_pytorch(backend, frames, reference):
+    if backend in ("onnx", "onnx-int8"):
+        pytest.importorskip("onnxruntime")
+    if backend != "quantized" and not all(
+        export_path(get_cache_dir(), backend, name, "cpu").exists()
+        for name in EXPORTED_MODELS
+    ):
+        pytest.skip(f"No {backend} export in the model cache")
+
+    reference_faces, faces, landmarks, emotions = reference
+    detector, _ = load_detector("cpu", warmup_frame_shape=None, backend=backend)
+    backend_faces, backend_landmarks, backend_emotions, _ = _run_models(
+        detector, frames, reference_faces
+    )
+
+    for found, expected in zip(backend_faces, faces):
+        assert all(iou >= MATCH_IOU_THRESHOLD for iou in _match(found, expected))
+    for actual, expected in zip(backend_landmarks, landmarks):
+        if expected is not None:
+            assert np.abs(actual - expected).mean() <= LANDMARK_TOLERANCE
+    for actual, expected in zip(backend_emotions, emotions):
+        if expected is not None:
+            np.testing.assert_allclose(
+                actual, expected, atol=EMOTION_TOLERANCE[backend]
+            )
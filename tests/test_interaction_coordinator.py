@@ -0,0 +1,102 @@
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("feat")
+pytest.importorskip("furhat_remote_api")
+
+from botender.interaction.cocktail_descriptions import (  # noqa: E402
+    DescriptionPrefetcher,
+    default_description,
+)
+from botender.interaction.description_cache import DescriptionCache  # noqa: E402
+from botender.interaction.drink_recommendation import (  # noqa: E402
+    DRINKS_DATA_PATH,
+    TASTES,
+    DrinkRecommender,
+)
+from botender.interaction.interaction_coordinator import (  # noqa: E402
+    InteractionCoordinator,
+)
+
+
+class LazyFuture(Future):
+    """Finishes when its result is asked for, unless it was cancelled."""
+
+    def result(self, timeout=None):
+        if not self.done() and self.set_running_or_notify_cancel():
+            self.set_result("A fine drink.")
+        return super().result(timeout)
+
+
+class StubClient:
+    timeout = 1.0
+
+    def __init__(self):
+        self.futures: list[Future] = []
+
+    def submit(self, messages, purpose=""):
+        future = LazyFuture()
+        self.futures.append(future)
+        return future
+
+
+@pytest.fixture
+def coordinator(tmp_path, monkeypatch):
+    monkeypatch.setenv("ENABLE_OPENAI_API", "True")
+    client = StubClient()
+    cache = DescriptionCache(tmp_path / "descriptions.sqlite3", "1")
+    coordinator = InteractionCoordinator.__new__(InteractionCoordinator)
+    coordinator._perception_manager = SimpleNamespace(current_result=None)
+    coordinator._recommender = DrinkRecommender(DRINKS_DATA_PATH)
+    coordinator._description_prefetcher = DescriptionPrefetcher(client, cache)
+    coordinator._drink_candidates = []
+    coordinator._speculative_candidates = {}
+    coordinator._recommended_drinks = set()
+    yield coordinator, client
+    cache.close()
+
+
+def test_rejected_recommendations_are_prefetched(coordinator):
+    coordinator, client = coordinator
+    coordinator.prefetch_recommendations("Sweet")
+
+    recommended = []
+    for _ in range(7):
+        cocktail_name, ingredients = coordinator.next_recommendation("Sweet")
+        description = coordinator.describe_cocktail(cocktail_name, ingredients)
+        assert description != default_description(cocktail_name)
+        recommended.append(cocktail_name)
+
+    prefetcher = coordinator._description_prefetcher
+    assert prefetcher.prefetch_misses == 0
+    assert prefetcher.prefetch_hits == 7
+    assert len(set(recommended)) == 7
+
+
+def test_speculative_prefetch_is_kept_for_the_chosen_taste(coordinator):
+    coordinator, client = coordinator
+    coordinator.speculate_recommendations()
+    speculative = dict(coordinator._speculative_candidates)
+    assert set(speculative) == set(TASTES)
+    assert len(client.futures) == len(TASTES)
+
+    coordinator.prefetch_recommendations("Sour")
+    cancelled = {
+        cocktail_name
+        for (cocktail_name, _), future in zip(speculative.values(), client.futures)
+        if future.cancelled()
+    }
+    assert speculative["Sour"][0] not in cancelled
+    assert cancelled == {
+        cocktail_name
+        for taste, (cocktail_name, _) in speculative.items()
+        if taste != "Sour"
+    } - {cocktail_name for cocktail_name, _ in coordinator._drink_candidates}
+
+    cocktail_name, ingredients = coordinator.next_recommendation("Sour")
+    assert cocktail_name == speculative["Sour"][0]
+    coordinator.describe_cocktail(cocktail_name, ingredients)
+    assert coordinator._description_prefetcher.prefetch_hits == 1
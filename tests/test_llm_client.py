@@ -0,0 +1,56 @@
+import pytest
+
+openai = pytest.importorskip("openai")
+
+from botender.interaction.llm_client import LLMClient  # noqa: E402
+from botender.interaction.mock_furhat import LatencyDistribution  # noqa: E402
+from botender.interaction.mock_openai import MockOpenAIServer  # noqa: E402
+
+MESSAGES = [
+    {"role": "system", "content": "Answer with [Positive | Negative | Error]."},
+    {"role": "user", "content": "Yes"},
+]
+
+
+@pytest.fixture
+def server():
+    server = MockOpenAIServer(port=0, latency=LatencyDistribution("constant", 300.0))
+    server.start()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def client(server, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "mock")
+    client = LLMClient(base_url=server.base_url, timeout=2.0)
+    yield client
+    client.close()
+
+
+def test_complete(client):
+    assert client.complete(MESSAGES, purpose="valence") == "Positive"
+    assert client.latency_percentiles((50,))["valence"][50] >= 0.3
+    assert client.failures == {}
+
+
+def test_complete_misses_its_deadline(client):
+    with pytest.raises(openai.APITimeoutError):
+        client.complete(MESSAGES, timeout=0.1, purpose="valence")
+
+    assert client.failures == {"valence": 1}
+    assert "valence" not in client.latency_percentiles()
+
+
+def test_submit(client):
+    future = client.submit(MESSAGES, purpose="valence")
+
+    assert future.result(5) == "Positive"
+
+
+def test_submit_misses_its_deadline(client):
+    future = client.submit(MESSAGES, timeout=0.1, purpose="valence")
+
+    with pytest.raises(openai.APITimeoutError):
+        future.result(5)
+    assert client.failures == {"valence": 1}
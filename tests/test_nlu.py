@@ -0,0 +1,128 @@
+import pytest
+
+from botender.interaction.nlu import (
+    CONFIDENCE_THRESHOLD,
+    LocalNLU,
+    classify_taste,
+    classify_valence,
+    extract_name,
+)
+
+
+@pytest.mark.parametrize(
+    "message, valence",
+    [
+        ("Yes please", "Positive"),
+        ("Sure", "Positive"),
+        ("Sounds good", "Positive"),
+        ("No problem", "Positive"),
+        ("No worries", "Positive"),
+        ("Can't complain", "Positive"),
+        ("No thanks", "Negative"),
+        ("Not really", "Negative"),
+        ("No, I'm good", "Negative"),
+    ],
+)
+def test_valence(message, valence):
+    result, confidence = classify_valence(message)
+
+    assert result == valence
+    assert confidence >= CONFIDENCE_THRESHOLD
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "Something else please",
+        "I would like something different",
+        "I want another one",
+        "Maybe",
+        "Yes and no",
+        "What is in it?",
+        "I could not be happier",
+        "Never better",
+    ],
+)
+def test_unclear_valence_is_left_to_the_llm(message):
+    _, confidence = classify_valence(message)
+
+    assert confidence < CONFIDENCE_THRESHOLD
+
+
+@pytest.mark.parametrize(
+    "message, taste",
+    [
+        ("Something sweet please", "Sweet"),
+        ("Sour", "Sour"),
+        ("I'd like a strong one", "Strong"),
+        ("Something milky", "Milk-based"),
+        ("swete", "Sweet"),
+    ],
+)
+def test_taste(message, taste):
+    result, confidence = classify_taste(message)
+
+    assert result == taste
+    assert confidence >= CONFIDENCE_THRESHOLD
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "I hate sweet drinks",
+        "anything but sweet",
+        "sour instead of sweet",
+        "I don't like strong drinks",
+        "sweet or sour",
+        "I don't know",
+    ],
+)
+def test_unclear_taste_is_left_to_the_llm(message):
+    _, confidence = classify_taste(message)
+
+    assert confidence < CONFIDENCE_THRESHOLD
+
+
+@pytest.mark.parametrize(
+    "message, name",
+    [
+        ("My name is Anna", "Anna"),
+        ("I'm Alex", "Alex"),
+        ("Call me Sam", "Sam"),
+        ("Anna", "Anna"),
+    ],
+)
+def test_name(message, name):
+    result, confidence = extract_name(message)
+
+    assert result == name
+    assert confidence >= CONFIDENCE_THRESHOLD
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "Please no",
+        "Pardon",
+        "Cheers",
+        "Sorry",
+        "anna",
+        "I'm fine",
+        "I'm thirsty",
+        "It's me",
+        "Im hungry",
+    ],
+)
+def test_unclear_name_is_left_to_the_llm(message):
+    name, confidence = extract_name(message)
+
+    assert name is None
+    assert confidence < CONFIDENCE_THRESHOLD
+
+
+def test_local_nlu_falls_back_to_the_llm():
+    nlu = LocalNLU()
+
+    assert nlu.valence("Yes") == "Positive"
+    assert nlu.valence("Something else please") is None
+    assert nlu.hit_rate("valence") == 0.5
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("feat")
+
+from botender.perception.detectors.emotion_detector import EMOTIONS  # noqa: E402
+from botender.perception.result_buffer import (  # noqa: E402
+    MAX_FACES,
+    SharedResultBuffer,
+    faces_from_record,
+)
+
+
+@pytest.fixture
+def result_buffer():
+    buffer = SharedResultBuffer(num_slots=2)
+    yield buffer
+    buffer.close()
+
+
+def test_write_and_read_faces(result_buffer):
+    faces = [(1.0, 2.0, 3.0, 4.0, 0.9), (5.0, 6.0, 7.0, 8.0, 0.8)]
+    result_buffer.write_faces(1, 3, 1.0, faces, 1.1, 0.05)
+    record = result_buffer.read(1)
+
+    assert record is not None
+    assert record["version"] == 2
+    assert record["frame_sequence"] == 3
+    assert faces_from_record(record) == [((1, 2), (3, 4)), ((5, 6), (7, 8))]
+    assert result_buffer.read(0)["face_count"] == 0
+
+
+def test_faces_beyond_max_are_dropped(result_buffer):
+    faces = [(float(i), 0.0, i + 1.0, 1.0, 0.5) for i in range(MAX_FACES + 2)]
+    result_buffer.write_faces(0, 1, 1.0, faces, 1.0, 0.0)
+
+    assert len(faces_from_record(result_buffer.read(0))) == MAX_FACES
+
+
+def test_write_and_read_emotion(result_buffer):
+    probabilities = np.linspace(0, 1, len(EMOTIONS), dtype=np.float32)
+    result_buffer.write_emotion(0, EMOTIONS[1], probabilities, 2.0)
+    record = result_buffer.read(0)
+
+    assert EMOTIONS[int(record["emotion"])] == EMOTIONS[1]
+    np.testing.assert_allclose(record["emotion_probabilities"], probabilities)
+
+
+def test_read_during_write_fails(result_buffer):
+    result_buffer._begin_write(0)
+
+    assert result_buffer.read(0) is None
+    result_buffer._end_write(0)
+    assert result_buffer.read(0) is not None
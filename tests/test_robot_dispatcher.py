@@ -0,0 +1,119 @@
+import threading
+
+import pytest
+
+pytest.importorskip("furhat_remote_api")
+
+from botender.interaction.robot_dispatcher import (  # noqa: E402
+    CommandPriority,
+    RobotDispatcher,
+)
+
+
+class FakeFurhat:
+    """Records the commands and blocks in `gesture` until released."""
+
+    def __init__(self):
+        self.calls = []
+        self.gesture_started = threading.Event()
+        self.release = threading.Event()
+
+    def gesture(self, **kwargs):
+        self.calls.append(("gesture", kwargs))
+        self.gesture_started.set()
+        self.release.wait(5)
+
+    def attend(self, **kwargs):
+        self.calls.append(("attend", kwargs))
+
+    def set_led(self, **kwargs):
+        self.calls.append(("set_led", kwargs))
+
+    def say(self, **kwargs):
+        self.calls.append(("say", kwargs))
+
+    def listen(self, **kwargs):
+        self.calls.append(("listen", kwargs))
+        return "hello"
+
+
+@pytest.fixture
+def furhat():
+    return FakeFurhat()
+
+
+@pytest.fixture
+def dispatcher(furhat):
+    dispatcher = RobotDispatcher(furhat)
+    yield dispatcher
+    furhat.release.set()
+    dispatcher.shutdown()
+
+
+def test_pending_gaze_targets_are_coalesced(furhat, dispatcher):
+    dispatcher.gesture(name="Nod")
+    assert furhat.gesture_started.wait(5)
+    futures = [dispatcher.attend(location=f"{x},0,1") for x in range(5)]
+    furhat.release.set()
+
+    assert all(future.result(5) is None for future in futures)
+    attends = [kwargs for name, kwargs in furhat.calls if name == "attend"]
+    assert attends == [{"location": "4,0,1"}]
+    assert dispatcher.coalesced == {"attend": 4}
+
+
+def test_coalesced_command_moves_to_the_tail(furhat, dispatcher):
+    dispatcher.gesture(name="Nod")
+    assert furhat.gesture_started.wait(5)
+    dispatcher.attend(location="1,0,1")
+    smile = dispatcher.gesture(name="Smile", priority=CommandPriority.GAZE)
+    attend = dispatcher.attend(location="2,0,1")
+    furhat.release.set()
+    attend.result(5)
+
+    assert smile.done()
+    assert furhat.calls == [
+        ("gesture", {"name": "Nod"}),
+        ("gesture", {"name": "Smile"}),
+        ("attend", {"location": "2,0,1"}),
+    ]
+
+
+def test_cancelled_commands_are_skipped(furhat, dispatcher):
+    dispatcher.gesture(name="Nod")
+    assert furhat.gesture_started.wait(5)
+    smile = dispatcher.gesture(name="Smile")
+    assert smile.cancel()
+    attend = dispatcher.attend(location="0,0,1")
+    furhat.release.set()
+
+    assert attend.result(5) is None
+    assert [name for name, _ in furhat.calls] == ["gesture", "attend"]
+
+
+def test_commands_without_key_are_not_coalesced(furhat, dispatcher):
+    dispatcher.gesture(name="Nod")
+    assert furhat.gesture_started.wait(5)
+    futures = [dispatcher.gesture(name="Smile") for _ in range(2)]
+    furhat.release.set()
+
+    for future in futures:
+        future.result(5)
+    assert [name for name, _ in furhat.calls] == ["gesture"] * 3
+    assert dispatcher.coalesced == {}
+
+
+def test_speech_is_not_delayed_by_motion(furhat, dispatcher):
+    dispatcher.gesture(name="Nod")
+    assert furhat.gesture_started.wait(5)
+
+    assert dispatcher.listen() == "hello"
+    assert dispatcher.say(text="Hi", blocking=True) is None
+
+
+def test_commands_after_shutdown_are_cancelled(furhat, dispatcher):
+    furhat.release.set()
+    dispatcher.shutdown()
+
+    assert dispatcher.attend(location="0,0,1").cancelled()
+    assert dispatcher.listen() is None